@@ -1,5 +1,10 @@
 import sys, os, csv, getpass   # lazy one-liner import
 
+from shopcore.catalog import load_catalog, as_number, update_stock
+from shopcore.money import from_cents, to_cents
+from shopcore.search import ProductSearchIndex
+from shopcore.user_index import UserIndex
+
 # files for storing stuff
 USERS_FILE = "users.txt"
 PRODUCTS_FILE = "products.txt"
@@ -20,26 +25,19 @@ def reset_screen():
 
 
 def read_users():
-    creds = {}
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, "r") as f:
-            for line in f:
-                if ":" in line:
-                    usr, pwd = line.strip().split(":", 1)
-                    creds[usr] = pwd
-    return creds
+    # on-disk index, so login looks up one user instead of reading the file
+    return UserIndex(USERS_FILE, ":", 2)
 
 
-def append_user(usr, pwd):
-    with open(USERS_FILE, "a") as f:
-        f.write(f"{usr}:{pwd}\n")
+def append_user(creds, usr, pwd):
+    creds.add(usr, pwd)
 
 
 def load_products_from_file():
     if os.path.exists(PRODUCTS_FILE):
-        with open(PRODUCTS_FILE, "r", newline="") as f:
-            rdr = csv.reader(f)
-            return [[int(x[0]), x[1], int(x[2]), int(x[3])] for x in rdr if len(x) >= 4]
+        # shared loader handles both the csv and the ';' layout of products.txt
+        table = load_catalog(PRODUCTS_FILE)
+        return [[int(pid), nm, as_number(price), qty] for pid, nm, price, _, qty in table.rows()]
     # defaults if file missing
     default_items = [
         [1, "🧥 Hoodie", 1500, 10],
@@ -52,6 +50,7 @@ def load_products_from_file():
 
 
 def save_products(products):
+    # only writes the defaults; stock changes go through Shop.change_stock()
     with open(PRODUCTS_FILE, "w", newline="") as f:
         writer = csv.writer(f)
         writer.writerows(products)
@@ -60,7 +59,11 @@ def save_products(products):
 class Shop:
     def __init__(self):
         self.items = load_products_from_file()
-        self.cart = []   # format: [[product, qty], ...]
+        # word index over names -> positions in self.items
+        self.finder = ProductSearchIndex((i, pr[1], '') for i, pr in enumerate(self.items))
+        self.by_id = {pr[0]: pr for pr in self.items}   # product id -> product row
+        self.cart = {}   # format: {pid: [product, qty]}, one line per product
+        self.cart_cents = 0   # kept in step with the cart, so no re-adding at checkout
 
     def list_items(self):
         reset_screen()
@@ -68,31 +71,66 @@ class Shop:
         for pid, nm, price, stock in self.items:
             print(f"{pid}. {nm} - ₹{price} ({stock} left)")
 
+    def find_items(self, query):
+        reset_screen()
+        print(f"\n🔍 Matches for '{query}':")
+        hits = self.finder.search(query)
+        if not hits:
+            print("Nothing found")
+        for i in hits:
+            pid, nm, price, stock = self.items[i]
+            print(f"{pid}. {nm} - ₹{price} ({stock} left)")
+
     def add_item(self, pid, qty):
         reset_screen()
-        for pr in self.items:
-            if pr[0] == pid:
-                if pr[3] >= qty:
-                    self.cart.append([pr, qty])  # NOTE: duplicates not merged!
-                    pr[3] -= qty
-                    save_products(self.items)
-                    print(f"\n✅ Added {qty} × {pr[1]}")
-                    return
-                else:
-                    print("\n❌ Not enough stock")
-                    return
-        print("\n❌ Product not found")
-
-    def remove_item(self, pid):
+        pr = self.by_id.get(pid)
+        if pr is None:
+            print("\n❌ Product not found")
+            return
+        if qty <= 0:
+            print("\n❌ Invalid quantity")
+            return
+        # only products.txt knows what the other terminals left
+        if not self.change_stock(pr, -qty):
+            print("\n❌ Not enough stock")
+            return
+        if pid in self.cart:
+            self.cart[pid][1] += qty   # same product again -> bump its line
+        else:
+            self.cart[pid] = [pr, qty]
+        self.cart_cents += to_cents(pr[2]) * qty
+        print(f"\n✅ Added {qty} × {pr[1]}")
+
+    def remove_item(self, pid, qty=None):
+        # qty=None (or more than is in the cart) drops the whole line
         reset_screen()
-        for pr, q in list(self.cart):  # list() avoids runtime errors while removing
-            if pr[0] == pid:
-                self.cart.remove([pr, q])
-                pr[3] += q
-                save_products(self.items)
-                print(f"\n🗑️ Removed {pr[1]}")
-                return
-        print("\n⚠️ Item not in cart")
+        line = self.cart.get(pid)
+        if line is None:
+            print("\n⚠️ Item not in cart")
+            return
+        pr, q = line
+        if qty is None or qty >= q:
+            qty = q
+            del self.cart[pid]
+        elif qty <= 0:
+            print("\n❌ Invalid quantity")
+            return
+        else:
+            line[1] -= qty
+        self.cart_cents -= to_cents(pr[2]) * qty
+        self.change_stock(pr, qty)
+        print(f"\n🗑️ Removed {qty} × {pr[1]}")
+
+    def change_stock(self, pr, delta):
+        # other terminals share products.txt: lock it, re-read it, write back
+        # just this product's line, then pick up everyone else's stock too.
+        # False (nothing written) if the stock ran out meanwhile
+        applied, table = update_stock(PRODUCTS_FILE, {str(pr[0]): delta})
+        for pid, qty in zip(table.ids, table.quantities):
+            row = self.by_id.get(int(pid))
+            if row is not None:
+                row[3] = qty
+        return applied
 
     def show_cart(self):
         reset_screen()
@@ -100,11 +138,9 @@ class Shop:
         if not self.cart:
             print("Cart is empty.")
             return 0
-        grand_total = 0
-        for pr, q in self.cart:
-            subtotal = pr[2] * q
-            grand_total += subtotal
-            print(f"- {pr[1]} ×{q} = ₹{subtotal}")
+        for pr, q in self.cart.values():
+            print(f"- {pr[1]} ×{q} = ₹{from_cents(to_cents(pr[2]) * q)}")
+        grand_total = from_cents(self.cart_cents)
         print(f"\n📦 Total: ₹{grand_total}\n")
         return grand_total
 
@@ -113,6 +149,7 @@ class Shop:
         if amt > 0:
             print("💳 Processing payment... \nThanks for shopping 🙏")
             self.cart.clear()
+            self.cart_cents = 0
         else:
             print("❌ Nothing to checkout")
 
@@ -138,8 +175,7 @@ def login_flow():
                 print("\n❌ Username taken")
             else:
                 new_pwd = getpass.getpass("🔑 New password: ")
-                append_user(new_usr, new_pwd)
-                users[new_usr] = new_pwd
+                append_user(users, new_usr, new_pwd)
                 print("\n✅ Account created")
             input("Press Enter to continue...")
         elif choice == "3":
@@ -155,7 +191,7 @@ def main():
     while True:
         reset_screen()
         print("===== 📋 MENU =====")
-        print("1. Show Products\n2. Add to Cart\n3. Remove from Cart\n4. View Cart\n5. Checkout\n6. Exit")
+        print("1. Show Products\n2. Add to Cart\n3. Remove from Cart\n4. View Cart\n5. Checkout\n6. Search Products\n7. Exit")
         opt = input("Choose: ")
         if opt == "1":
             shop.list_items()
@@ -171,7 +207,8 @@ def main():
         elif opt == "3":
             try:
                 pid = int(input("Product ID to remove: "))
-                shop.remove_item(pid)
+                qty = input("Quantity (Enter = all): ").strip()
+                shop.remove_item(pid, int(qty) if qty else None)
             except ValueError:
                 print("❌ Invalid input")
             input("Enter to continue...")
@@ -182,6 +219,9 @@ def main():
             shop.do_checkout()
             input("Enter to continue...")
         elif opt == "6":
+            shop.find_items(input("Search: "))
+            input("Enter to continue...")
+        elif opt == "7":
             sys.exit("\n👋 See you next time!")
         else:
             input("Invalid choice. Enter to retry...")
@@ -1,5 +1,10 @@
 import sys, os, csv, getpass
 
+from shopcore.catalog import load_catalog, as_number, update_stock
+from shopcore.money import from_cents, to_cents
+from shopcore.search import ProductSearchIndex
+from shopcore.user_index import UserIndex
+
 USERS_FILE, PRODUCTS_FILE = "users.txt", "products.txt"
 
 def clear_screen():
@@ -45,33 +50,26 @@ def refresh_screen():
 
 def load_users():
     """
-    Reads user credentials from the 'users.txt' file.
+    Opens the on-disk index of 'users.txt'.
     Returns:
-        A dictionary where keys are usernames and values are passwords.
+        A read-only mapping where keys are usernames and values are passwords;
+        each lookup reads only that user from the index.
     """
-    users = {}
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, "r") as f:
-            for line in f:
-                if ":" in line:
-                    u, p = line.strip().split(":", 1)
-                    users[u] = p
-    return users
-
-def save_user(u, p):
+    return UserIndex(USERS_FILE, ":", 2)
+
+def save_user(users, u, p):
     """
-    Appends a new user's username and password to the 'users.txt' file.
+    Appends a new user's username and password to 'users.txt' and its index.
     """
-    with open(USERS_FILE, "a") as f:
-        f.write(f"{u}:{p}\n")
+    users.add(u, p)
 
 def load_products():
     """
     Loads product data from 'products.txt'.
     """
     if os.path.exists(PRODUCTS_FILE):
-        with open(PRODUCTS_FILE, "r", newline='') as f:
-            return [[int(r[0]), r[1], int(r[2]), int(r[3])] for r in csv.reader(f) if len(r) >= 4]
+        table = load_catalog(PRODUCTS_FILE)
+        return [[int(pid), name, as_number(price), qty] for pid, name, price, _, qty in table.rows()]
     products = [
         [1, "Hoodie", 1500, 10],
         [2, "Jeans", 2000, 5],
@@ -84,6 +82,7 @@ def load_products():
 def save_products(products):
     """
     Writes the current list of products to 'products.txt'.
+    Only used to create the file; stock changes go through Store.change_stock().
     """
     with open(PRODUCTS_FILE, "w", newline='') as f:
         csv.writer(f).writerows(products)
@@ -91,7 +90,11 @@ def save_products(products):
 class Store:
     def __init__(self):
         self.products = load_products()
-        self.cart = []
+        # word index over product names; ids are positions in self.products
+        self.search_index = ProductSearchIndex((i, p[1], '') for i, p in enumerate(self.products))
+        self.by_id = {p[0]: p for p in self.products}  # product id -> product row
+        self.cart = {}  # product id -> [product row, qty], one line per product
+        self.cart_cents = 0  # running cart total
    
     def show_products(self):
         refresh_screen()
@@ -99,32 +102,69 @@ class Store:
         for pid, name, price, stock in self.products:
             print(f"{pid}. {name} - ₹{price} ({stock} left)")
 
+    def search_products(self, query):
+        refresh_screen()
+        print(f"\n🔍 Results for '{query}':")
+        matches = self.search_index.search(query)
+        if not matches:
+            print("No products found.")
+        for i in matches:
+            pid, name, price, stock = self.products[i]
+            print(f"{pid}. {name} - ₹{price} ({stock} left)")
+
     def add_to_cart(self, pid, qty):
         refresh_screen()
-        for p in self.products:
-            if p[0] == pid:
-                if p[3] >= qty:
-                    self.cart.append([p, qty])
-                    p[3] -= qty
-                    save_products(self.products)
-                    print(f"\n✅ Added {qty} x {p[1]}")
-                    return
-                else:
-                    print("\n❌ Not enough stock.")
-                    return
-        print("\n❌ Product not found.")
+        p = self.by_id.get(pid)
+        if p is None:
+            print("\n❌ Product not found.")
+            return
+        if qty <= 0:
+            print("\n❌ Invalid quantity.")
+            return
+        # products.txt has the say: this list may be behind other terminals.
+        if not self.change_stock(p, -qty):
+            print("\n❌ Not enough stock.")
+            return
+        if pid in self.cart:
+            self.cart[pid][1] += qty
+        else:
+            self.cart[pid] = [p, qty]
+        self.cart_cents += to_cents(p[2]) * qty
+        print(f"\n✅ Added {qty} x {p[1]}")
    
-    def remove_from_cart(self, pid):
+    def remove_from_cart(self, pid, qty=None):
+        # qty=None (or at least the line's quantity) removes the whole line
         refresh_screen()
-        for item in self.cart:
-            p, q = item
-            if p[0] == pid:
-                self.cart.remove(item)
-                p[3] += q
-                save_products(self.products)
-                print(f"\n🗑️ Removed {p[1]}")
-                return
-        print("\n❌ Item not in cart.")
+        item = self.cart.get(pid)
+        if item is None:
+            print("\n❌ Item not in cart.")
+            return
+        p, q = item
+        if qty is None or qty >= q:
+            qty = q
+            del self.cart[pid]
+        elif qty <= 0:
+            print("\n❌ Invalid quantity.")
+            return
+        else:
+            item[1] -= qty
+        self.cart_cents -= to_cents(p[2]) * qty
+        self.change_stock(p, qty)
+        print(f"\n🗑️ Removed {qty} x {p[1]}")
+
+    def change_stock(self, p, delta):
+        """
+        Changes product p's stock by delta in 'products.txt', which other
+        terminals may be changing at the same time, and takes their changes
+        into this store's product list.
+        Returns False, changing nothing, if the stock is no longer there.
+        """
+        applied, table = update_stock(PRODUCTS_FILE, {str(p[0]): delta})
+        for pid, qty in zip(table.ids, table.quantities):
+            row = self.by_id.get(int(pid))
+            if row is not None:
+                row[3] = qty
+        return applied
    
     def show_cart(self):
         refresh_screen()
@@ -132,11 +172,9 @@ class Store:
         if not self.cart:
             print("Cart is empty.")
             return 0
-        total = 0
-        for p, q in self.cart:
-            cost = p[2] * q
-            total += cost
-            print(f"- {p[1]} x{q} = ₹{cost}")
+        for p, q in self.cart.values():
+            print(f"- {p[1]} x{q} = ₹{from_cents(to_cents(p[2]) * q)}")
+        total = from_cents(self.cart_cents)
         print(f"Total = ₹{total}\n")
         return total
    
@@ -145,6 +183,7 @@ class Store:
         if total:
             print("💳 Processing...\n🎉 Thank you for shopping!")
             self.cart.clear()
+            self.cart_cents = 0
         else:
             print("❌ Nothing to checkout.")
 
@@ -169,8 +208,7 @@ def login_menu():
                 print("\n❌ Taken.")
             else:
                 p = getpass.getpass("New password: ")
-                save_user(u, p)
-                users[u] = p
+                save_user(users, u, p)
                 print("\n✅ Registered.")
             input("Enter to continue...")
         elif c == "3":
@@ -184,7 +222,7 @@ def main():
     s = Store()
     while True:
         refresh_screen()
-        print("===== MENU =====\n1. Show Products\n2. Add to Cart\n3. Remove from Cart\n4. View Cart\n5. Checkout\n6. Exit")
+        print("===== MENU =====\n1. Show Products\n2. Add to Cart\n3. Remove from Cart\n4. View Cart\n5. Checkout\n6. Search Products\n7. Exit")
         c = input("Choose: ")
         if c == "1":
             s.show_products()
@@ -197,7 +235,9 @@ def main():
             input("Enter to continue...")
         elif c == "3":
             try:
-                s.remove_from_cart(int(input("Product ID to remove: ")))
+                pid = int(input("Product ID to remove: "))
+                qty = input("Quantity (Enter for all): ").strip()
+                s.remove_from_cart(pid, int(qty) if qty else None)
             except:
                 print("\n❌ Invalid.")
             input("Enter to continue...")
@@ -208,6 +248,9 @@ def main():
             s.checkout()
             input("Enter to continue...")
         elif c == "6":
+            s.search_products(input("Search: "))
+            input("Enter to continue...")
+        elif c == "7":
             sys.exit("\n👋 Goodbye, Come again")
         else:
             input("\n❌ Invalid. Enter to retry...")
@@ -1,5 +1,8 @@
 import sys
 
+from shopcore.money import from_cents, to_cents
+from shopcore.search import ProductSearchIndex
+
 class Product:
     def __init__(self, pid, name, price, stock):
         self.pid = pid
@@ -14,10 +17,23 @@ class Store:
     def __init__(self, name):
         self.name = name
         self.products = []
-        self.cart = []
+        self.search_index = ProductSearchIndex()  # ids are positions in self.products
+        self.by_id = {}  # pid -> Product
+        self.cart = {}  # pid -> [product, qty], one line per product
+        self.cart_cents = 0  # running cart total
 
     def add_product(self, product):
         self.products.append(product)
+        self.by_id[product.pid] = product
+        self.search_index.add(len(self.products) - 1, product.name)
+
+    def search_products(self, query):
+        print(f"\n🔍 Results for '{query}':")
+        matches = self.search_index.search(query)
+        if not matches:
+            print("No products found.")
+        for i in matches:
+            print(self.products[i])
 
     def show_products(self):
         print(f"\n🧥 Welcome to {self.name} Collection 🧥")
@@ -25,24 +41,26 @@ class Store:
             print(product)
 
     def add_to_cart(self, pid, qty):
-        for product in self.products:
-            if product.pid == pid:
-                if product.stock >= qty:
-                    self.cart.append((product, qty))
-                    product.stock -= qty
-                    print(f"✅ Added {qty} x {product.name} to cart.")
-                else:
-                    print("❌ Not enough stock.")
-                return
-        print("❌ Product not found.")
+        product = self.by_id.get(pid)
+        if product is None:
+            print("❌ Product not found.")
+            return
+        if product.stock >= qty:
+            if pid in self.cart:
+                self.cart[pid][1] += qty
+            else:
+                self.cart[pid] = [product, qty]
+            self.cart_cents += to_cents(product.price) * qty
+            product.stock -= qty
+            print(f"✅ Added {qty} x {product.name} to cart.")
+        else:
+            print("❌ Not enough stock.")
 
     def show_cart(self):
         print("\n🛒 Your Cart:")
-        total = 0
-        for product, qty in self.cart:
-            cost = product.price * qty
-            total += cost
-            print(f"- {product.name} x{qty} = ₹{cost}")
+        for product, qty in self.cart.values():
+            print(f"- {product.name} x{qty} = ₹{from_cents(to_cents(product.price) * qty)}")
+        total = from_cents(self.cart_cents)
         print(f"Total = ₹{total}\n")
         return total
 
@@ -51,6 +69,7 @@ class Store:
         print("💳 Processing payment...")
         print("🎉 Thank you for shopping with us!")
         self.cart.clear()
+        self.cart_cents = 0
 
 def main():
     store = Store("CLI Couture")
@@ -65,7 +84,8 @@ def main():
         print("2. Add to Cart")
         print("3. View Cart")
         print("4. Checkout")
-        print("5. Exit")
+        print("5. Search Products")
+        print("6. Exit")
 
         choice = input("Choose an option: ")
 
@@ -83,6 +103,8 @@ def main():
         elif choice == "4":
             store.checkout()
         elif choice == "5":
+            store.search_products(input("Search: "))
+        elif choice == "6":
             print("👋 Goodbye, stylish soul!")
             sys.exit()
         else:
@@ -2,6 +2,8 @@ import tkinter as tk
 from tkinter import messagebox, simpledialog
 import datetime
 
+from shopcore.money import from_cents, to_cents
+
 # -------------------- Product Class --------------------
 class Product:
     def __init__(self, product_id, name, price, quantity, description=""):
@@ -19,6 +21,9 @@ class Product:
 class ShoppingCart:
     def __init__(self):
         self.items = {}
+        # Running totals, updated by every add and remove.
+        self.subtotal_cents = 0
+        self.item_count = 0
 
     def add_to_cart(self, product, quantity):
         if quantity <= 0:
@@ -26,10 +31,10 @@ class ShoppingCart:
         if quantity > product.quantity:
             return False, f"Only {product.quantity} units of {product.name} available."
 
-        if product in self.items:
-            self.items[product]['quantity'] += quantity
-        else:
-            self.items[product] = {'price': product.price, 'quantity': quantity}
+        if product not in self.items:
+            self.items[product] = {'price': product.price, 'quantity': 0,
+                                   'unit_cents': to_cents(product.price), 'total_cents': 0}
+        self.update_line(product, quantity)
 
         product.quantity -= quantity
         return True, f"{quantity} units of {product.name} added."
@@ -40,20 +45,29 @@ class ShoppingCart:
         if quantity <= 0 or quantity > self.items[product]['quantity']:
             return False, "Invalid quantity."
 
-        self.items[product]['quantity'] -= quantity
+        self.update_line(product, -quantity)
         product.quantity += quantity
 
         if self.items[product]['quantity'] == 0:
             del self.items[product]
         return True, f"{quantity} units of {product.name} removed."
 
+    def update_line(self, product, quantity):
+        details = self.items[product]
+        details['quantity'] += quantity
+        details['total_cents'] += details['unit_cents'] * quantity
+        self.subtotal_cents += details['unit_cents'] * quantity
+        self.item_count += quantity
+
     def clear_cart(self):
         for product, details in self.items.items():
             product.quantity += details['quantity']
         self.items.clear()
+        self.subtotal_cents = 0
+        self.item_count = 0
 
     def calculate_total(self):
-        return sum(details['price'] * details['quantity'] for details in self.items.values())
+        return from_cents(self.subtotal_cents)
 
 
 # -------------------- User Class --------------------
@@ -221,7 +235,10 @@ class ShoppingCartApp:
         confirm = messagebox.askyesno("Checkout", f"Total: ${total:.2f}. Proceed?")
 
         if confirm:
-            order = {"items": cart.items.copy(), "total": total, "date": datetime.datetime.now()}
+            # Lines are (product_id, quantity, unit_cents) snapshots, not live Products.
+            items = tuple((product.product_id, details['quantity'], details['unit_cents'])
+                          for product, details in cart.items.items())
+            order = {"items": items, "total": total, "date": datetime.datetime.now()}
             self.current_user.add_order_to_history(order)
             cart.clear_cart()
             messagebox.showinfo("Checkout", "Order placed successfully!")
@@ -1,5 +1,11 @@
+import os
 import sys
 
+from shopcore.catalog import load_catalog, as_number
+from shopcore.money import from_cents, to_cents
+from shopcore.search import ProductSearchIndex
+from shopcore.user_index import UserIndex
+
 class Product:
     def __init__(self, pid, name, price, stock):
         self.pid = pid
@@ -14,10 +20,23 @@ class Store:
     def __init__(self, name):
         self.name = name
         self.products = []
-        self.cart = []
+        self.search_index = ProductSearchIndex()  # ids are positions in self.products
+        self.by_id = {}  # pid -> Product
+        self.cart = {}  # pid -> [product, qty], one line per product
+        self.cart_cents = 0  # running cart total
 
     def add_product(self, product):
         self.products.append(product)
+        self.by_id[product.pid] = product
+        self.search_index.add(len(self.products) - 1, product.name)
+
+    def search_products(self, query):
+        print(f"\n🔍 Results for '{query}':")
+        matches = self.search_index.search(query)
+        if not matches:
+            print("No products found.")
+        for i in matches:
+            print(self.products[i])
 
     def show_products(self):
         print(f"\n🧥 Welcome to {self.name} Collection 🧥")
@@ -25,27 +44,29 @@ class Store:
             print(product)
 
     def add_to_cart(self, pid, qty):
-        for product in self.products:
-            if product.pid == pid:
-                if product.stock >= qty:
-                    self.cart.append((product, qty))
-                    product.stock -= qty
-                    print(f"✅ Added {qty} x {product.name} to cart.")
-                else:
-                    print("❌ Not enough stock.")
-                return
-        print("❌ Product not found.")
+        product = self.by_id.get(pid)
+        if product is None:
+            print("❌ Product not found.")
+            return
+        if product.stock >= qty:
+            if pid in self.cart:
+                self.cart[pid][1] += qty
+            else:
+                self.cart[pid] = [product, qty]
+            self.cart_cents += to_cents(product.price) * qty
+            product.stock -= qty
+            print(f"✅ Added {qty} x {product.name} to cart.")
+        else:
+            print("❌ Not enough stock.")
 
     def show_cart(self):
         print("\n🛒 Your Cart:")
         if not self.cart:
             print("Cart is empty!")
             return 0
-        total = 0
-        for product, qty in self.cart:
-            cost = product.price * qty
-            total += cost
-            print(f"- {product.name} x{qty} = ₹{cost}")
+        for product, qty in self.cart.values():
+            print(f"- {product.name} x{qty} = ₹{from_cents(to_cents(product.price) * qty)}")
+        total = from_cents(self.cart_cents)
         print(f"Total = ₹{total}\n")
         return total
 
@@ -55,18 +76,16 @@ class Store:
             print("💳 Processing payment...")
             print("🎉 Thank you for shopping with us!")
             self.cart.clear()
+            self.cart_cents = 0
             save_products(self.products)   # Persist stock update here
 
 # Load products directly from products.txt
 def load_products():
     products = []
     try:
-        with open("products.txt", "r") as f:
-            for line in f:
-                parts = line.strip().split(",")
-                if len(parts) == 4:
-                    pid, name, price, stock = parts
-                    products.append(Product(int(pid), name, int(price), int(stock)))
+        table = load_catalog("products.txt")
+        for pid, name, price, _, stock in table.rows():
+            products.append(Product(int(pid), name, as_number(price), stock))
     except FileNotFoundError:
         print("❌ File 'products.txt' not found. Starting with empty store.")
     return products
@@ -77,24 +96,15 @@ def save_products(products):
         for product in products:
             f.write(f"{product.pid},{product.name},{product.price},{product.stock}\n")
 
-# Load users from users.txt
+# Open the on-disk index of users.txt (lookups don't read the whole file)
 def load_users():
-    users = {}
-    try:
-        with open("users.txt", "r") as f:
-            for line in f:
-                parts = line.strip().split(",")
-                if len(parts) == 2:
-                    username, password = parts
-                    users[username] = password
-    except FileNotFoundError:
+    if not os.path.exists("users.txt"):
         print("❌ File 'users.txt' not found. No users available.")
-    return users
+    return UserIndex("users.txt", ",", 2)
 
-# Save new user to users.txt
-def save_user(username, password):
-    with open("users.txt", "a") as f:
-        f.write(f"{username},{password}\n")
+# Save new user to users.txt and its index
+def save_user(users, username, password):
+    users.add(username, password)
 
 # Login
 def login(users):
@@ -118,8 +128,7 @@ def register(users):
         else:
             break
     password = input("Choose a password: ").strip()
-    save_user(username, password)
-    users[username] = password
+    save_user(users, username, password)
     print(f"✅ User '{username}' registered successfully!")
     return username
 
@@ -160,8 +169,9 @@ def main():
             print("2. Add to Cart")
             print("3. View Cart")
             print("4. Checkout")
-            print("5. Logout")
-            print("6. Exit")
+            print("5. Search Products")
+            print("6. Logout")
+            print("7. Exit")
 
             choice = input("Choose an option: ")
 
@@ -179,9 +189,11 @@ def main():
             elif choice == "4":
                 store.checkout()
             elif choice == "5":
+                store.search_products(input("Search: "))
+            elif choice == "6":
                 print(f"👋 Logged out, {current_user}.")
                 current_user = None
-            elif choice == "6":
+            elif choice == "7":
                 print(f"👋 Goodbye, {current_user}!")
                 sys.exit()
             else:
@@ -0,0 +1,771 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from shopcore import catalog, durable
+
+
+# python benchmarks.py [name...] runs the named benchmarks (all by default).
+
+def bench_group_commit(threads=16, saves=50, window=0.0):
+    """
+    A burst of checkouts from many threads, each appending its stock change
+    to the shared journal: one fsync per append versus a GroupCommitWriter
+    sharing each fsync across the burst.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'products_journal.txt')
+
+        def run(append):
+            latencies = []
+
+            def worker(n):
+                for i in range(saves):
+                    start = time.perf_counter()
+                    append(path, f"{n};-1;{i}\n")
+                    latencies.append(time.perf_counter() - start)
+
+            workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+            start = time.perf_counter()
+            for t in workers:
+                t.start()
+            for t in workers:
+                t.join()
+            elapsed = time.perf_counter() - start
+            latencies.sort()
+            return elapsed, latencies
+
+        def report(label, elapsed, latencies):
+            print(f"{label:<16}{threads * saves / elapsed:8.0f} saves/s, "
+                  f"mean {sum(latencies) / len(latencies) * 1000:.2f} ms, "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+
+        report("durable_append", *run(durable.durable_append))
+
+        writer = durable.GroupCommitWriter(window)
+        report("group commit", *run(writer.append))
+        writer.close()
+        stats = writer.stats()
+        print(f"{stats['requests']} requests in {stats['batches']} batches / {stats['writes']} fsynced writes")
+
+
+def bench_catalog_load(rows=1_000_000):
+    """
+    Loading a generated products.txt of `rows` products in each dialect:
+    the old line-by-line loop from main.py versus catalog.load_catalog().
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        for dialect, line in ((catalog.SEMICOLON, "{0};Product {0};{1}.5;Description of product {0};{2}\n"),
+                              (catalog.COMMA, "{0},Product {0},{1},{2}\n")):
+            path = os.path.join(directory, f'products_{dialect}.txt')
+            with open(path, 'w') as f:
+                f.writelines(line.format(i, i % 5000, i % 100) for i in range(rows))
+
+            start = time.perf_counter()
+            products = {}
+            with open(path, 'r') as f:
+                for text in f:
+                    text = text.strip()
+                    if text:
+                        if dialect == catalog.SEMICOLON:
+                            product_id, name, price, description, quantity = text.split(';')
+                        else:
+                            product_id, name, price, quantity = text.split(',')
+                            description = ''
+                        products[product_id] = (product_id, name, float(price), description, int(quantity))
+            line_by_line = time.perf_counter() - start
+
+            start = time.perf_counter()
+            table = catalog.load_catalog(path)
+            bulk = time.perf_counter() - start
+            assert len(table) == rows
+            print(f"{dialect:<10} {rows} rows: line by line {line_by_line:.2f} s, load_catalog {bulk:.2f} s")
+
+
+def bench_mapped_catalog(rows=1_000_000, lookups=10_000):
+    """
+    Opening a products.txt of `rows` products as a MappedCatalog, the first
+    time (scan and persist the offset index) and again (index reused), and
+    random product lookups through it.
+    """
+    import random
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'products.txt')
+        with open(path, 'w') as f:
+            f.writelines(f"{i};Product {i};{i % 5000}.5;Description of product {i};{i % 100}\n" for i in range(rows))
+        for label in ("first open", "reopen"):
+            start = time.perf_counter()
+            mapped = catalog.MappedCatalog(path)
+            print(f"{label:<12} {time.perf_counter() - start:.3f} s")
+            if label == "reopen":
+                ids = [str(random.randrange(rows)) for _ in range(lookups)]
+                start = time.perf_counter()
+                for product_id in ids:
+                    mapped.get(product_id)
+                print(f"lookup       {(time.perf_counter() - start) / lookups * 1e6:.1f} us each")
+            mapped.close()
+
+
+def bench_model_memory(products=100_000, orders=100_000, lines=3):
+    """
+    Memory held by `products` Products plus `orders` Orders of `lines` lines
+    each: the old __dict__ classes with nested line dicts versus the slotted
+    Product and the Order in shopcore.models, whose lines are compact
+    (product_id, quantity, unit_cents) tuples.
+    """
+    import datetime
+    import tracemalloc
+    from shopcore import models
+
+    class DictProduct:
+        def __init__(self, product_id, name, price, description, quantity):
+            self.product_id = product_id
+            self.name = name
+            self.price = price
+            self.description = description
+            self.quantity = quantity
+
+        def __hash__(self):
+            return hash(self.product_id)
+
+    class DictOrder:
+        def __init__(self, items, total):
+            self.date = datetime.datetime.now()
+            self.items = {product: {'product': product, 'quantity': details['quantity']} for product, details in items.items()}
+            self.total = total
+
+    def build(product_class, make_order, line):
+        tracemalloc.start()
+        catalog_ = [product_class(str(i), "Name", 1.0, "Description", 10) for i in range(products)]
+        history = [make_order({p: line(p, 1) for p in catalog_[i:i + lines]}, 1.0) for i in range(orders)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del catalog_, history
+        return size
+
+    before = build(DictProduct, DictOrder, lambda p, q: {'product': p, 'quantity': q})
+    after = build(models.Product, models.Order.from_cart, models.CartLine)
+    print(f"dict-based: {before / 2**20:7.1f} MiB")
+    print(f"compact:    {after / 2**20:7.1f} MiB ({100 * (before - after) / before:.0f}% less)")
+
+
+def bench_search(products=1_000_000, queries=2_000):
+    """
+    Building a ProductSearchIndex over `products` generated names and
+    descriptions, then median and p99 latency of ranked queries: common
+    words, rare words, prefixes and multi-word queries.
+    """
+    import random
+    from shopcore import search
+    rng = random.Random(1)
+    flavours = ["vanilla", "chocolate", "strawberry", "mango", "pistachio", "coffee", "caramel", "mint",
+                "cookie", "lemon", "coconut", "hazelnut", "cherry", "banana", "peach", "raspberry"]
+    forms = ["cone", "cup", "sundae", "shake", "bar", "sandwich", "tub", "float"]
+    words = [f"w{n}" for n in range(20_000)]
+    entries = [(str(i), f"{rng.choice(flavours)} {rng.choice(forms)} {rng.choice(words)}",
+                " ".join(rng.choices(words, k=6))) for i in range(products)]
+    start = time.perf_counter()
+    index = search.ProductSearchIndex(entries)
+    print(f"build        {time.perf_counter() - start:.2f} s for {products} products")
+    kinds = {
+        'common word': lambda: rng.choice(flavours),
+        'rare word': lambda: rng.choice(words),
+        'prefix': lambda: rng.choice(flavours)[:3],
+        'two words': lambda: f"{rng.choice(flavours)} {rng.choice(forms)}",
+        'word + rare': lambda: f"{rng.choice(flavours)} {rng.choice(words)}",
+    }
+    for kind, make in kinds.items():
+        latencies = []
+        for _ in range(queries):
+            query = make()
+            start = time.perf_counter()
+            index.search(query)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"{kind:<12} median {latencies[len(latencies) // 2] * 1e3:.3f} ms  "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:.3f} ms")
+
+
+def bench_product_filters(products=1_000_000, queries=1_000):
+    """
+    One 50-product page of "price between X and Y, in stock, sorted by price"
+    from ProductIndexes, versus filtering and sorting the whole catalog for
+    every page; plus the cost of a stock update.
+    """
+    import random
+    from shopcore import models, sorted_index
+    rng = random.Random(1)
+    catalog_ = [models.Product(str(i), f"Product {i}", rng.randrange(100, 100_000) / 100, "", rng.randrange(0, 50))
+                for i in range(products)]
+    start = time.perf_counter()
+    indexes = sorted_index.ProductIndexes(catalog_)
+    print(f"build        {time.perf_counter() - start:.2f} s")
+    ranges = [sorted(rng.uniform(1, 1000) for _ in range(2)) for _ in range(queries)]
+    start = time.perf_counter()
+    for low, high in ranges:
+        indexes.query(low, high, True, sorted_index.ProductIndexes.PRICE, 0, 50)
+    print(f"indexed      {(time.perf_counter() - start) / queries * 1e3:.3f} ms per page")
+    sample = ranges[:10]
+    start = time.perf_counter()
+    for low, high in sample:
+        sorted((p for p in catalog_ if low <= p.price <= high and p.quantity > 0), key=lambda p: p.price)[:50]
+    print(f"full sort    {(time.perf_counter() - start) / len(sample) * 1e3:.3f} ms per page")
+    start = time.perf_counter()
+    for _ in range(queries):
+        product = rng.choice(catalog_)
+        product.quantity = rng.randrange(0, 50)
+        indexes.update(product)
+    print(f"update       {(time.perf_counter() - start) / queries * 1e6:.1f} us per stock change")
+
+
+def bench_history_index(orders=200_000, queries=1_000):
+    """
+    "Orders in this 30-day window" and "orders containing this product" over
+    a history of `orders` orders: OrderHistoryIndex versus walking the list.
+    """
+    import datetime
+    import random
+    from shopcore import history_index
+    rng = random.Random(1)
+    start_date = datetime.datetime(2020, 1, 1)
+    history = [(start_date + datetime.timedelta(minutes=15 * n), [str(rng.randrange(5000)) for _ in range(3)])
+               for n in range(orders)]
+    index = history_index.OrderHistoryIndex()
+    started = time.perf_counter()
+    for date, product_ids in history:
+        index.add(date, product_ids, (date, product_ids))
+    print(f"build        {time.perf_counter() - started:.2f} s")
+    windows = [start_date + datetime.timedelta(days=rng.randrange(2000)) for _ in range(queries)]
+    products = [str(rng.randrange(5000)) for _ in range(queries)]
+    for label, indexed, scan in (
+            ("date range", lambda i: index.between(windows[i], windows[i] + datetime.timedelta(days=30)),
+             lambda i: [o for o in history if windows[i] <= o[0] < windows[i] + datetime.timedelta(days=30)]),
+            ("by product", lambda i: index.containing(products[i]),
+             lambda i: [o for o in history if products[i] in o[1]])):
+        started = time.perf_counter()
+        for i in range(queries):
+            indexed(i)
+        fast = (time.perf_counter() - started) / queries
+        started = time.perf_counter()
+        for i in range(10):
+            scan(i)
+        slow = (time.perf_counter() - started) / 10
+        print(f"{label:<12} indexed {fast * 1e3:.3f} ms, scan {slow * 1e3:.1f} ms")
+
+
+def load_script(filename):
+    # The CLI scripts' file names are not importable module names.
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(filename.replace('-', '_').replace('.py', ''),
+                                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_cli_carts(adds=100_000, catalog_sizes=(1_000, 100_000)):
+    """
+    `adds` scripted add-to-cart calls on random products against each CLI
+    store, for a small and a large catalog. Lookups go through the stores'
+    product-id dicts, so the time per add should not grow with the catalog.
+    Output goes to os.devnull, and the screen clearing and the per-add
+    products.txt update of CLI-v-2 and CLI-3 are switched off, so only the
+    cart work is timed.
+    """
+    import contextlib
+    import random
+
+    def change_stock(row, delta):
+        row[3] += delta
+        return True
+
+    def row_store(filename, store_class, load, method):
+        module = load_script(filename)
+        for name in ('refresh_screen', 'reset_screen'):
+            if hasattr(module, name):
+                setattr(module, name, lambda *args: None)
+
+        def build(size):
+            setattr(module, load, lambda: [[pid, f"Product {pid}", 100 + pid % 900, 10 ** 9] for pid in range(1, size + 1)])
+            store = getattr(module, store_class)()
+            store.change_stock = change_stock
+            return getattr(store, method)
+        return build
+
+    def object_store(filename):
+        module = load_script(filename)
+
+        def build(size):
+            store = module.Store("Bench")
+            for pid in range(1, size + 1):
+                store.add_product(module.Product(pid, f"Product {pid}", 100 + pid % 900, 10 ** 9))
+            return store.add_to_cart
+        return build
+
+    stores = {
+        'CLI-v-2.py': row_store('CLI-v-2.py', 'Store', 'load_products', 'add_to_cart'),
+        'CLI-3.py': row_store('CLI-3.py', 'Shop', 'load_products_from_file', 'add_item'),
+        'VEr-6.py': object_store('VEr-6.py'),
+        'CLI.py': object_store('CLI.py'),
+    }
+    rng = random.Random(1)
+    for filename, build in stores.items():
+        timings = []
+        for size in catalog_sizes:
+            add = build(size)
+            pids = [rng.randint(1, size) for _ in range(adds)]
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                started = time.perf_counter()
+                for pid in pids:
+                    add(pid, 1)
+                elapsed = time.perf_counter() - started
+            timings.append(f"{size:>7} products {elapsed / adds * 1e6:5.2f} us/add")
+        print(f"{filename:<11} " + ", ".join(timings))
+
+
+def bench_inventory_stress(threads=32, operations=5_000, skus=4, stock=20_000):
+    """
+    `threads` shopper sessions hammering `skus` hot products at once:
+    reserving, releasing, checking out their holds and placing multi-line
+    orders with InventoryService.take_all, while expired holds are swept.
+    The products sell out part way through. Afterwards every unit must be
+    on the shelf, held or sold exactly once, and no product may have gone
+    below zero.
+    """
+    import random
+    from shopcore import InventoryService, ReservationBook
+
+    class Item:
+        __slots__ = ('product_id', 'quantity')
+
+        def __init__(self, product_id, quantity):
+            self.product_id = product_id
+            self.quantity = quantity
+
+    items = [Item(str(n), stock) for n in range(skus)]
+    inventory = InventoryService()
+    book = ReservationBook(ttl=0.001, inventory=inventory)
+    sold = {item.product_id: 0 for item in items}
+    sold_lock = threading.Lock()
+    lowest = [stock]
+
+    def session(n):
+        owner = f"s{n}"
+        rng = random.Random(n)
+        for _ in range(operations):
+            if rng.random() < 0.5:
+                book.reserve(owner, rng.choice(items), rng.randint(1, 3))
+                if rng.random() < 0.3:
+                    book.release(owner, rng.choice(items), 1)
+                if rng.random() < 0.1:
+                    book.sweep()
+                sales = book.commit(owner) if rng.random() < 0.3 else []
+            else:
+                lines = [(item, rng.randint(1, 3)) for item in rng.sample(items, rng.randint(1, skus))]
+                sales = lines if inventory.take_all(lines) else []
+            with sold_lock:
+                for item, quantity in sales:
+                    sold[item.product_id] += quantity
+                lowest[0] = min(lowest[0], *(item.quantity for item in items))
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads as often as possible
+    try:
+        workers = [threading.Thread(target=session, args=(n,)) for n in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        sys.setswitchinterval(switch_interval)
+    for item in items:
+        accounted = item.quantity + book.held(item.product_id) + sold[item.product_id]
+        assert accounted == stock, f"product {item.product_id}: {accounted} units accounted for, expected {stock}"
+    assert lowest[0] >= 0, f"stock went down to {lowest[0]}"
+    assert sum(hold.quantity for hold in book.holds.values()) == sum(book.held_by_product.values())
+    print(f"{threads * operations / elapsed:,.0f} operations/s over {threads} threads; "
+          f"{sum(sold.values())} of {skus * stock} units sold, {sum(book.held_by_product.values())} held, "
+          f"every unit accounted for, lowest stock {lowest[0]}")
+
+
+def checkout_session(path, n, orders, skus, text=False):
+    # One shopper process for bench_checkout_conflicts; returns what it sold.
+    import contextlib
+    import queue
+    import random
+    from shopcore import ConflictError, OutOfStockError, Shop, SQLiteStorage, TextFileStorage
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # quiet about the files a new shopper lacks
+        shop = Shop(TextFileStorage(path) if text else SQLiteStorage(path))
+    conflicts = [0]
+    commit_stock = shop.storage.commit_stock
+
+    def counting_commit(lines):
+        try:
+            return commit_stock(lines)
+        except ConflictError:
+            conflicts[0] += 1
+            raise
+    shop.storage.commit_stock = counting_commit
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        shop.register(f"shopper{n}", "pw", "Bench", str(n), "Here")
+        user = shop.login(f"shopper{n}", "pw")
+    rng = random.Random(n)
+    sold = {str(pid): 0 for pid in range(1, skus + 1)}
+    placed = rejected = 0
+    for _ in range(orders):
+        for pid in rng.sample(sorted(sold), rng.randint(1, skus)):
+            try:
+                shop.add_item(user, pid, rng.randint(1, 3))
+            except OutOfStockError:
+                pass
+        if not user.cart.items:
+            continue
+        # Without a scheduler the checkout's callbacks run on the worker.
+        result = queue.Queue()
+        shop.place_order(user, result.put, result.put)
+        order = result.get()
+        if isinstance(order, (OutOfStockError, ConflictError)):
+            rejected += 1
+            for product in list(user.cart.items):
+                shop.remove_item(user, product.product_id, user.cart.items[product].quantity)
+            continue
+        placed += 1
+        for product_id, quantity, _ in order.lines:
+            sold[product_id] += quantity
+    shop.logout(user)
+    shop.shutdown()
+    return sold, placed, conflicts[0], rejected
+
+
+def bench_checkout_conflicts(processes=4, orders=300, skus=3, stock=1_000, text=False):
+    """
+    `processes` shop processes sharing one SQLite store (or, with text, one
+    directory of text files), each trying `orders` checkouts over the same
+    `skus` products until they sell out. Checkouts are optimistic
+    (versioned stock, retried on conflict), so no lock is held between
+    processes; afterwards every unit must be in stock or sold exactly once
+    and no product may have gone below zero.
+    """
+    import multiprocessing
+    from shopcore import SQLiteStorage, TextFileStorage
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = directory if text else os.path.join(directory, 'shop.db')
+        storage = TextFileStorage(path) if text else SQLiteStorage(path)
+        storage.save_products([(str(pid), f"Product {pid}", 100, "Bench product", stock) for pid in range(1, skus + 1)])
+        started = time.perf_counter()
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(checkout_session, [(path, n, orders, skus, text) for n in range(processes)])
+        elapsed = time.perf_counter() - started
+        stored = storage.load_stock([str(pid) for pid in range(1, skus + 1)])
+        ordered = {}
+        for _, (_, lines, _) in storage.load_all_history():
+            for product_id, quantity, _ in lines:
+                ordered[product_id] = ordered.get(product_id, 0) + quantity
+        storage.close()
+    sold = {product_id: sum(result[0][product_id] for result in results) for product_id in stored}
+    assert ordered == {product_id: units for product_id, units in sold.items() if units}
+    for product_id, (quantity, _) in stored.items():
+        assert quantity >= 0, f"product {product_id} went down to {quantity}"
+        assert quantity + sold[product_id] == stock, f"product {product_id}: {quantity + sold[product_id]} units accounted for"
+    placed, conflicts, rejected = (sum(result[i] for result in results) for i in (1, 2, 3))
+    print(f"{placed / elapsed:,.0f} checkouts/s over {processes} processes; {placed} placed, {rejected} rejected, "
+          f"{conflicts} version conflicts retried; {sum(sold.values())} of {skus * stock} units sold, "
+          f"every unit accounted for")
+
+
+def bench_text_checkout_conflicts():
+    # bench_checkout_conflicts on the text store, whose commits lock products.txt.
+    bench_checkout_conflicts(text=True)
+
+
+def bench_checkout_compaction(shoppers=4, rounds=200, skus=5, stock=100_000, compact_every=7):
+    """
+    Checkouts on the text store with the journal folded into products.txt
+    every `compact_every` entries. All `shoppers` check out at once each
+    round, so commits, compactions and other carts' holds overlap. After a
+    restart, the stored stock plus what was sold must equal the starting
+    stock: held stock must not be counted back in and no sale may be lost
+    with the emptied journal.
+    """
+    import contextlib
+    import queue
+    import random
+    from shopcore import Shop, TextFileStorage
+    from shopcore import storage as storage_module
+
+    compact_every, storage_module.JOURNAL_COMPACT_EVERY = storage_module.JOURNAL_COMPACT_EVERY, compact_every
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            storage = TextFileStorage(directory)
+            storage.save_products([(str(pid), f"Product {pid}", 100, "Bench product", stock)
+                                   for pid in range(1, skus + 1)])
+            snapshots = [0]
+            write_snapshot = storage.write_snapshot
+
+            def counting_snapshot(products):
+                snapshots[0] += 1
+                write_snapshot(products)
+            storage.write_snapshot = counting_snapshot
+            users = []
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                shop = Shop(storage)  # quiet about the files new shoppers lack
+                for n in range(shoppers):
+                    shop.register(f"shopper{n}", "pw", "Bench", str(n), "Here")
+                    users.append(shop.login(f"shopper{n}", "pw"))
+            rng = random.Random(0)
+            sold = {str(pid): 0 for pid in range(1, skus + 1)}
+            placed = 0
+            started = time.perf_counter()
+            for _ in range(rounds):
+                # Without a scheduler the checkouts' callbacks run on the worker.
+                results = queue.Queue()
+                checkouts = 0
+                for user in users:
+                    for pid in rng.sample(sorted(sold), rng.randint(1, skus)):
+                        shop.add_item(user, pid, rng.randint(1, 3))
+                    # About half the shoppers keep their carts, so stock is
+                    # held while the others' commits compact the journal.
+                    if rng.random() < 0.5:
+                        shop.place_order(user, results.put, results.put)
+                        checkouts += 1
+                for _ in range(checkouts):
+                    order = results.get()
+                    for product_id, quantity, _ in order.lines:
+                        sold[product_id] += quantity
+                placed += checkouts
+            elapsed = time.perf_counter() - started
+            shop.shutdown()
+            stored = {row[0]: row[4] for row in TextFileStorage(directory).load_products()}
+    finally:
+        storage_module.JOURNAL_COMPACT_EVERY = compact_every
+    for product_id, quantity in stored.items():
+        assert quantity + sold[product_id] == stock, \
+            f"product {product_id}: {quantity + sold[product_id]} units accounted for, expected {stock}"
+    print(f"{placed / elapsed:,.0f} checkouts/s; {placed} placed, {snapshots[0]} snapshots; "
+          f"{sum(sold.values())} units sold, every unit accounted for after a restart")
+
+
+def cli_terminal(filename, path, n, operations, blind):
+    # One CLI terminal process for bench_shared_products; returns its cart
+    # as {product id: quantity}.
+    import contextlib
+    import random
+
+    module = load_script(filename)
+    module.PRODUCTS_FILE = path
+    for name in ('refresh_screen', 'reset_screen'):
+        if hasattr(module, name):
+            setattr(module, name, lambda *args: None)
+    store_class, add, remove = (('Store', 'add_to_cart', 'remove_from_cart') if filename == 'CLI-v-2.py'
+                                else ('Shop', 'add_item', 'remove_item'))
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        store = getattr(module, store_class)()
+        if blind:
+            # What the CLIs used to do: write this process's whole product
+            # list (atomically here, so other terminals never read half a file).
+            rows = store.products if hasattr(store, 'products') else store.items
+
+            def change_stock(row, delta):
+                row[3] += delta
+                durable.atomic_write(path, ''.join(f"{pid},{name},{price},{qty}\n" for pid, name, price, qty in rows))
+                return True
+            store.change_stock = change_stock
+        rng = random.Random(n)
+        pids = sorted(store.by_id)
+        for _ in range(operations):
+            if store.cart and rng.random() < 0.3:
+                getattr(store, remove)(rng.choice(sorted(store.cart)), 1)
+            else:
+                getattr(store, add)(rng.choice(pids), rng.randint(1, 2))
+    return {pid: line[1] for pid, line in store.cart.items()}
+
+
+def bench_shared_products(processes=6, operations=300, products=4, stock=10_000):
+    """
+    CLI-v-2 and CLI-3 terminals in separate processes adding to and
+    removing from their carts against one shared products.txt. Afterwards
+    the file's stock plus what sits in every cart must equal the starting
+    stock: no terminal may have overwritten another's change. The same run
+    with the old whole-file overwrite is shown for comparison.
+    """
+    import multiprocessing
+    from shopcore.catalog import load_catalog
+
+    for blind in (True, False):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'products.txt')
+            with open(path, 'w') as f:
+                f.writelines(f"{pid},Product {pid},{100 * pid},{stock}\n" for pid in range(1, products + 1))
+            jobs = [(('CLI-v-2.py', 'CLI-3.py')[n % 2], path, n, operations, blind) for n in range(processes)]
+            started = time.perf_counter()
+            with multiprocessing.Pool(processes) as pool:
+                carts = pool.starmap(cli_terminal, jobs)
+            elapsed = time.perf_counter() - started
+            table = load_catalog(path)
+        in_carts = {pid: sum(cart.get(pid, 0) for cart in carts) for pid in range(1, products + 1)}
+        lost = sum(stock - qty - in_carts[int(pid)] for pid, qty in zip(table.ids, table.quantities))
+        label = "whole-file overwrite" if blind else "locked merge"
+        print(f"{label:<21}{processes * operations / elapsed:8,.0f} cart changes/s over {processes} processes, "
+              f"{abs(lost)} units {'lost' if lost >= 0 else 'duplicated'}")
+        if not blind:
+            assert lost == 0, f"{lost} units lost"
+            assert min(table.quantities) >= 0
+
+
+def bench_bulk_import(orders=200_000, products=10_000, users=1_000, process_counts=(1, 4)):
+    """
+    bulk_import.py on a batch of `orders` orders of 1-4 lines from `users`
+    users over `products` products, text store, pricing in one process and
+    in a pool. Times the whole import from reading the batch file to the
+    last history append.
+    """
+    import random
+    import bulk_import
+    from shopcore import TextFileStorage
+
+    rng = random.Random(1)
+    batch = ''.join(f"user{rng.randrange(users)};" +
+                    ','.join(f"{rng.randint(1, products)}:{rng.randint(1, 3)}" for _ in range(rng.randint(1, 4))) + "\n"
+                    for _ in range(orders))
+    for processes in process_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            storage = TextFileStorage(directory)
+            storage.save_products([(str(pid), f"Product {pid}", 100 + pid % 900, "Bench product", 10 ** 6)
+                                   for pid in range(1, products + 1)])
+            storage.save_users({f"user{n}": ("pw", "Bench", str(n), "Here") for n in range(users)})
+            path = os.path.join(directory, 'orders.txt')
+            with open(path, 'w') as f:
+                f.write(batch)
+            started = time.perf_counter()
+            parsed, rejected = bulk_import.read_orders(path)
+            imported, import_rejected = bulk_import.import_orders(storage, parsed, processes)
+            elapsed = time.perf_counter() - started
+            storage.close()
+        assert imported == orders and not rejected and not import_rejected
+        print(f"{processes} process{'es' if processes > 1 else '  '} {imported / elapsed:10,.0f} orders/s ({elapsed:.2f} s)")
+
+
+def bench_service(sessions=50, requests=200, products=10_000):
+    """
+    Load test of service.py: `sessions` concurrent shoppers on keep-alive
+    connections, each making `requests` requests (mostly product pages, then
+    cart adds, cart views and checkouts). The service runs in its own
+    process pinned to one CPU where the OS allows it; requests/second and
+    latency percentiles are measured by the client.
+    """
+    import asyncio
+    import json
+    import random
+    import socket
+    import subprocess
+    from shopcore import TextFileStorage
+
+    def request_bytes(method, path, body=None, token=None):
+        data = json.dumps(body).encode() if body is not None else b''
+        head = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n"
+        if token:
+            head += f"Authorization: Bearer {token}\r\n"
+        return head.encode() + b'\r\n' + data
+
+    async def call(reader, writer, method, path, body=None, token=None):
+        writer.write(request_bytes(method, path, body, token))
+        head = await reader.readuntil(b'\r\n\r\n')
+        status = int(head.split(b' ', 2)[1])
+        length = int(head.lower().split(b'content-length:')[1].split(b'\r\n')[0])
+        return status, json.loads(await reader.readexactly(length))
+
+    async def shopper(n, port, started, latencies, statuses):
+        rng = random.Random(n)
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        user = {'username': f"bench{n}", 'password': "pw"}
+        await call(reader, writer, 'POST', '/register',
+                   dict(user, first_name="Bench", last_name=str(n), address="Here"))
+        token = (await call(reader, writer, 'POST', '/login', user))[1]['token']
+        await started.wait()
+        for _ in range(requests):
+            roll = rng.random()
+            if roll < 0.6:
+                args = ('GET', f"/products?offset={rng.randrange(products)}&limit=20")
+            elif roll < 0.85:
+                args = ('POST', '/cart', {'product_id': str(rng.randint(1, products)), 'quantity': 1}, token)
+            elif roll < 0.95:
+                args = ('GET', '/cart', None, token)
+            else:
+                args = ('POST', '/checkout', None, token)
+            begin = time.perf_counter()
+            status, _ = await call(reader, writer, *args)
+            latencies.append(time.perf_counter() - begin)
+            statuses[status] = statuses.get(status, 0) + 1
+        writer.close()
+
+    async def load(port):
+        started = asyncio.Event()
+        latencies, statuses = [], {}
+        tasks = [asyncio.create_task(shopper(n, port, started, latencies, statuses)) for n in range(sessions)]
+        await asyncio.sleep(0.5)  # let every shopper register and log in first
+        begin = time.perf_counter()
+        started.set()
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - begin, latencies, statuses
+
+    def pin_to_one_cpu():
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, {min(os.sched_getaffinity(0))})
+
+    with tempfile.TemporaryDirectory() as directory:
+        storage = TextFileStorage(directory)
+        storage.save_products([(str(pid), f"Product {pid}", 100 + pid % 900, "Bench product", 10 ** 9)
+                               for pid in range(1, products + 1)])
+        storage.close()
+        open(os.path.join(directory, 'users.txt'), 'w').close()
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'service.py')],
+                                  cwd=directory, env=dict(os.environ, SHOP_PORT=str(port)),
+                                  stdout=subprocess.DEVNULL, preexec_fn=pin_to_one_cpu if os.name == 'posix' else None)
+        try:
+            for _ in range(100):
+                try:
+                    socket.create_connection(('127.0.0.1', port)).close()
+                    break
+                except OSError:
+                    time.sleep(0.1)
+            elapsed, latencies, statuses = asyncio.run(load(port))
+        finally:
+            server.terminate()
+            server.wait(30)
+    latencies.sort()
+    print(f"{len(latencies) / elapsed:,.0f} requests/s over {sessions} sessions, "
+          f"p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms; statuses {dict(sorted(statuses.items()))}")
+
+BENCHMARKS = {
+    'group_commit': bench_group_commit,
+    'catalog_load': bench_catalog_load,
+    'mapped_catalog': bench_mapped_catalog,
+    'model_memory': bench_model_memory,
+    'search': bench_search,
+    'product_filters': bench_product_filters,
+    'history_index': bench_history_index,
+    'cli_carts': bench_cli_carts,
+    'inventory_stress': bench_inventory_stress,
+    'service': bench_service,
+    'checkout_conflicts': bench_checkout_conflicts,
+    'text_checkout_conflicts': bench_text_checkout_conflicts,
+    'checkout_compaction': bench_checkout_compaction,
+    'shared_products': bench_shared_products,
+    'bulk_import': bench_bulk_import,
+}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        print(f"== {name}")
+        BENCHMARKS[name]()
@@ -0,0 +1,206 @@
+import datetime
+import multiprocessing
+import os
+import sys
+import time
+import zlib
+
+from shopcore import ConflictError, open_storage
+from shopcore.money import from_cents, to_cents
+from shopcore.storage import DATE_FORMAT
+
+# Orders taken through other channels, one per line:
+#   username;product_id:quantity,product_id:quantity[;date]
+# date is "%Y-%m-%d %H:%M:%S.%f" as in the history files, or the import time
+# when left out. An order is imported whole or not at all.
+
+# A batch that keeps losing its stock to checkouts in running shops (SQLite
+# store) gives up after this many tries.
+COMMIT_ATTEMPTS = 5
+
+
+def read_orders(path):
+    """
+    Parses an order batch file. Returns (orders, rejected): orders as
+    (line_number, username, date, [(product_id, quantity), ...]) and
+    rejected as (line_number, reason) for lines that are malformed.
+    """
+    orders = []
+    rejected = []
+    now = datetime.datetime.now()
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                fields = line.split(';')
+                if len(fields) not in (2, 3):
+                    raise ValueError(f"expected 2 or 3 fields, got {len(fields)}")
+                username, items_str = fields[0], fields[1]
+                date = datetime.datetime.strptime(fields[2], DATE_FORMAT) if len(fields) == 3 else now
+                items = []
+                for item_str in items_str.split(','):
+                    product_id, quantity_str = item_str.split(':')
+                    items.append((product_id, int(quantity_str)))
+            except ValueError as e:
+                rejected.append((line_number, f"malformed line: {e}"))
+                continue
+            orders.append((line_number, username, date, items))
+    return orders, rejected
+
+
+def partition(product_id, partitions):
+    # Stable across processes, unlike hash().
+    return zlib.crc32(product_id.encode()) % partitions
+
+
+def price_lines(prices, lines):
+    """
+    Validates and prices one partition's order lines. prices maps each of
+    the partition's product ids to its price; lines are (order, position,
+    product_id, quantity). Returns (priced, rejected): priced lines as
+    (order, position, product_id, quantity, unit_cents), rejected ones as
+    (order, reason).
+    """
+    priced = []
+    rejected = []
+    cents = {}  # each product's price is converted once
+    for order, position, product_id, quantity in lines:
+        unit_cents = cents.get(product_id)
+        if unit_cents is None:
+            price = prices.get(product_id)
+            if price is None:
+                rejected.append((order, f"unknown product {product_id}"))
+                continue
+            unit_cents = cents[product_id] = to_cents(price)
+        if quantity <= 0:
+            rejected.append((order, f"invalid quantity {quantity} of product {product_id}"))
+        else:
+            priced.append((order, position, product_id, quantity, unit_cents))
+    return priced, rejected
+
+
+def take_stock(orders, lines_by_order, stock):
+    """
+    The consolidated stock pass: goes through the orders in file order,
+    accepting each one whose lines are all still in stock. Returns
+    (accepted order numbers, {order: reason} for the rest, {product_id:
+    units taken}).
+    """
+    accepted = []
+    rejected = {}
+    taken = {}
+    for order in orders:
+        wanted = {}
+        for _, product_id, quantity, _ in lines_by_order[order]:
+            wanted[product_id] = wanted.get(product_id, 0) + quantity
+        short = [product_id for product_id, quantity in wanted.items()
+                 if stock[product_id] - taken.get(product_id, 0) < quantity]
+        if short:
+            rejected[order] = f"not enough stock of product {short[0]}"
+            continue
+        for product_id, quantity in wanted.items():
+            taken[product_id] = taken.get(product_id, 0) + quantity
+        accepted.append(order)
+    return accepted, rejected, taken
+
+
+def import_orders(storage, orders, processes=None):
+    """
+    Imports parsed orders (see read_orders()) into storage: validates and
+    prices their lines in a pool of processes, each handling the products
+    of one partition; takes the stock of every accepted order off in one
+    commit; and appends the orders to their users' histories.
+    Returns (imported, rejected) with rejected as (line_number, reason).
+    """
+    processes = processes or os.cpu_count() or 1
+    users = storage.load_users()
+    # Each user is looked up once, however many orders they have.
+    known = {username: username in users for username in {order[1] for order in orders}}
+    rejected = {}
+    partitions = [[] for _ in range(processes)]
+    for order, (line_number, username, date, items) in enumerate(orders):
+        if not known[username]:
+            rejected[order] = f"unknown user {username}"
+            continue
+        for position, (product_id, quantity) in enumerate(items):
+            partitions[partition(product_id, processes)].append((order, position, product_id, quantity))
+
+    # Each worker only gets the prices of its own products.
+    rows = storage.load_products()
+    price_maps = [{} for _ in range(processes)]
+    for product_id, _, price, _, _ in rows:
+        price_maps[partition(product_id, processes)][product_id] = price
+    jobs = list(zip(price_maps, partitions))
+    if processes > 1:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(price_lines, jobs)
+    else:
+        results = [price_lines(*job) for job in jobs]
+
+    lines_by_order = {}
+    for priced, partition_rejected in results:
+        for order, reason in partition_rejected:
+            rejected.setdefault(order, reason)
+        for order, position, product_id, quantity, unit_cents in priced:
+            lines_by_order.setdefault(order, []).append((position, product_id, quantity, unit_cents))
+    candidates = [order for order in range(len(orders)) if order not in rejected]
+    for order in candidates:
+        lines_by_order[order].sort()
+
+    # Stock is checked and taken against the stored stock as a whole; if a
+    # running shop sells any of it meanwhile, the pass is done again.
+    stock = {product_id: quantity for product_id, _, _, _, quantity in rows}
+    versions = storage.load_versions()
+    for _ in range(COMMIT_ATTEMPTS):
+        accepted, short, taken = take_stock(candidates, lines_by_order, stock)
+        try:
+            if taken:
+                storage.commit_stock([(product_id, quantity, versions.get(product_id, 0))
+                                      for product_id, quantity in taken.items()])
+            break
+        except ConflictError as e:
+            for product_id, (quantity, version) in storage.load_stock(e.product_ids).items():
+                stock[product_id] = quantity
+                versions[product_id] = version
+    else:
+        raise ConflictError(list(taken))
+    rejected.update(short)
+
+    histories = {}
+    for order in accepted:
+        _, username, date, _ = orders[order]
+        lines = [(product_id, quantity, unit_cents) for _, product_id, quantity, unit_cents in lines_by_order[order]]
+        total = from_cents(sum(quantity * unit_cents for _, quantity, unit_cents in lines))
+        histories.setdefault(username, []).append((date, lines, total))
+    for username, user_orders in histories.items():
+        storage.append_history(username, user_orders)
+    return len(accepted), sorted((orders[order][0], reason) for order, reason in rejected.items())
+
+
+def main(path, processes=None):
+    # SHOP_STORAGE picks the store as for main.py. The text files belong to
+    # one process, so run this while no shop has them open; a SQLite store
+    # can be imported into while shops are running.
+    storage = open_storage(os.environ.get('SHOP_STORAGE', 'text'))
+    started = time.perf_counter()
+    orders, rejected = read_orders(path)
+    imported, import_rejected = import_orders(storage, orders, processes)
+    elapsed = time.perf_counter() - started
+    storage.close()
+    rejected = sorted(rejected + import_rejected)
+    for line_number, reason in rejected[:20]:
+        print(f"Line {line_number}: {reason}")
+    if len(rejected) > 20:
+        print(f"... and {len(rejected) - 20} more rejected.")
+    print(f"Imported {imported} of {imported + len(rejected)} orders in {elapsed:.2f} s "
+          f"({imported / elapsed:,.0f} orders/s).")
+
+
+# MAIN EXECUTION
+if __name__ == "__main__":
+    # python bulk_import.py ORDERS_FILE [PROCESSES]
+    if len(sys.argv) not in (2, 3):
+        sys.exit("Usage: python bulk_import.py ORDERS_FILE [PROCESSES]")
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) == 3 else None)
@@ -1,222 +1,60 @@
-from abc import ABC, abstractmethod
 import datetime
+import os
 import tkinter as tk
-from tkinter import messagebox, ttk
+from tkinter import messagebox
 
-# PRODUCT CLASS
-class Product:
-    def __init__(self, product_id, name, price, description, quantity):
-        self.product_id = product_id
-        self.name = name
-        self.price = price
-        self.description = description
-        self.quantity = quantity
-
-    def __str__(self):
-        return f"{self.name} (${self.price}): {self.description} - Quantity: {self.quantity}"
-
-    def __eq__(self, other):
-        if isinstance(other, Product):
-            return self.product_id == other.product_id
-        return False
-
-    def __hash__(self):
-        return hash(self.product_id)
-
-    def __add__(self, other):
-        if isinstance(other, Product):
-            return self.price + other.price
-        return NotImplemented
-
-    def __sub__(self, other):
-        if isinstance(other, Product):
-            return self.price - other.price
-        return NotImplemented
-
-
-# USER CLASS
-class User:
-    def __init__(self, username, password, first_name, last_name, address):
-        self.username = username
-        self.password = password
-        self.first_name = first_name
-        self.last_name = last_name
-        self.address = address
-        self.cart = ShoppingCart()
-        self.history = []
-
-    def __str__(self):
-        return f"{self.first_name} {self.last_name}, {self.address}"
-
-    def add_to_cart(self, product, quantity=1):
-        self.cart.add_product(product, quantity)
-
-    def remove_from_cart(self, product, quantity=1):
-        self.cart.remove_product(product, quantity)
-
-
-
-
-# SHOPPINGCART CLASS
-class ShoppingCart:
-    def __init__(self):
-        self.items = {}
-
-    def add_product(self, product, quantity=1):
-        if product.quantity >= quantity:
-            if product in self.items:
-                self.items[product]['quantity'] += quantity
-            else:
-                self.items[product] = {'product': product, 'quantity': quantity}
-            product.quantity -= quantity
-        else:
-            # Call the out_of_stock method of the app to handle it in the GUI thread
-            app.out_of_stock(product.name, product.quantity)
-
-    def remove_product(self, product, quantity=1):
-        if not self.items:
-            messagebox.showinfo("Empty Cart", "Your cart is empty.")
-            return
-        if product in self.items:
-            if self.items[product]['quantity'] <= quantity:
-                product.quantity += self.items[product]['quantity']
-                del self.items[product]
-            else:
-                self.items[product]['quantity'] -= quantity
-                product.quantity += quantity
-        else:
-            messagebox.showerror("Not in Cart", f"{product.name} is not in the cart.")
-
-    def view_cart(self):
-        if not self.items:
-            print("Your cart is empty.")
-        else:
-            for item in self.items.values():
-                product = item['product']
-                quantity = item['quantity']
-                print(f"{product.name} (x{quantity}): ${product.price * quantity}")
-
-    def checkout(self):
-        total = sum(item['product'].price * item['quantity'] for item in self.items.values())
-        if total == 0:
-            print("Your cart is empty. Add items to cart before checking out.")
-            return False
-        confirm = input(f"Your total is ${total}. Do you want to proceed with the checkout? (yes/y or no/n): ").strip().lower()
-        if confirm in ['yes', 'y']:
-            order = Order(self.items, total)
-            self.items = {}
-            return order
-        elif confirm in ['no', 'n']:
-            print("Checkout cancelled.")
-            return False
-        else:
-            print("Invalid input. Please enter 'yes/y' or 'no/n'.")
-            return False
-
-
-# ABSTRACT CLASS
-class Account(ABC):
-    @abstractmethod
-    def view_products(self):
-        pass
-
-    @abstractmethod
-    def view_history(self):
-        pass
-
-
-# CUSTOMER CLASS 
-class Customer(User, Account):
-    def view_products(self, products):
-        for product in products:
-            print(product)
-
-    def view_history(self):
-        if not self.history:
-            print("No purchase history.")
-        else:
-            for order in self.history:
-                print(order)
-
-
-# ORDER CLASS
-class Order:
-    def __init__(self, items, total):
-        self.date = datetime.datetime.now()
-        self.items = {product: {'product': product, 'quantity': details['quantity']} for product, details in items.items()}
-        self.total = total
-
-    def __str__(self):
-        items_str = '\n'.join([f"{details['product'].name} (x{details['quantity']}): ${details['product'].price * details['quantity']}" for details in self.items.values()])
-        return f"Date: {self.date}\nItems:\n{items_str}\nTotal: ${self.total}"
+from shopcore import OutOfStockError, Shop, ShopError, open_storage
+from shopcore.money import from_cents
+import product_filters
 
 
 # SHOPPINGCART APP CLASS
-class ShoppingCartApp:
-    def __init__(self):
-        self.users = {}
-        self.products = {}
-        self.load_products()
-        self.load_users()
-
+class ShoppingCartApp(Shop):
+    # The Tk front end: every screen below drives the Shop it inherits and
+    # shows its ShopErrors in message boxes.
+
+    # view_products lists this many products per page.
+    PRODUCT_LIST_LIMIT = 100
+    # search_products shows at most this many matches.
+    SEARCH_RESULT_LIMIT = 50
+    # How often expired holds are swept back onto the shelf.
+    SWEEP_MS = 30 * 1000
+
+    def __init__(self, storage=None, mapped_catalog=False):
         self.root = tk.Tk()
         self.root.title("Dia's Ice Cream Shop")
         self.root.geometry("600x600")
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
         self.current_user = None
+        # Save callbacks come back to the Tk thread through root.after().
+        super().__init__(storage, mapped_catalog, scheduler=self.root, on_save_error=self.show_save_error)
+        self.root.after(self.SWEEP_MS, self.sweep_reservations)
 
-    def load_products(self):
-        try:
-            with open('products.txt', 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line: 
-                        try:
-                            product_id, name, price, description, quantity = line.split(';')
-                            self.products[product_id] = Product(product_id, name, float(price), description, int(quantity))
-                        except ValueError as e:
-                            print(f"Error parsing line: {line}\n{e}")
-        except FileNotFoundError:
-            print("Products file not found.")
-
-    def load_users(self):
-        try:
-            with open('users.txt', 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line:  
-                        username, password, first_name, last_name, address = line.split(';')
-                        self.users[username] = Customer(username, password, first_name, last_name, address)
-
-                        self.load_cart(username)
-                        self.load_history(username)
-        except FileNotFoundError:
-            print("Users file not found.")
-
-    def save_products(self):
-        with open('products.txt', 'w') as f:
-            for product in self.products.values():
-                f.write(f"{product.product_id};{product.name};{product.price};{product.description};{product.quantity}\n")
-
-    def save_users(self):
-        with open('users.txt', 'w') as f:
-            for user in self.users.values():
-                f.write(f"{user.username};{user.password};{user.first_name};{user.last_name};{user.address}\n")
+    def sweep_reservations(self):
+        if self.closed:
+            return
+        expired = self.expire_reservations()
+        if self.current_user and self.current_user.username in expired:
+            names = ', '.join(expired[self.current_user.username])
+            messagebox.showinfo("Cart Updated", f"These items were in your cart too long and went back on the shelf: {names}")
+        self.root.after(self.SWEEP_MS, self.sweep_reservations)
 
     def register_user(self, username, password, first_name, last_name, address):
-        if username in self.users:
-            messagebox.showerror("Error", "Username already exists.")
+        try:
+            self.register(username, password, first_name, last_name, address)
+        except ShopError as e:
+            messagebox.showerror("Error", str(e))
         else:
-            self.users[username] = Customer(username, password, first_name, last_name, address)
-            self.save_users()
             messagebox.showinfo("Success", "User registered successfully.")
             self.show_login()
 
     def login_user(self, username, password):
-        if username in self.users and self.users[username].password == password:
-            self.current_user = self.users[username] 
-            self.user_menu(self.current_user)
+        try:
+            self.current_user = self.login(username, password)
+        except ShopError as e:
+            messagebox.showerror("Error", str(e))
         else:
-            messagebox.showerror("Error", "Invalid username or password.")
+            self.user_menu(self.current_user)
 
 #dafault page  (self to call an attribute), (root for window in gui),
 #  (tk as tkinter use for simple graphical interferance), (frame as container) ,(def is use for function or method)
@@ -224,6 +62,11 @@ class ShoppingCartApp:
     def run(self):
         self.show_main_menu()
         self.root.mainloop()
+        self.shutdown()
+
+    def close(self):
+        self.shutdown()
+        self.root.destroy()
 
     def show_main_menu(self):
         self.clear_window()
@@ -327,6 +170,7 @@ class ShoppingCartApp:
 
 
         tk.Button(frame, text="View Product List", command=lambda: self.view_products(user), width=20).pack(pady=10)
+        tk.Button(frame, text="Search Products", command=lambda: self.search_products(user), width=20).pack(pady=10)
         tk.Button(frame, text="Add Products to Cart", command=lambda: self.add_to_cart(user), width=20).pack(pady=10)
         tk.Button(frame, text="Remove Products from Cart", command=lambda: self.remove_from_cart(user), width=20).pack(pady=10)
         tk.Button(frame, text="View Cart", command=lambda: self.view_cart(user), width=20).pack(pady=10)
@@ -336,7 +180,10 @@ class ShoppingCartApp:
 
 #products 
 
-    def view_products(self, user):
+    def view_products(self, user, filters=None):
+        # filters holds the filter fields and page offset between redraws.
+        filters = filters or product_filters.default_filters()
+
         self.clear_window()
 
         frame = tk.Frame(self.root)
@@ -344,19 +191,65 @@ class ShoppingCartApp:
 
         tk.Label(frame, text="Products", font=("Helvetica", 14)).pack(pady=10)
 
+        show_page = product_filters.filter_bar(frame, filters, lambda filters: self.view_products(user, filters))
+
         product_list_frame = tk.Frame(frame)
         product_list_frame.pack()
 
         scrollbar = tk.Scrollbar(product_list_frame)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
+        # One extra product tells whether there is a next page.
+        products = self.product_page(*product_filters.page_query(filters), filters['offset'], self.PRODUCT_LIST_LIMIT + 1)
+
         product_listbox = tk.Listbox(product_list_frame, yscrollcommand=scrollbar.set, width=50)
-        for product in self.products.values():
+        for product in products[:self.PRODUCT_LIST_LIMIT]:
             product_listbox.insert(tk.END, str(product))
+        if not products:
+            product_listbox.insert(tk.END, "No products match.")
         product_listbox.pack(side=tk.LEFT, fill=tk.BOTH)
 
         scrollbar.config(command=product_listbox.yview)
 
+        product_filters.page_buttons(frame, show_page, filters['offset'], self.PRODUCT_LIST_LIMIT,
+                                     len(products) > self.PRODUCT_LIST_LIMIT)
+
+        tk.Button(frame, text="Back", command=lambda: self.user_menu(user)).pack(pady=10)
+
+    def search_products(self, user):
+        self.clear_window()
+
+        frame = tk.Frame(self.root)
+        frame.pack(pady=20)
+
+        tk.Label(frame, text="Search Products", font=("Helvetica", 14)).pack(pady=10)
+
+        query_entry = tk.Entry(frame, width=40)
+        query_entry.pack()
+
+        result_list_frame = tk.Frame(frame)
+        result_list_frame.pack(pady=10)
+
+        scrollbar = tk.Scrollbar(result_list_frame)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        result_listbox = tk.Listbox(result_list_frame, yscrollcommand=scrollbar.set, width=50)
+        result_listbox.pack(side=tk.LEFT, fill=tk.BOTH)
+
+        scrollbar.config(command=result_listbox.yview)
+
+        def search_action(event=None):
+            result_listbox.delete(0, tk.END)
+            matches = self.product_search().search(query_entry.get(), self.SEARCH_RESULT_LIMIT)
+            if not matches:
+                result_listbox.insert(tk.END, "No products found.")
+            for product_id in matches:
+                # Shown with its ID, which is what Add Products to Cart asks for.
+                result_listbox.insert(tk.END, f"{product_id}: {self.products[product_id]}")
+
+        query_entry.bind("<Return>", search_action)
+        query_entry.focus_set()
+        tk.Button(frame, text="Search", command=search_action).pack(pady=5)
         tk.Button(frame, text="Back", command=lambda: self.user_menu(user)).pack(pady=10)
 
 #cart
@@ -382,7 +275,7 @@ class ShoppingCartApp:
             for item in user.cart.items.values():
                 product = item['product']
                 quantity = item['quantity']
-                cart_listbox.insert(tk.END, f"{product.name} (x{quantity}): ${product.price * quantity}")
+                cart_listbox.insert(tk.END, f"{product.name} (x{quantity}): ${from_cents(item.total_cents)}")
             cart_listbox.pack(side=tk.LEFT, fill=tk.BOTH)
 
             scrollbar.config(command=cart_listbox.yview)
@@ -423,17 +316,14 @@ class ShoppingCartApp:
                 messagebox.showerror("Error", "Invalid quantity. Please enter a number.")
                 return
 
-            if product_id in self.products:
-                product = self.products[product_id]
-                if product.quantity >= quantity:
-                    user.add_to_cart(product, quantity)
-                    self.save_products()
-                    self.save_cart(user.username)  # Save cart for the specific user
-                    messagebox.showinfo("Success", "Product added to cart.")
-                else:
-                    self.out_of_stock(product.name, product.quantity)  # Show out-of-stock message
+            try:
+                self.add_item(user, product_id, quantity)  # also saves the cart
+            except OutOfStockError as e:
+                self.out_of_stock(e.product.name, e.available)  # Show out-of-stock message
+            except ShopError as e:
+                messagebox.showerror("Error", str(e))
             else:
-                messagebox.showerror("Error", "Invalid product ID.")
+                messagebox.showinfo("Success", "Product added to cart.")
             self.user_menu(user)
 
         tk.Button(frame, text="Add", command=add_to_cart_action).pack(pady=10)
@@ -473,18 +363,12 @@ class ShoppingCartApp:
                 messagebox.showerror("Error", "Invalid quantity. Please enter a number.")
                 return
 
-            # Check if product ID exists and quantity is valid
-            if product_id in self.products:
-                product = self.products[product_id]
-                if quantity > 0 and quantity <= product.quantity:
-                    user.remove_from_cart(product, quantity)
-                    self.save_products()
-                    self.save_cart(user.username)  # Save cart for the specific user
-                    messagebox.showinfo("Success", "Product removed from cart.")
-                else:
-                    messagebox.showerror("Error", "Invalid quantity. Please enter a valid quantity.")
+            try:
+                self.remove_item(user, product_id, quantity)  # also saves the cart
+            except ShopError as e:
+                messagebox.showerror("Error", str(e))
             else:
-                messagebox.showerror("Error", "Invalid product ID.")
+                messagebox.showinfo("Success", "Product removed from cart.")
             self.user_menu(user)
 
         tk.Button(frame, text="Remove", command=remove_from_cart_action).pack(pady=10)
@@ -500,27 +384,42 @@ class ShoppingCartApp:
 
         tk.Label(frame, text="Checkout", font=("Helvetica", 14)).pack(pady=10)
 
-        total = sum(item['product'].price * item['quantity'] for item in user.cart.items.values())
+        self.expire_reservations()
+        total = user.cart.total
         if total == 0:
             tk.Label(frame, text="Your cart is empty. Add items to cart before checking out.").pack()
         else:
             confirm = messagebox.askyesno("Checkout", f"Your total is ${total}. Do you want to proceed with the checkout?")
             if confirm:
-                order = Order(user.cart.items, total)
-                user.cart.items = {}
-                user.history.append(order)
-                self.save_products()
-                self.save_history(user.username)
-                self.save_cart(user.username)  # Save cart for the specific user
-                messagebox.showinfo("Success", f"Order placed. Total: ${order.total}")
-                self.user_menu(user)
+                try:
+                    self.place_order(user, lambda order: self.order_placed(user, order),
+                                     lambda error: self.order_failed(user, error))
+                except ShopError as e:
+                    messagebox.showerror("Error", str(e))
+                    self.user_menu(user)
+                else:
+                    tk.Label(frame, text="Placing your order...").pack()
             else:
                 messagebox.showinfo("Cancelled", "Checkout cancelled.")
                 self.user_menu(user)
 
+    def order_placed(self, user, order):
+        messagebox.showinfo("Success", f"Order placed. Total: ${order.total}")
+        if not self.closed:
+            self.user_menu(user)
+
+    def order_failed(self, user, error):
+        messagebox.showerror("Error", str(error))
+        if not self.closed:
+            self.user_menu(user)
+
 #history
 
-    def view_history(self, user):
+    def view_history(self, user, filters=None):
+        # filters: the From/To dates (YYYY-MM-DD) and product ID typed last time.
+        if filters is None:
+            filters = {'start': '', 'end': '', 'product_id': ''}
+
         self.clear_window()
 
         frame = tk.Frame(self.root)
@@ -531,78 +430,65 @@ class ShoppingCartApp:
         if not user.history:
             tk.Label(frame, text="No purchase history.").pack()
         else:
+            filter_frame = tk.Frame(frame)
+            filter_frame.pack(pady=5)
+
+            entries = {}
+            for field, label in (('start', "From"), ('end', "To"), ('product_id', "Product ID")):
+                tk.Label(filter_frame, text=label).pack(side=tk.LEFT)
+                entries[field] = tk.Entry(filter_frame, width=11)
+                entries[field].insert(0, filters[field])
+                entries[field].pack(side=tk.LEFT, padx=(0, 5))
+
+            def filter_action():
+                values = {field: entry.get().strip() for field, entry in entries.items()}
+                try:
+                    self.history_range(values)
+                except ValueError:
+                    messagebox.showerror("Error", "Invalid date. Please use YYYY-MM-DD.")
+                    return
+                self.view_history(user, values)
+
+            tk.Button(filter_frame, text="Filter", command=filter_action).pack(side=tk.LEFT)
+
             history_list_frame = tk.Frame(frame)
             history_list_frame.pack()
 
             scrollbar = tk.Scrollbar(history_list_frame)
             scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
+            start, end = self.history_range(filters)
+            orders = self.orders(user, start, end, filters['product_id'])
+
             history_listbox = tk.Listbox(history_list_frame, yscrollcommand=scrollbar.set, width=50)
-            for order in user.history:
-                history_listbox.insert(tk.END, str(order))
+            for order in orders:
+                history_listbox.insert(tk.END, order.describe(self.products))
+            if not orders:
+                history_listbox.insert(tk.END, "No orders match.")
             history_listbox.pack(side=tk.LEFT, fill=tk.BOTH)
 
             scrollbar.config(command=history_listbox.yview)
 
         tk.Button(frame, text="Back", command=lambda: self.user_menu(user)).pack(pady=10)
 
+    @staticmethod
+    def history_range(filters):
+        # The From/To dates as datetimes for OrderHistoryIndex; To is inclusive.
+        # Raises ValueError for a malformed date.
+        start = datetime.datetime.strptime(filters['start'], "%Y-%m-%d") if filters['start'] else None
+        end = datetime.datetime.strptime(filters['end'], "%Y-%m-%d") + datetime.timedelta(days=1) if filters['end'] else None
+        return start, end
+
     def clear_window(self):
         for widget in self.root.winfo_children():
             widget.destroy()
 
-    def load_history(self, username):
-        try:
-            with open(f'{username}_history.txt', 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line:  # Skip empty lines
-                        try:
-                            date_str, items_str, total_str = line.split(';')
-                            items = {}
-                            for item_str in items_str.split(','):
-                                product_id, quantity_str = item_str.split(':')
-                                quantity = int(quantity_str)
-                                if product_id in self.products:
-                                    items[self.products[product_id]] = {'product': self.products[product_id], 'quantity': quantity}
-                            total = float(total_str)
-                            order = Order(items, total)
-                            order.date = datetime.datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S.%f")
-                            self.users[username].history.append(order)
-                        except ValueError as e:
-                            print(f"Error parsing line: {line}\n{e}")
-        except FileNotFoundError:
-            print(f"History file for {username} not found.")
-
-    def save_history(self, username):
-        with open(f'{username}_history.txt', 'w') as f:
-            for order in self.users[username].history:
-                items_str = ','.join([f"{item['product'].product_id}:{item['quantity']}" for item in order.items.values()])
-                f.write(f"{order.date.strftime('%Y-%m-%d %H:%M:%S.%f')};{items_str};{order.total}\n")
-
-    def load_cart(self, username):
-        try:
-            with open(f'{username}_cart.txt', 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line:  
-                        try:
-                            product_id, quantity_str = line.split(';')
-                            quantity = int(quantity_str)
-                            if product_id in self.products:
-                                self.users[username].cart.add_product(self.products[product_id], quantity)
-                        except ValueError as e:
-                            print(f"Error parsing line: {line}\n{e}")
-        except FileNotFoundError:
-            print(f"Cart file for {username} not found.")
-
-    def save_cart(self, username):
-        with open(f'{username}_cart.txt', 'w') as f:
-            for product, details in self.users[username].cart.items.items():
-                f.write(f"{product.product_id};{details['quantity']}\n")
-
     def logout(self, user):
-        self.save_history(user.username)
-        self.save_cart(user.username)
+        try:
+            super().logout(user)
+        except ShopError as e:
+            messagebox.showerror("Error", str(e))
+            return
         self.current_user = None
         self.show_main_menu()
 
@@ -610,6 +496,9 @@ class ShoppingCartApp:
         messagebox.showerror("Out of Stock", 
                            f"Sorry, only {available_quantity} of {product_name} are available.")
 
+    def show_save_error(self, error):
+        messagebox.showerror("Save Failed", f"Could not save your changes:\n{error}")
+
     def show_empty_input_error(self):
         messagebox.showerror("Error", "Please fill in all required fields.")
 
@@ -622,5 +511,11 @@ def check_empty_inputs(*entries):
 
 # MAIN EXECUTION
 if __name__ == "__main__":
-    app = ShoppingCartApp()
+    # SHOP_STORAGE=shop.db switches to the SQLite backend (python -m
+    # shopcore.storage migrate shop.db copies the text files into it first),
+    # SHOP_STORAGE=binary keeps the text files but stores order histories in
+    # the binary format.
+    # SHOP_CATALOG=mapped opens products.txt memory-mapped instead of parsing it.
+    app = ShoppingCartApp(open_storage(os.environ.get('SHOP_STORAGE', 'text')),
+                          mapped_catalog=os.environ.get('SHOP_CATALOG') == 'mapped')
     app.run()
\ No newline at end of file
@@ -0,0 +1,83 @@
+import tkinter as tk
+from tkinter import messagebox, ttk
+
+from shopcore.sorted_index import ProductIndexes
+
+# The price, stock and sort filters above the product list in main.py,
+# version4.py and version_5.py. Each view_products() redraws its screen with
+# a filters dict that carries the field values and page offset between
+# redraws.
+
+# Sort choices -> ProductIndexes order (None: catalog order).
+PRODUCT_ORDERS = {
+    "Catalog order": None,
+    "Price: low to high": ProductIndexes.PRICE,
+    "Price: high to low": ProductIndexes.PRICE_DESC,
+    "Most in stock": ProductIndexes.QUANTITY_DESC,
+}
+
+
+def default_filters():
+    return {'min_price': '', 'max_price': '', 'in_stock': False, 'order': "Catalog order", 'offset': 0}
+
+
+def page_query(filters):
+    """
+    Returns (min_price, max_price, in_stock_only, order) for product_page().
+    """
+    try:
+        min_price = float(filters['min_price']) if filters['min_price'] else None
+        max_price = float(filters['max_price']) if filters['max_price'] else None
+    except ValueError:
+        min_price = max_price = None
+    return min_price, max_price, filters['in_stock'], PRODUCT_ORDERS[filters['order']]
+
+
+def filter_bar(parent, filters, redraw):
+    """
+    Packs the filter fields into parent and returns show_page(offset), which
+    checks the prices entered and calls redraw(filters) with the new fields.
+    """
+    filter_frame = tk.Frame(parent)
+    filter_frame.pack(pady=5)
+
+    tk.Label(filter_frame, text="Price from").pack(side=tk.LEFT)
+    min_price_entry = tk.Entry(filter_frame, width=7)
+    min_price_entry.insert(0, filters['min_price'])
+    min_price_entry.pack(side=tk.LEFT)
+    tk.Label(filter_frame, text="to").pack(side=tk.LEFT)
+    max_price_entry = tk.Entry(filter_frame, width=7)
+    max_price_entry.insert(0, filters['max_price'])
+    max_price_entry.pack(side=tk.LEFT)
+
+    in_stock_var = tk.BooleanVar(value=filters['in_stock'])
+    tk.Checkbutton(filter_frame, text="In stock only", variable=in_stock_var).pack(side=tk.LEFT, padx=5)
+
+    order_var = tk.StringVar(value=filters['order'])
+    ttk.Combobox(filter_frame, textvariable=order_var, values=list(PRODUCT_ORDERS),
+                 state="readonly", width=18).pack(side=tk.LEFT)
+
+    def show_page(offset):
+        for field in (min_price_entry, max_price_entry):
+            try:
+                if field.get().strip():
+                    float(field.get())
+            except ValueError:
+                messagebox.showerror("Error", "Invalid price. Please enter a number.")
+                return
+        redraw({'min_price': min_price_entry.get().strip(), 'max_price': max_price_entry.get().strip(),
+                'in_stock': in_stock_var.get(), 'order': order_var.get(), 'offset': offset})
+
+    return show_page
+
+
+def page_buttons(parent, show_page, offset, page_size, has_next):
+    # Prev / Apply / Next under the filters; has_next comes from asking
+    # product_page() for one product more than a page.
+    page_frame = tk.Frame(parent)
+    page_frame.pack(pady=5)
+    tk.Button(page_frame, text="< Prev", command=lambda: show_page(max(0, offset - page_size)),
+              state=tk.NORMAL if offset else tk.DISABLED).pack(side=tk.LEFT, padx=5)
+    tk.Button(page_frame, text="Apply", command=lambda: show_page(0)).pack(side=tk.LEFT, padx=5)
+    tk.Button(page_frame, text="Next >", command=lambda: show_page(offset + page_size),
+              state=tk.NORMAL if has_next else tk.DISABLED).pack(side=tk.LEFT, padx=5)
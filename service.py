@@ -0,0 +1,358 @@
+import asyncio
+import datetime
+import http
+import inspect
+import json
+import os
+import secrets
+import signal
+from urllib.parse import parse_qs, urlsplit
+
+from shopcore import (AuthenticationError, ConflictError, OrderPendingError, OutOfStockError, Shop, ShopError,
+                      UnknownProductError, UserExistsError, open_storage)
+from shopcore.money import from_cents, to_cents
+from shopcore.sorted_index import ProductIndexes
+
+
+class HTTPError(Exception):
+    # A request the service cannot make sense of, answered with status.
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LoopScheduler:
+    # Gives PersistenceWorker the after(ms, fn) it expects from a Tk root, so
+    # save callbacks run on the event loop's thread like they run on Tk's.
+    # call_soon_threadsafe lets the worker hand a finished checkout over
+    # without waiting for its next poll.
+    def __init__(self, loop):
+        self.loop = loop
+
+    def after(self, ms, fn):
+        self.loop.call_later(ms / 1000, fn)
+
+    def call_soon_threadsafe(self, fn):
+        self.loop.call_soon_threadsafe(fn)
+
+
+class Request:
+    __slots__ = ('args', 'query', 'body', 'headers')
+
+    def __init__(self, args, query, body, headers):
+        self.args = args
+        self.query = query
+        self.body = body
+        self.headers = headers
+
+
+# SHOP SERVICE CLASS
+class ShopService(Shop):
+    """
+    The shop as a local HTTP/JSON service for many concurrent sessions, all
+    served by one asyncio event loop.
+
+        GET    /products               ?q= to search, else min_price, max_price,
+                                       in_stock=1, order, offset, limit
+        POST   /register               {username, password, first_name, last_name, address}
+        POST   /login                  {username, password} -> {token}
+        POST   /logout
+        GET    /cart
+        POST   /cart                   {product_id, quantity}
+        DELETE /cart/<product_id>      ?quantity= (the whole line by default)
+        POST   /checkout
+        GET    /orders                 ?start=, end= (YYYY-MM-DD, inclusive), product_id=
+
+    All but /products, /register and /login need "Authorization: Bearer
+    <token>" from /login. Errors come back as {"error": message}.
+
+    Requests are handled one at a time on the loop thread, so the Shop and
+    its carts are never touched from two places at once. Saves and each
+    checkout's stock commit run on the PersistenceWorker. Register, login
+    and logout wait for it, blocking the loop. A checkout only awaits its
+    own commit, so other sessions carry on meanwhile.
+    """
+
+    ROUTES = {
+        ('GET', 'products'): 'list_products',
+        ('POST', 'register'): 'register_user',
+        ('POST', 'login'): 'login_user',
+        ('POST', 'logout'): 'logout_user',
+        ('GET', 'cart'): 'view_cart',
+        ('POST', 'cart'): 'add_to_cart',
+        ('DELETE', 'cart'): 'remove_from_cart',
+        ('POST', 'checkout'): 'checkout',
+        ('GET', 'orders'): 'view_history',
+    }
+    ERROR_STATUS = {
+        AuthenticationError: 401,
+        UnknownProductError: 404,
+        UserExistsError: 409,
+        OutOfStockError: 409,
+        ConflictError: 409,
+        OrderPendingError: 409,
+    }
+    PRODUCT_ORDERS = (ProductIndexes.PRICE, ProductIndexes.PRICE_DESC, ProductIndexes.QUANTITY_DESC)
+    PAGE_LIMIT = 50
+    MAX_PAGE_LIMIT = 500
+    # How often expired holds are swept back onto the shelf.
+    SWEEP_SECONDS = 30
+    MAX_BODY = 64 * 1024
+
+    def __init__(self, storage=None, mapped_catalog=False, loop=None):
+        super().__init__(storage, mapped_catalog, scheduler=LoopScheduler(loop or asyncio.get_running_loop()),
+                         on_save_error=self.show_save_error)
+        # token -> username, for every session that has logged in.
+        self.sessions = {}
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        sweeper = asyncio.create_task(self.sweep_reservations())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+            self.shutdown()
+
+    async def sweep_reservations(self):
+        while True:
+            await asyncio.sleep(self.SWEEP_SECONDS)
+            self.expire_reservations()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                request_line, *header_lines = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.split(' ')
+                    length = int(headers.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self.respond(writer, 400, {'error': "Bad request."}, keep_alive=False)
+                    break
+                if length > self.MAX_BODY:
+                    await self.respond(writer, 413, {'error': "Request body too large."}, keep_alive=False)
+                    break
+                try:
+                    body = await reader.readexactly(length) if length else b''
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                status, payload = await self.dispatch(method, target, headers, body)
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' or (version == 'HTTP/1.1' and connection != 'close')
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive=True):
+        data = json.dumps(payload).encode()
+        head = (f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\n")
+        if not keep_alive:
+            head += "Connection: close\r\n"
+        writer.write(head.encode('latin-1') + b'\r\n' + data)
+        await writer.drain()
+
+    async def dispatch(self, method, target, headers, body):
+        """
+        Runs one request and returns (status, JSON-able payload).
+        """
+        url = urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+        handler = self.ROUTES.get((method, parts[0] if parts else ''))
+        if handler is None:
+            return 404, {'error': "Not found."}
+        try:
+            try:
+                data = json.loads(body) if body else {}
+            except ValueError:
+                raise HTTPError(400, "Request body is not valid JSON.")
+            if not isinstance(data, dict):
+                raise HTTPError(400, "Request body must be a JSON object.")
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            result = getattr(self, handler)(Request(parts[1:], query, data, headers))
+            if inspect.isawaitable(result):
+                result = await result
+            return 200, result
+        except HTTPError as e:
+            return e.status, {'error': str(e)}
+        except ShopError as e:
+            return self.error_status(e), {'error': str(e)}
+        except Exception as e:
+            # A bug must not cost the client its answer or the connection.
+            print(f"Error handling {method} {target}: {e!r}")
+            return 500, {'error': "Internal server error."}
+
+    def error_status(self, error):
+        for cls in type(error).__mro__:
+            if cls in self.ERROR_STATUS:
+                return self.ERROR_STATUS[cls]
+        return 400
+
+    def session_user(self, request):
+        scheme, _, token = request.headers.get('authorization', '').partition(' ')
+        username = self.sessions.get(token) if scheme.lower() == 'bearer' else None
+        if username is None or username not in self.users:
+            raise HTTPError(401, "Please log in.")
+        return self.users[username]
+
+    # Handlers: each takes a Request and returns the JSON-able response, or
+    # an awaitable of it.
+
+    def list_products(self, request):
+        query = request.query
+        limit = number(query, 'limit', int, self.PAGE_LIMIT)
+        if not 0 < limit <= self.MAX_PAGE_LIMIT:
+            raise HTTPError(400, f"limit must be between 1 and {self.MAX_PAGE_LIMIT}.")
+        if query.get('q'):
+            products = self.search(query['q'], limit)
+        else:
+            order = query.get('order') or None
+            if order is not None and order not in self.PRODUCT_ORDERS:
+                raise HTTPError(400, f"order must be one of: {', '.join(self.PRODUCT_ORDERS)}.")
+            products = self.product_page(number(query, 'min_price', float), number(query, 'max_price', float),
+                                         query.get('in_stock') == '1', order,
+                                         max(number(query, 'offset', int, 0), 0), limit)
+        return {'products': [product_json(product) for product in products]}
+
+    def register_user(self, request):
+        self.register(*fields(request.body, 'username', 'password', 'first_name', 'last_name', 'address'))
+        return {'username': request.body['username']}
+
+    def login_user(self, request):
+        user = self.login(*fields(request.body, 'username', 'password'))
+        token = secrets.token_urlsafe(16)
+        self.sessions[token] = user.username
+        return {'token': token}
+
+    def logout_user(self, request):
+        user = self.session_user(request)
+        self.logout(user)
+        # The user's other sessions end with this one.
+        self.sessions = {token: username for token, username in self.sessions.items() if username != user.username}
+        return {}
+
+    def view_cart(self, request):
+        return cart_json(self.session_user(request).cart)
+
+    def add_to_cart(self, request):
+        user = self.session_user(request)
+        product_id, = fields(request.body, 'product_id')
+        self.add_item(user, product_id, whole_number(request.body.get('quantity', 1), 'quantity'))
+        return cart_json(user.cart)
+
+    def remove_from_cart(self, request):
+        user = self.session_user(request)
+        if len(request.args) != 1:
+            raise HTTPError(404, "Not found.")
+        product = self.product(request.args[0])
+        line = user.cart.items.get(product)
+        quantity = number(request.query, 'quantity', int, line.quantity if line is not None else 1)
+        self.remove_item(user, product.product_id, quantity)
+        return cart_json(user.cart)
+
+    async def checkout(self, request):
+        user = self.session_user(request)
+        placed = asyncio.get_running_loop().create_future()
+        self.place_order(user, placed.set_result, placed.set_exception)
+        return {'order': order_json(await placed)}
+
+    def view_history(self, request):
+        user = self.session_user(request)
+        query = request.query
+        try:
+            start = datetime.datetime.strptime(query['start'], "%Y-%m-%d") if query.get('start') else None
+            end = datetime.datetime.strptime(query['end'], "%Y-%m-%d") + datetime.timedelta(days=1) if query.get('end') else None
+        except ValueError:
+            raise HTTPError(400, "Invalid date. Please use YYYY-MM-DD.")
+        return {'orders': [order_json(order) for order in self.orders(user, start, end, query.get('product_id'))]}
+
+    def show_save_error(self, error):
+        print(f"Could not save changes: {error}")
+
+
+# Helper functions outside of the class
+def fields(body, *names):
+    # The named string fields of a JSON body, in order.
+    values = []
+    for name in names:
+        value = body.get(name)
+        if isinstance(value, int) and not isinstance(value, bool):
+            value = str(value)  # product ids may be sent as numbers
+        if not isinstance(value, str) or not value:
+            raise HTTPError(400, f"Missing field: {name}.")
+        values.append(value)
+    return values
+
+
+def whole_number(value, name):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise HTTPError(400, f"{name} must be a whole number.")
+    return value
+
+
+def number(query, name, kind, default=None):
+    if not query.get(name):
+        return default
+    try:
+        return kind(query[name])
+    except ValueError:
+        raise HTTPError(400, f"{name} must be a number.")
+
+
+def product_json(product):
+    return {'product_id': product.product_id, 'name': product.name, 'price': product.price,
+            'description': product.description, 'quantity': product.quantity}
+
+
+def cart_json(cart):
+    return {'items': [{'product_id': product.product_id, 'name': product.name, 'quantity': line.quantity,
+                       'unit_price': from_cents(line.unit_cents)}
+                      for product, line in cart.items.items()],
+            'item_count': cart.item_count,
+            'total': cart.total}
+
+
+def order_json(order):
+    return {'date': order.date.isoformat(),
+            'lines': [{'product_id': product_id, 'quantity': quantity,
+                       'unit_price': None if unit_cents is None else from_cents(unit_cents)}
+                      for product_id, quantity, unit_cents in order.lines],
+            'total': from_cents(to_cents(order.total))}
+
+
+async def main():
+    # SHOP_STORAGE and SHOP_CATALOG pick the storage as for main.py;
+    # SHOP_HOST and SHOP_PORT say where to listen.
+    service = ShopService(open_storage(os.environ.get('SHOP_STORAGE', 'text')),
+                          mapped_catalog=os.environ.get('SHOP_CATALOG') == 'mapped')
+    host = os.environ.get('SHOP_HOST', '127.0.0.1')
+    port = int(os.environ.get('SHOP_PORT', 8080))
+    if os.name == 'posix':
+        # Stop like Ctrl+C does: cancelling serve() saves and closes the shop.
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    print(f"Serving the shop on http://{host}:{port}/")
+    await service.serve(host, port)
+
+
+# MAIN EXECUTION
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
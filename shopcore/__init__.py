@@ -0,0 +1,13 @@
+"""
+The shop's model, stock and storage code, with no user interface. main.py,
+version4.py and version_5.py are Tk front ends over it; anything else (a
+server, a batch job, a benchmark) can import it without a display.
+"""
+from .errors import (AuthenticationError, ConflictError, EmptyCartError, InvalidQuantityError, InvalidUserDetailsError,
+                     NotInCartError, OrderPendingError, OutOfStockError, ShopError, UnknownProductError,
+                     UserExistsError)
+from .inventory import InventoryService
+from .models import Account, CartLine, Customer, Order, Product, ShoppingCart, User
+from .reservations import ReservationBook
+from .shop import Shop
+from .storage import SQLiteStorage, Storage, TextFileStorage, open_storage
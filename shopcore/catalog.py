@@ -0,0 +1,384 @@
+import bisect
+import csv
+import io
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import Mapping
+
+from . import durable
+
+# products.txt exists in two dialects:
+#   semicolon  product_id;name;price;description;quantity  (main.py, version4/5, test3)
+#   comma      product_id,name,price,quantity              (CLI scripts, VEr-6, the shipped file)
+SEMICOLON = 'semicolon'
+COMMA = 'comma'
+
+
+class CatalogTable:
+    """
+    A product catalog held column by column: ids, names and descriptions as
+    lists of str, prices and quantities as typed arrays.
+    """
+
+    def __init__(self, dialect, ids, names, prices, descriptions, quantities):
+        self.dialect = dialect
+        self.ids = ids
+        self.names = names
+        self.prices = prices
+        self.descriptions = descriptions
+        self.quantities = quantities
+        self._index = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def index(self):
+        """
+        product_id -> row number, built on first use.
+        """
+        if self._index is None:
+            self._index = {product_id: row for row, product_id in enumerate(self.ids)}
+        return self._index
+
+    def row(self, i):
+        return self.ids[i], self.names[i], self.prices[i], self.descriptions[i], self.quantities[i]
+
+    def rows(self):
+        """
+        Yields (product_id, name, price, description, quantity) for every product.
+        """
+        return zip(self.ids, self.names, self.prices, self.descriptions, self.quantities)
+
+
+def detect_dialect(text):
+    # Only the first non-blank line is looked at, without splitting the file.
+    start = 0
+    while start < len(text):
+        end = text.find('\n', start)
+        if end == -1:
+            end = len(text)
+        line = text[start:end]
+        if line.strip():
+            return SEMICOLON if ';' in line else COMMA
+        start = end + 1
+    return SEMICOLON
+
+
+def as_number(value):
+    """
+    Returns value as an int when it is integral, for callers that keep
+    whole-rupee prices.
+    """
+    return int(value) if float(value).is_integer() else value
+
+
+def parse_catalog(text):
+    if '\r' in text:
+        text = text.replace('\r\n', '\n')
+    text = text.strip('\n')
+    dialect = detect_dialect(text)
+    if not text:
+        return CatalogTable(dialect, [], [], array('d'), [], array('q'))
+    # Fast path: with no blank lines and no csv quoting, the whole file is one
+    # flat list of fields and every column is a stride through it.
+    if '\n\n' not in text and '"' not in text:
+        separator, width = (';', 5) if dialect == SEMICOLON else (',', 4)
+        flat = text.replace('\n', separator).split(separator)
+        if len(flat) == (text.count('\n') + 1) * width:
+            try:
+                if dialect == SEMICOLON:
+                    return CatalogTable(dialect, flat[0::5], flat[1::5], array('d', map(float, flat[2::5])),
+                                        flat[3::5], array('q', map(int, flat[4::5])))
+                return CatalogTable(dialect, flat[0::4], flat[1::4], array('d', map(float, flat[2::4])),
+                                    [''] * (len(flat) // 4), array('q', map(int, flat[3::4])))
+            except ValueError:
+                pass  # A malformed number somewhere; let the line parser report it.
+    return parse_lines(text, dialect)
+
+
+def parse_line(line, dialect):
+    """
+    Parses one products.txt line into (product_id, name, price, description, quantity).
+    Raises ValueError if it is malformed.
+    """
+    if dialect == SEMICOLON:
+        product_id, name, price, description, quantity = line.split(';')
+    else:
+        fields = next(csv.reader([line]))
+        if len(fields) < 4:
+            raise ValueError(f"expected 4 fields, got {len(fields)}")
+        product_id, name, price, quantity = fields[:4]
+        description = ''
+    return product_id, name, float(price), description, int(quantity)
+
+
+def parse_lines(text, dialect):
+    table = CatalogTable(dialect, [], [], array('d'), [], array('q'))
+    for line in text.split('\n'):
+        line = line.strip()
+        if line:
+            try:
+                product_id, name, price, description, quantity = parse_line(line, dialect)
+            except ValueError as e:
+                print(f"Error parsing line: {line}\n{e}")
+                continue
+            table.ids.append(product_id)
+            table.names.append(name)
+            table.prices.append(price)
+            table.descriptions.append(description)
+            table.quantities.append(quantity)
+    return table
+
+
+def load_catalog(path='products.txt'):
+    """
+    Reads products.txt in either dialect with a single read.
+    Raises FileNotFoundError if the file is missing.
+    """
+    with open(path, 'r', newline='') as f:
+        return parse_catalog(f.read())
+
+
+def update_stock(path, deltas):
+    """
+    Applies {product_id: stock change} to products.txt when several
+    processes share it. Under durable.file_lock() the file is read again,
+    only the lines of the changed products are rewritten (every other line
+    is kept as the other processes left it) and the file is replaced
+    atomically.
+
+    Returns (applied, table): table is the catalog as it now stands on
+    disk, for the caller to refresh its own copy from. If a change would
+    take a product below zero, or names a product that is not there,
+    nothing is written and applied is False.
+    """
+    with durable.file_lock(path):
+        with open(path, 'r') as f:
+            text = f.read()
+        table = parse_catalog(text)
+        index = table.index
+        if any(product_id not in index or table.quantities[index[product_id]] + delta < 0
+               for product_id, delta in deltas.items()):
+            return False, table
+        for product_id, delta in deltas.items():
+            table.quantities[index[product_id]] += delta
+        lines = text.split('\n')
+        for i, line in enumerate(lines):
+            product_id = product_id_of(line, table.dialect)
+            if product_id in deltas:
+                lines[i] = format_quantity(line, table.dialect, table.quantities[index[product_id]])
+        durable.atomic_write(path, '\n'.join(lines))
+    return True, table
+
+
+def product_id_of(line, dialect):
+    if not line.strip():
+        return None
+    if dialect == SEMICOLON:
+        return line.split(';', 1)[0].strip()
+    if line.lstrip().startswith('"'):
+        return next(csv.reader([line]))[0].strip()
+    return line.split(',', 1)[0].strip()
+
+
+def format_quantity(line, dialect, quantity):
+    # The line with only its quantity field replaced.
+    if dialect == SEMICOLON:
+        fields = line.split(';')
+        fields[4] = str(quantity)
+        return ';'.join(fields)
+    fields = next(csv.reader([line]))
+    fields[3] = str(quantity)
+    out = io.StringIO()
+    csv.writer(out, lineterminator='').writerow(fields)
+    return out.getvalue()
+
+
+# MEMORY-MAPPED CATALOG
+# products.txt.offsets.idx: magic, the inode/size/mtime of the products.txt it
+# describes, the row count, then product ids (sorted, int64) and the byte
+# offsets of their lines (uint64) as two packed arrays.
+OFFSETS_HEADER = struct.Struct('<4sQQQQ')
+OFFSETS_MAGIC = b'SCOI'
+
+
+class MappedCatalog:
+    """
+    Read-only view of products.txt through mmap. Opening it loads only the
+    id -> line offset index; a product's line is parsed when it is asked for,
+    and the file's pages are shared with every other process reading it.
+
+    Numeric product ids (the usual case) use a sorted id array searched with
+    bisect, persisted next to the catalog so later opens skip the scan.
+    Other ids fall back to a dict built on each open.
+    """
+
+    def __init__(self, path='products.txt'):
+        self.path = path
+        self.file = open(path, 'rb')
+        st = os.fstat(self.file.fileno())
+        self.stamp = (st.st_ino, st.st_size, st.st_mtime_ns)
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else b''
+        self.dialect = detect_dialect(self.mm[:65536].decode(errors='ignore'))
+        self.keys = None
+        self.offsets = None
+        self.by_id = None
+        if not self.load_index():
+            self.build_index()
+
+    def index_path(self):
+        return self.path + '.offsets.idx'
+
+    def load_index(self):
+        try:
+            with open(self.index_path(), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        if len(data) < OFFSETS_HEADER.size:
+            return False
+        magic, inode, size, mtime, count = OFFSETS_HEADER.unpack_from(data)
+        if magic != OFFSETS_MAGIC or (inode, size, mtime) != self.stamp:
+            return False
+        start = OFFSETS_HEADER.size
+        self.keys = array('q')
+        self.keys.frombytes(data[start:start + count * 8])
+        self.offsets = array('Q')
+        self.offsets.frombytes(data[start + count * 8:start + count * 16])
+        return True
+
+    def build_index(self):
+        separator = b';' if self.dialect == SEMICOLON else b','
+        entries = []
+        offset = 0
+        for line in bytes(self.mm).split(b'\n'):
+            if line.strip():
+                entries.append((line.split(separator, 1)[0].strip(), offset))
+            offset += len(line) + 1
+        try:
+            # Sorting by (id, offset) keeps the last line of a repeated id last,
+            # matching load_catalog() where later lines win.
+            pairs = sorted((int(product_id), offset) for product_id, offset in entries)
+        except ValueError:
+            self.by_id = {product_id.decode(): offset for product_id, offset in entries}
+            return
+        self.keys = array('q', [key for key, _ in pairs])
+        self.offsets = array('Q', [offset for _, offset in pairs])
+        try:
+            durable.atomic_write(self.index_path(), OFFSETS_HEADER.pack(OFFSETS_MAGIC, *self.stamp, len(pairs)) +
+                                 self.keys.tobytes() + self.offsets.tobytes())
+        except OSError:
+            pass  # A read-only directory just means scanning again next time.
+
+    def offset_of(self, product_id):
+        if self.by_id is not None:
+            return self.by_id.get(product_id)
+        try:
+            key = int(product_id)
+        except ValueError:
+            return None
+        i = bisect.bisect_right(self.keys, key) - 1
+        if i >= 0 and self.keys[i] == key:
+            return self.offsets[i]
+        return None
+
+    def __contains__(self, product_id):
+        return self.offset_of(product_id) is not None
+
+    def __len__(self):
+        return len(self.by_id) if self.by_id is not None else len(self.keys)
+
+    def get(self, product_id):
+        """
+        Returns (product_id, name, price, description, quantity) or None.
+        """
+        offset = self.offset_of(product_id)
+        if offset is None:
+            return None
+        end = self.mm.find(b'\n', offset)
+        line = self.mm[offset:end if end != -1 else len(self.mm)].decode().strip()
+        row = parse_line(line, self.dialect)
+        return (product_id,) + row[1:]
+
+    def rows(self):
+        """
+        Streams every product in file order, parsing one line at a time.
+        """
+        start = 0
+        size = len(self.mm)
+        while start < size:
+            end = self.mm.find(b'\n', start)
+            if end == -1:
+                end = size
+            line = self.mm[start:end].decode().strip()
+            start = end + 1
+            if line:
+                try:
+                    yield parse_line(line, self.dialect)
+                except ValueError as e:
+                    print(f"Error parsing line: {line}\n{e}")
+
+    def close(self):
+        if self.mm:
+            self.mm.close()
+        self.file.close()
+
+
+class ProductCache(Mapping):
+    """
+    product_id -> Product over a MappedCatalog, building each Product the
+    first time it is looked up and keeping it, so carts and stock changes
+    always see the same object.
+
+    deltas holds stock changes (e.g. a replayed journal) that the mapped
+    file does not contain yet.
+    """
+
+    def __init__(self, mapped, factory, deltas=None):
+        self.mapped = mapped
+        self.factory = factory
+        self.deltas = deltas or {}
+        self.cache = {}
+
+    def make(self, row):
+        product_id, name, price, description, quantity = row
+        return self.factory(product_id, name, price, description, quantity + self.deltas.get(product_id, 0))
+
+    def __getitem__(self, product_id):
+        product = self.cache.get(product_id)
+        if product is None:
+            row = self.mapped.get(product_id)
+            if row is None:
+                raise KeyError(product_id)
+            product = self.cache[product_id] = self.make(row)
+        return product
+
+    def __contains__(self, product_id):
+        return product_id in self.cache or product_id in self.mapped
+
+    def __iter__(self):
+        return (row[0] for row in self.mapped.rows())
+
+    def __len__(self):
+        return len(self.mapped)
+
+    def values(self):
+        # Looked-up products come from the cache; the rest are built for the
+        # caller only, so listing the catalog does not pin it all in memory.
+        for row in self.mapped.rows():
+            yield self.cache.get(row[0]) or self.make(row)
+
+    def rows(self):
+        """
+        Current (product_id, name, price, description, quantity) of every
+        product, for writing a fresh snapshot.
+        """
+        for row in self.mapped.rows():
+            product = self.cache.get(row[0])
+            if product is not None:
+                yield product.product_id, product.name, product.price, product.description, product.quantity
+            else:
+                yield row[:4] + (row[4] + self.deltas.get(row[0], 0),)
@@ -0,0 +1,224 @@
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _mode(data, base):
+    return base if isinstance(data, str) else base + 'b'
+
+
+def fsync_directory(directory):
+    # A rename is only durable once the directory entry is flushed too.
+    # Windows cannot open directories, and NTFS journals renames anyway.
+    if os.name == 'nt':
+        return
+    fd = os.open(directory or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, data):
+    """
+    Replaces path with data (str or bytes) so that a crash leaves either
+    the old file or the new one, never a truncated mix.
+    """
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory or '.', prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, _mode(data, 'w')) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    fsync_directory(directory)
+
+
+def durable_append(path, data):
+    """
+    Appends data (str or bytes) to path and waits until it is on disk.
+    """
+    with open(path, _mode(data, 'a')) as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Holds an exclusive advisory lock shared by every process that locks the
+    same path, for the duration of the with block. The lock lives on
+    path + '.lock' rather than on path itself, because atomic_write()
+    replaces path with a new file that an old lock would not cover.
+    """
+    with open(path + '.lock', 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK gives up after about 10 s; keep waiting
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# GROUP COMMIT
+class SaveRequest:
+    def __init__(self, path, data, append):
+        self.path = path
+        self.data = data
+        self.append = append
+        self.submitted = time.perf_counter()
+        self.error = None
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the batch holding this request is durable and re-raises
+        any error the writer hit.
+        """
+        if not self.done.wait(timeout):
+            raise TimeoutError(f"Save of {self.path} did not complete in time.")
+        if self.error is not None:
+            raise self.error
+
+
+class GroupCommitWriter:
+    """
+    Batches save requests from many threads into one durable write per file.
+
+    Requests that queue up while a batch is being flushed form the next
+    batch; a non-zero `window` (seconds) additionally holds each batch open
+    that long after its first request to gather more. Overwrites of the same
+    file collapse to the newest contents, appends are concatenated in order,
+    and each file is then written and fsynced once for the whole batch.
+
+    Only writers that save from several threads at once gain anything. A
+    Shop does not use it: its saves all run one at a time on its
+    PersistenceWorker, so every batch would hold a single request.
+    """
+
+    def __init__(self, window=0.0):
+        self.window = window
+        self.pending = []
+        self.cond = threading.Condition()
+        self.closed = False
+        self.requests = 0
+        self.batches = 0
+        self.writes = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, name='group-commit', daemon=True)
+        self.thread.start()
+
+    def submit(self, path, data, append=False):
+        request = SaveRequest(path, data, append)
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("GroupCommitWriter is closed.")
+            self.pending.append(request)
+            self.cond.notify()
+        return request
+
+    def write(self, path, data):
+        self.submit(path, data).wait()
+
+    def append(self, path, data):
+        self.submit(path, data, append=True).wait()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.cond.wait()
+                if not self.pending and self.closed:
+                    return
+            if self.window:
+                time.sleep(self.window)
+            with self.cond:
+                batch, self.pending = self.pending, []
+            self.commit(batch)
+
+    def commit(self, batch):
+        # path -> [replacement contents or None for "append to file", appended chunks]
+        files = {}
+        for request in batch:
+            state = files.setdefault(request.path, [None, []])
+            if request.append:
+                state[1].append(request.data)
+            else:
+                state[0] = request.data
+                state[1] = []
+        errors = {}
+        for path, (contents, chunks) in files.items():
+            try:
+                if contents is not None:
+                    atomic_write(path, contents + contents[:0].join(chunks))
+                else:
+                    durable_append(path, chunks[0][:0].join(chunks))
+            except OSError as e:
+                errors[path] = e
+        finished = time.perf_counter()
+        with self.cond:
+            self.batches += 1
+            self.writes += len(files)
+            for request in batch:
+                latency = finished - request.submitted
+                self.requests += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+        for request in batch:
+            request.error = errors.get(request.path)
+            request.done.set()
+
+    def stats(self):
+        """
+        Returns request/batch/write counts, mean and max latency in seconds
+        and throughput in requests per second since the writer started.
+        """
+        with self.cond:
+            elapsed = time.perf_counter() - self.started
+            return {
+                'requests': self.requests,
+                'batches': self.batches,
+                'writes': self.writes,
+                'mean_latency': self.total_latency / self.requests if self.requests else 0.0,
+                'max_latency': self.max_latency,
+                'throughput': self.requests / elapsed if elapsed else 0.0,
+            }
+
+    def close(self):
+        """
+        Flushes whatever is still queued and stops the writer thread.
+        """
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
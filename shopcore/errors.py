@@ -0,0 +1,67 @@
+class ShopError(Exception):
+    """
+    Base class of the errors the shop core raises for things a shopper did
+    wrong or could not do. User interfaces catch these and show the message.
+    """
+
+
+class UnknownProductError(ShopError):
+    def __init__(self, product_id):
+        super().__init__(f"Invalid product ID: {product_id}.")
+        self.product_id = product_id
+
+
+class InvalidQuantityError(ShopError):
+    def __init__(self, quantity):
+        super().__init__(f"Invalid quantity: {quantity}.")
+        self.quantity = quantity
+
+
+class OutOfStockError(ShopError):
+    def __init__(self, product, available):
+        super().__init__(f"Sorry, only {available} of {product.name} are available.")
+        self.product = product
+        self.available = available
+
+
+class NotInCartError(ShopError):
+    def __init__(self, product):
+        super().__init__(f"{product.name} is not in the cart.")
+        self.product = product
+
+
+class EmptyCartError(ShopError):
+    def __init__(self):
+        super().__init__("Your cart is empty.")
+
+
+class ConflictError(ShopError):
+    # Stored stock of these products changed under a checkout; see
+    # Storage.commit_stock().
+    def __init__(self, product_ids):
+        super().__init__("The stock changed while you were checking out. Please try again.")
+        self.product_ids = product_ids
+
+
+class OrderPendingError(ShopError):
+    # The user's last checkout is still being committed; see Shop.place_order().
+    def __init__(self):
+        super().__init__("Your order is still being placed. Please wait a moment.")
+
+
+class AuthenticationError(ShopError):
+    def __init__(self):
+        super().__init__("Invalid username or password.")
+
+
+class InvalidUserDetailsError(ShopError):
+    # See Shop.register() for what usernames and the other fields may hold.
+    def __init__(self, field):
+        super().__init__(f"Invalid {field.replace('_', ' ')}.")
+        self.field = field
+
+
+class UserExistsError(ShopError):
+    def __init__(self, username):
+        super().__init__("Username already exists.")
+        self.username = username
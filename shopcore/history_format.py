@@ -0,0 +1,149 @@
+import datetime
+import mmap
+import os
+import struct
+
+# Binary order history, one file per user ({username}_history.bin):
+#
+#   file header   magic b'SCHB', version (uint16), reserved (uint16)
+#   order header  date as microseconds since 1970-01-01 (int64),
+#                 total (float64), number of lines (uint32)
+#   order lines   product_id (uint32), quantity (uint32),
+#                 unit price in cents (int64, -1 if not recorded), repeated
+#
+# Everything is little-endian and fixed-size, so a reader can walk the
+# file with unpack_from() and never parse text or dates. Version 1 files
+# have no unit price in their lines; they are still read, and rewritten as
+# version 2 before anything is appended to them.
+MAGIC = b'SCHB'
+VERSION = 2
+FILE_HEADER = struct.Struct('<4sHH')
+ORDER_HEADER = struct.Struct('<qdI')
+ORDER_LINE = struct.Struct('<IIq')
+V1_ORDER_LINE = struct.Struct('<II')
+NO_PRICE = -1
+
+EPOCH = datetime.datetime(1970, 1, 1)
+ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def to_micros(date):
+    return (date - EPOCH) // ONE_MICROSECOND
+
+
+def from_micros(micros):
+    return EPOCH + datetime.timedelta(microseconds=micros)
+
+
+def encode_order(date, items, total):
+    """
+    Packs one (date, [(product_id, quantity, unit_cents), ...], total) order.
+    Product ids must be numeric, as they are in products.txt; unit_cents may
+    be None.
+    """
+    parts = [ORDER_HEADER.pack(to_micros(date), total, len(items))]
+    for product_id, quantity, unit_cents in items:
+        parts.append(ORDER_LINE.pack(int(product_id), quantity, NO_PRICE if unit_cents is None else unit_cents))
+    return b''.join(parts)
+
+
+def file_header():
+    return FILE_HEADER.pack(MAGIC, VERSION, 0)
+
+
+def encode_orders(orders):
+    return b''.join(encode_order(date, items, total) for date, items, total in orders)
+
+
+def file_version(path):
+    """
+    Returns the version of the history file at path, or None if it does not
+    exist or is empty.
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(FILE_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if not header:
+        return None
+    magic, version, _ = FILE_HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a history file")
+    return version
+
+
+def order_spans(mm, line_format):
+    # Yields (start, lines_start, lines_end) of each complete order after the
+    # file header. An append that was cut short can leave part of an order
+    # at the end of the file; that part is not yielded.
+    offset = FILE_HEADER.size
+    end = len(mm)
+    while offset + ORDER_HEADER.size <= end:
+        count = ORDER_HEADER.unpack_from(mm, offset)[2]
+        lines_start = offset + ORDER_HEADER.size
+        lines_end = lines_start + count * line_format.size
+        if lines_end > end:
+            return
+        yield offset, lines_start, lines_end
+        offset = lines_end
+
+
+def line_format_of(path, mm):
+    magic, version, _ = FILE_HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or version not in (1, VERSION):
+        raise ValueError(f"{path} is not a version 1 or {VERSION} history file")
+    return ORDER_LINE if version == VERSION else V1_ORDER_LINE
+
+
+def iter_records(path):
+    """
+    Yields (date_micros, total, ((product_id, quantity, unit_cents), ...))
+    straight from the mapped file, without building datetimes or Order
+    objects. unit_cents is NO_PRICE where it was not recorded. A partly
+    written order at the end of the file is skipped.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            line_format = line_format_of(path, mm)
+            for start, lines_start, lines_end in order_spans(mm, line_format):
+                micros, total, _ = ORDER_HEADER.unpack_from(mm, start)
+                items = tuple(line_format.iter_unpack(mm[lines_start:lines_end]))
+                if line_format is V1_ORDER_LINE:
+                    items = tuple((product_id, quantity, NO_PRICE) for product_id, quantity in items)
+                yield micros, total, items
+
+
+def trim_partial_order(path):
+    """
+    Cuts a partly written order off the end of the history file at path, so
+    the next append starts on an order boundary. Returns True if anything
+    was cut.
+    """
+    with open(path, 'r+b') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= FILE_HEADER.size:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            complete = FILE_HEADER.size
+            for _, _, lines_end in order_spans(mm, line_format_of(path, mm)):
+                complete = lines_end
+        if complete == size:
+            return False
+        f.truncate(complete)
+        os.fsync(f.fileno())
+        return True
+
+
+def read_orders(path):
+    """
+    Returns the history as (date, [(product_id, quantity, unit_cents), ...],
+    total) records, the same shape the text storage produces.
+    """
+    return [(from_micros(micros),
+             [(str(product_id), quantity, None if unit_cents == NO_PRICE else unit_cents)
+              for product_id, quantity, unit_cents in items],
+             total)
+            for micros, total, items in iter_records(path)]
@@ -0,0 +1,54 @@
+import bisect
+
+
+class OrderHistoryIndex:
+    """
+    Orders indexed by date and by product id, for "orders between these
+    dates" and "orders containing this product" without walking a history.
+
+    Each order added gets a key (date, sequence number). by_date holds every
+    key in sorted order and by_product holds, per product id, the keys of the
+    orders containing it, also sorted; date ranges are found by bisecting
+    either list. Orders are usually added in date order, which makes adding
+    an append. The values stored are whatever the caller passes, e.g. Order
+    objects for one user or (username, Order) pairs for the whole shop.
+    """
+
+    def __init__(self):
+        self.values = []
+        self.by_date = []
+        self.by_product = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, date, product_ids, value):
+        key = (date, len(self.values))
+        self.values.append(value)
+        bisect.insort(self.by_date, key)
+        for product_id in set(product_ids):
+            bisect.insort(self.by_product.setdefault(product_id, []), key)
+
+    @staticmethod
+    def span(keys, start, end):
+        # Positions of the keys with start <= date < end.
+        first = 0 if start is None else bisect.bisect_left(keys, (start,))
+        last = len(keys) if end is None else bisect.bisect_left(keys, (end,))
+        return first, max(first, last)
+
+    def between(self, start=None, end=None):
+        """
+        Returns the orders dated start <= date < end (either may be None),
+        oldest first.
+        """
+        first, last = self.span(self.by_date, start, end)
+        return [self.values[n] for _, n in self.by_date[first:last]]
+
+    def containing(self, product_id, start=None, end=None):
+        """
+        Returns the orders containing product_id, optionally only those dated
+        start <= date < end, oldest first.
+        """
+        keys = self.by_product.get(product_id, [])
+        first, last = self.span(keys, start, end)
+        return [self.values[n] for _, n in keys[first:last]]
@@ -0,0 +1,75 @@
+import threading
+from contextlib import contextmanager
+
+
+class InventoryService:
+    """
+    Thread-safe stock changes on Products.
+
+    Every product id has its own lock, so shoppers working on different
+    products never wait for each other and two shoppers after the last item
+    of one product cannot both get it. Anything that changes
+    Product.quantity from more than one thread must go through here.
+
+    Operations on several products (take_all, locked) acquire their locks
+    in sorted product id order, so two multi-line checkouts sharing products
+    can never deadlock.
+    """
+
+    def __init__(self):
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+
+    def lock(self, product_id):
+        lock = self.locks.get(product_id)
+        if lock is None:
+            with self.locks_lock:
+                lock = self.locks.setdefault(product_id, threading.Lock())
+        return lock
+
+    @contextmanager
+    def locked(self, products):
+        """
+        Holds the locks of all the given products for the duration of the
+        with block.
+        """
+        locks = [self.lock(product_id) for product_id in sorted({product.product_id for product in products})]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def take(self, product, quantity):
+        """
+        Takes quantity of product off the shelf. Returns False, taking
+        nothing, if that much is not available.
+        """
+        with self.lock(product.product_id):
+            if quantity <= 0 or product.quantity < quantity:
+                return False
+            product.quantity -= quantity
+            return True
+
+    def put_back(self, product, quantity):
+        with self.lock(product.product_id):
+            product.quantity += quantity
+
+    def take_all(self, lines):
+        """
+        Takes every (product, quantity) line, or none of them if any product
+        is short. Returns True if the lines were taken.
+        """
+        wanted = {}
+        for product, quantity in lines:
+            if quantity <= 0:
+                return False
+            wanted[product] = wanted.get(product, 0) + quantity
+        with self.locked(wanted):
+            if any(product.quantity < quantity for product, quantity in wanted.items()):
+                return False
+            for product, quantity in wanted.items():
+                product.quantity -= quantity
+            return True
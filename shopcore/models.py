@@ -0,0 +1,272 @@
+from abc import ABC, abstractmethod
+import datetime
+
+from .errors import EmptyCartError, InvalidQuantityError, NotInCartError, OutOfStockError
+from .money import from_cents, to_cents
+
+
+# PRODUCT CLASS
+class Product:
+    # No per-instance __dict__: catalogs and order histories hold millions of these.
+    # version is the stored stock's version as last read or written by this
+    # process; checkouts are only accepted against the current one.
+    __slots__ = ('product_id', 'name', 'price', 'description', 'quantity', 'version')
+
+    def __init__(self, product_id, name, price, description, quantity, version=0):
+        self.product_id = product_id
+        self.name = name
+        self.price = price
+        self.description = description
+        self.quantity = quantity
+        self.version = version
+
+    def __str__(self):
+        return f"{self.name} (${self.price}): {self.description} - Quantity: {self.quantity}"
+
+    def __eq__(self, other):
+        if isinstance(other, Product):
+            return self.product_id == other.product_id
+        return False
+
+    def __hash__(self):
+        return hash(self.product_id)
+
+    def __add__(self, other):
+        if isinstance(other, Product):
+            return self.price + other.price
+        return NotImplemented
+
+    def __sub__(self, other):
+        if isinstance(other, Product):
+            return self.price - other.price
+        return NotImplemented
+
+
+# USER CLASS
+class User:
+    __slots__ = ('username', 'password', 'first_name', 'last_name', 'address', 'cart', 'history')
+
+    def __init__(self, username, password, first_name, last_name, address):
+        self.username = username
+        self.password = password
+        self.first_name = first_name
+        self.last_name = last_name
+        self.address = address
+        self.cart = ShoppingCart()
+        self.history = []
+
+    def __str__(self):
+        return f"{self.first_name} {self.last_name}, {self.address}"
+
+    def add_to_cart(self, product, quantity=1):
+        return self.cart.add_product(product, quantity)
+
+    def remove_from_cart(self, product, quantity=1):
+        return self.cart.remove_product(product, quantity)
+
+
+# CART LINE CLASS
+class CartLine:
+    # One product/quantity line of a cart. It replaces the old
+    # {'product': ..., 'quantity': ...} dicts and still answers line['product']
+    # and line['quantity'], so code written against the dicts keeps working.
+    # The unit price is fixed in cents when the line is made.
+    __slots__ = ('product', 'quantity', 'unit_cents')
+    KEYS = ('product', 'quantity')
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+        self.unit_cents = to_cents(product.price)
+
+    @property
+    def total_cents(self):
+        return self.unit_cents * self.quantity
+
+    def __getitem__(self, key):
+        if key not in CartLine.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in CartLine.KEYS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+
+# SHOPPINGCART CLASS
+class ShoppingCart:
+    # With a ReservationBook, stock for each line is held for `owner` and
+    # expires if the cart is left alone; without one it is simply taken off
+    # the shelf.
+    # subtotal_cents and item_count are kept up to date on every change, so
+    # lines must only be added or removed through the methods below.
+    __slots__ = ('items', 'reservations', 'owner', 'subtotal_cents', 'item_count')
+
+    def __init__(self, reservations=None, owner=None):
+        self.items = {}
+        self.reservations = reservations
+        self.owner = owner
+        self.subtotal_cents = 0
+        self.item_count = 0
+
+    @property
+    def total(self):
+        return from_cents(self.subtotal_cents)
+
+    def take_stock(self, product, quantity):
+        if self.reservations is not None:
+            return self.reservations.reserve(self.owner, product, quantity)
+        if product.quantity < quantity:
+            return False
+        product.quantity -= quantity
+        return True
+
+    def return_stock(self, product, quantity):
+        if self.reservations is not None:
+            self.reservations.release(self.owner, product, quantity)
+        else:
+            product.quantity += quantity
+
+    def restore_line(self, product, quantity):
+        """
+        Adds quantity of product to the cart without touching stock.
+        """
+        line = self.items.get(product)
+        if line is None:
+            line = self.items[product] = CartLine(product, 0)
+        line.quantity += quantity
+        self.subtotal_cents += line.unit_cents * quantity
+        self.item_count += quantity
+        return line
+
+    def drop_line(self, product, quantity=None):
+        """
+        Takes up to quantity (the whole line by default) of product out of the
+        cart without touching stock. Returns how many were taken.
+        """
+        line = self.items.get(product)
+        if line is None:
+            return 0
+        if quantity is None or quantity >= line.quantity:
+            quantity = line.quantity
+            del self.items[product]
+        else:
+            line.quantity -= quantity
+        self.subtotal_cents -= line.unit_cents * quantity
+        self.item_count -= quantity
+        return quantity
+
+    def clear(self):
+        """
+        Empties the cart without touching stock, e.g. once it has been sold.
+        """
+        self.items = {}
+        self.subtotal_cents = 0
+        self.item_count = 0
+
+    def add_product(self, product, quantity=1):
+        """
+        Takes quantity of product off the shelf into the cart and returns its
+        CartLine. Raises InvalidQuantityError or OutOfStockError.
+        """
+        if quantity <= 0:
+            raise InvalidQuantityError(quantity)
+        if not self.take_stock(product, quantity):
+            raise OutOfStockError(product, product.quantity)
+        return self.restore_line(product, quantity)
+
+    def remove_product(self, product, quantity=1):
+        """
+        Puts up to quantity of product back on the shelf and returns how many
+        were removed. Raises EmptyCartError or NotInCartError.
+        """
+        if not self.items:
+            raise EmptyCartError()
+        if product not in self.items:
+            raise NotInCartError(product)
+        removed = self.drop_line(product, quantity)
+        self.return_stock(product, removed)
+        return removed
+
+    def checkout(self):
+        """
+        Turns the cart into an Order and empties it; held stock becomes sold.
+        Raises EmptyCartError.
+        """
+        if not self.items:
+            raise EmptyCartError()
+        if self.reservations is not None:
+            self.reservations.commit(self.owner)
+        order = Order.from_cart(self.items, self.total)
+        self.clear()
+        return order
+
+
+# ABSTRACT CLASS
+class Account(ABC):
+    __slots__ = ()
+
+    @abstractmethod
+    def view_products(self):
+        pass
+
+    @abstractmethod
+    def view_history(self):
+        pass
+
+
+# CUSTOMER CLASS
+class Customer(User, Account):
+    __slots__ = ()
+
+    def view_products(self, products):
+        for product in products:
+            print(product)
+
+    def view_history(self):
+        if not self.history:
+            print("No purchase history.")
+        else:
+            for order in self.history:
+                print(order)
+
+
+# ORDER CLASS
+class Order:
+    # An order is a snapshot taken at checkout: lines is a tuple of
+    # (product_id, quantity, unit_cents) tuples, so later price and stock
+    # changes never show up in it. unit_cents is None for orders stored
+    # before prices were recorded. Products are only looked up to display it.
+    __slots__ = ('date', 'lines', 'total')
+
+    def __init__(self, lines, total, date=None):
+        self.date = date or datetime.datetime.now()
+        self.lines = tuple(lines)
+        self.total = total
+
+    @classmethod
+    def from_cart(cls, items, total):
+        return cls([(line.product.product_id, line.quantity, line.unit_cents) for line in items.values()], total)
+
+    def product_ids(self):
+        return [line[0] for line in self.lines]
+
+    def describe(self, products):
+        """
+        Returns the order as text, naming products through products
+        (product_id -> Product). Unknown products are shown by id.
+        """
+        rows = []
+        for product_id, quantity, unit_cents in self.lines:
+            product = products.get(product_id)
+            name = product.name if product is not None else f"Product {product_id}"
+            if unit_cents is None and product is not None:
+                unit_cents = to_cents(product.price)
+            amount = "" if unit_cents is None else f": ${from_cents(unit_cents * quantity)}"
+            rows.append(f"{name} (x{quantity}){amount}")
+        items_str = '\n'.join(rows)
+        return f"Date: {self.date}\nItems:\n{items_str}\nTotal: ${self.total}"
+
+    def __str__(self):
+        return self.describe({})
@@ -0,0 +1,18 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+
+def to_cents(amount):
+    """
+    Converts a price (int, float or numeric str) to a whole number of cents.
+    Floats go through their shortest repr, so 0.1 becomes 10, not 10.000000000000002.
+    """
+    return int((Decimal(str(amount)) * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    """
+    Converts cents back to an amount for display and storage: an int when it
+    is a whole number, as the whole-rupee scripts expect, otherwise a float.
+    """
+    whole, part = divmod(cents, 100)
+    return whole if not part else cents / 100
@@ -0,0 +1,128 @@
+import queue
+import threading
+
+
+class PersistenceWorker:
+    """
+    Runs save jobs on a background thread so the Tk main loop never waits
+    for the disk.
+
+    Jobs run one at a time in submission order. A job submitted with a key
+    replaces any still-pending job with the same key and moves to the back
+    of the queue, so a burst of saves of one file becomes a single write
+    holding the newest snapshot. Callers must take that snapshot on the UI
+    thread and pass it as arguments; the job itself must not read live
+    model objects.
+
+    Completion callbacks are handed back to the UI thread through
+    root.after(); without a root they run on the worker thread. A root
+    that also has call_soon_threadsafe(fn) (see service.LoopScheduler) is
+    woken as soon as a job is done instead of on its next poll. A job's
+    on_done gets its result; if the job or on_done raises, its on_error (or
+    the worker's) gets the exception. A callback that raises never stops
+    the worker or the delivery of other jobs' callbacks.
+    """
+
+    POLL_MS = 50
+
+    def __init__(self, root=None, on_error=None):
+        self.root = root
+        self.on_error = on_error
+        self.jobs = []
+        self.busy = False
+        self.closed = False
+        self.cond = threading.Condition()
+        self.completed = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name='persistence', daemon=True)
+        self.thread.start()
+        if root is not None:
+            root.after(self.POLL_MS, self.poll)
+
+    def submit(self, key, fn, *args, on_done=None, on_error=None):
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("PersistenceWorker is closed.")
+            if key is not None:
+                self.jobs = [job for job in self.jobs if job[0] != key]
+            self.jobs.append((key, fn, args, on_done, on_error or self.on_error))
+            self.cond.notify_all()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.jobs and not self.closed:
+                    self.cond.wait()
+                if not self.jobs:
+                    return
+                key, fn, args, on_done, on_error = self.jobs.pop(0)
+                self.busy = True
+            try:
+                try:
+                    result = fn(*args)
+                except Exception as e:
+                    self.report(on_error, e, None)
+                else:
+                    self.report(on_done, result, on_error)
+            finally:
+                with self.cond:
+                    self.busy = False
+                    self.cond.notify_all()
+
+    def report(self, callback, value, on_error):
+        if callback is None:
+            return
+        if self.root is None:
+            self.call(callback, value, on_error)
+            return
+        self.completed.put((callback, value, on_error))
+        wake = getattr(self.root, 'call_soon_threadsafe', None)
+        if wake is not None:
+            wake(self.deliver)
+
+    def call(self, callback, value, on_error):
+        # Runs callback(value); what it raises goes to on_error, and what
+        # that raises is only printed.
+        try:
+            callback(value)
+        except Exception as e:
+            if on_error is None:
+                print(f"Error in save callback: {e!r}")
+            else:
+                self.call(on_error, e, None)
+
+    def poll(self):
+        # Runs on the Tk thread: deliver finished jobs, then check again later.
+        try:
+            self.deliver()
+        finally:
+            if not self.closed:
+                self.root.after(self.POLL_MS, self.poll)
+
+    def deliver(self):
+        """
+        Runs the callbacks of the jobs finished so far. Only call it on the
+        root's thread.
+        """
+        while True:
+            try:
+                callback, value, on_error = self.completed.get_nowait()
+            except queue.Empty:
+                break
+            self.call(callback, value, on_error)
+
+    def flush(self):
+        """
+        Blocks until every job submitted so far has been written.
+        """
+        with self.cond:
+            while self.jobs or self.busy:
+                self.cond.wait()
+
+    def close(self):
+        """
+        Flushes pending jobs and stops the worker thread.
+        """
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join()
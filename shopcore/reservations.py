@@ -0,0 +1,170 @@
+import heapq
+import itertools
+import threading
+import time
+
+from .inventory import InventoryService
+
+# How long an item sits in a cart before its stock goes back on the shelf.
+DEFAULT_TTL = 15 * 60
+
+
+class Hold:
+    __slots__ = ('owner', 'product', 'quantity', 'expires')
+
+    def __init__(self, owner, product, quantity, expires):
+        self.owner = owner
+        self.product = product
+        self.quantity = quantity
+        self.expires = expires
+
+
+class ReservationBook:
+    """
+    Time-limited stock holds for cart lines.
+
+    Reserving takes stock off Product.quantity (which therefore always means
+    "available to add to a cart") and records a hold for (owner, product_id)
+    that expires `ttl` seconds after it was last topped up. Expiry times sit
+    in a heap, so sweep() only looks at holds that are actually due, at
+    O(log n) each. commit() turns an owner's holds into sales, after which
+    the stock is gone for good.
+
+    on_change(product), if given, is called whenever a hold moves stock on
+    or off the shelf.
+
+    The book is safe to share between threads. Stock moves through
+    `inventory` (an InventoryService, one lock per product) and the holds
+    are guarded by the book's own lock; the two are never held together,
+    so sessions only queue on each other for the bookkeeping. on_change is
+    called under the book's lock, one call at a time.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, clock=time.monotonic, on_change=None, inventory=None):
+        self.ttl = ttl
+        self.clock = clock
+        self.on_change = on_change
+        self.inventory = inventory if inventory is not None else InventoryService()
+        self.lock = threading.RLock()
+        self.holds = {}
+        # (expires, seq, owner, product_id); entries whose hold was topped up
+        # or removed since are skipped when they surface.
+        self.heap = []
+        self.seq = itertools.count()
+        self.held_by_product = {}
+        # owner -> product_ids of their holds, so one owner's holds are found
+        # without scanning everyone's.
+        self.held_by_owner = {}
+
+    def reserve(self, owner, product, quantity):
+        """
+        Holds quantity of product for owner. Returns False, holding nothing,
+        if that much is not available.
+        """
+        if not self.inventory.take(product, quantity):
+            return False
+        key = (owner, product.product_id)
+        with self.lock:
+            hold = self.holds.get(key)
+            expires = self.clock() + self.ttl
+            if hold is None:
+                hold = self.holds[key] = Hold(owner, product, 0, expires)
+                self.held_by_owner.setdefault(owner, set()).add(product.product_id)
+            hold.quantity += quantity
+            hold.expires = expires
+            self.held_by_product[product.product_id] = self.held_by_product.get(product.product_id, 0) + quantity
+            heapq.heappush(self.heap, (expires, next(self.seq), owner, product.product_id))
+        self.changed(product)
+        return True
+
+    def renew(self, owner):
+        """
+        Restarts the clock on all of owner's holds, e.g. while they are being
+        checked out.
+        """
+        with self.lock:
+            expires = self.clock() + self.ttl
+            for product_id in self.held_by_owner.get(owner, ()):
+                self.holds[(owner, product_id)].expires = expires
+                heapq.heappush(self.heap, (expires, next(self.seq), owner, product_id))
+
+    def release(self, owner, product, quantity=None, expires=None):
+        """
+        Puts up to quantity (all of it by default) of owner's hold on product
+        back on the shelf. With expires, only a hold still due at that time
+        is released. Returns how much was released.
+        """
+        key = (owner, product.product_id)
+        with self.lock:
+            hold = self.holds.get(key)
+            if hold is None or (expires is not None and hold.expires != expires):
+                return 0
+            if quantity is None or quantity >= hold.quantity:
+                quantity = hold.quantity
+                del self.holds[key]
+                owned = self.held_by_owner[owner]
+                owned.discard(product.product_id)
+                if not owned:
+                    del self.held_by_owner[owner]
+            else:
+                hold.quantity -= quantity
+            self.unhold(product.product_id, quantity)
+        self.inventory.put_back(product, quantity)
+        self.changed(product)
+        return quantity
+
+    def release_all(self, owner):
+        with self.lock:
+            products = [self.holds[(owner, product_id)].product for product_id in self.held_by_owner.get(owner, ())]
+        for product in products:
+            self.release(owner, product)
+
+    def changed(self, product):
+        if self.on_change is not None:
+            with self.lock:
+                self.on_change(product)
+
+    def commit(self, owner):
+        """
+        Converts all of owner's holds into sales and returns them as a list
+        of (product, quantity).
+        """
+        sold = []
+        with self.lock:
+            for product_id in self.held_by_owner.pop(owner, ()):
+                hold = self.holds.pop((owner, product_id))
+                self.unhold(hold.product.product_id, hold.quantity)
+                sold.append((hold.product, hold.quantity))
+        return sold
+
+    def held(self, product_id):
+        return self.held_by_product.get(product_id, 0)
+
+    def unhold(self, product_id, quantity):
+        remaining = self.held_by_product[product_id] - quantity
+        if remaining:
+            self.held_by_product[product_id] = remaining
+        else:
+            del self.held_by_product[product_id]
+
+    def sweep(self, now=None):
+        """
+        Releases every hold that has expired and returns them as a list of
+        (owner, product, quantity) so callers can drop the cart lines.
+        """
+        now = self.clock() if now is None else now
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                expires, _, owner, product_id = heapq.heappop(self.heap)
+                hold = self.holds.get((owner, product_id))
+                if hold is None or hold.expires != expires:
+                    continue
+                due.append((owner, hold.product, expires))
+        expired = []
+        for owner, product, expires in due:
+            # A hold topped up since it was popped is no longer due.
+            quantity = self.release(owner, product, expires=expires)
+            if quantity:
+                expired.append((owner, product, quantity))
+        return expired
@@ -0,0 +1,208 @@
+import bisect
+import heapq
+import re
+from array import array
+
+TOKEN = re.compile(r'[a-z0-9]+')
+
+# A query word found in a product's name counts for more than one found
+# only in its description.
+NAME_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+# The last query word also matches longer words starting with it; only this
+# many of them (the ones on most products) take part, so a one-letter prefix
+# stays cheap.
+PREFIX_EXPANSION = 32
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+class ProductSearchIndex:
+    """
+    Inverted index over product names and descriptions.
+
+    Every product gets an ordinal; each word maps to an array of the ordinals
+    of the products whose name (or description) contains it, in ascending
+    order. A sorted list of all words answers prefix lookups with bisect.
+
+    search() returns the product ids matching every query word, the last one
+    as a prefix, best first: name matches outrank description matches, ties
+    keep catalog order. A product that is updated or removed leaves a dead
+    ordinal behind; the postings are compacted once half of them are dead.
+    """
+
+    def __init__(self, entries=()):
+        self.ids = []        # ordinal -> product_id, None once dead
+        self.ordinals = {}   # product_id -> live ordinal
+        self.name_postings = {}
+        self.description_postings = {}
+        self.dead = 0
+        for product_id, name, description in entries:
+            self.index(product_id, name, description)
+        self.vocabulary = sorted(self.name_postings.keys() | self.description_postings.keys())
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def index(self, product_id, name, description):
+        ordinal = len(self.ids)
+        self.ids.append(product_id)
+        self.ordinals[product_id] = ordinal
+        new_words = []
+        for postings, text in ((self.name_postings, name), (self.description_postings, description or '')):
+            for word in set(tokenize(text)):
+                ordinals = postings.get(word)
+                if ordinals is None:
+                    ordinals = postings[word] = array('I')
+                    new_words.append(word)
+                ordinals.append(ordinal)
+        return new_words
+
+    def add(self, product_id, name, description=''):
+        """
+        Indexes a product, replacing what was indexed for it before.
+        """
+        if product_id in self.ordinals:
+            self.remove(product_id)
+        for word in self.index(product_id, name, description):
+            i = bisect.bisect_left(self.vocabulary, word)
+            if i == len(self.vocabulary) or self.vocabulary[i] != word:
+                self.vocabulary.insert(i, word)
+
+    update = add
+
+    def remove(self, product_id):
+        ordinal = self.ordinals.pop(product_id, None)
+        if ordinal is None:
+            return
+        self.ids[ordinal] = None
+        self.dead += 1
+        if self.dead * 2 > len(self.ids):
+            self.compact()
+
+    def compact(self):
+        # Renumber the live products and drop dead ordinals from every posting
+        # list; ascending order is kept because renumbering is monotonic.
+        renumber = array('l', [-1]) * len(self.ids)
+        ids = []
+        for ordinal, product_id in enumerate(self.ids):
+            if product_id is not None:
+                renumber[ordinal] = len(ids)
+                ids.append(product_id)
+        for postings in (self.name_postings, self.description_postings):
+            for word in list(postings):
+                live = array('I', [renumber[o] for o in postings[word] if renumber[o] >= 0])
+                if live:
+                    postings[word] = live
+                else:
+                    del postings[word]
+        self.ids = ids
+        self.ordinals = {product_id: ordinal for ordinal, product_id in enumerate(ids)}
+        self.dead = 0
+        self.vocabulary = sorted(self.name_postings.keys() | self.description_postings.keys())
+
+    def expand(self, prefix):
+        i = bisect.bisect_left(self.vocabulary, prefix)
+        j = bisect.bisect_left(self.vocabulary, prefix + '\uffff', i)
+        words = self.vocabulary[i:j]
+        if len(words) > PREFIX_EXPANSION:
+            words = heapq.nlargest(PREFIX_EXPANSION, words, key=self.frequency)
+        return words
+
+    def frequency(self, word):
+        return len(self.name_postings.get(word, ())) + len(self.description_postings.get(word, ()))
+
+    def term(self, words):
+        # One query word as [(weight, ordinals), ...] over every word it stands for.
+        lists = []
+        for word in words:
+            if word in self.name_postings:
+                lists.append((NAME_WEIGHT, self.name_postings[word]))
+            if word in self.description_postings:
+                lists.append((DESCRIPTION_WEIGHT, self.description_postings[word]))
+        return lists
+
+    def search(self, query, limit=20):
+        """
+        Returns up to limit product ids matching query, best match first.
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        terms = [self.term([word]) for word in words[:-1]]
+        terms.append(self.term(self.expand(words[-1])))
+        if not all(terms):
+            return []
+        if len(terms) == 1:
+            return self.first(terms[0], limit)
+        best = self.name_matches(terms, limit)
+        if len(best) == limit:
+            return best
+        terms.sort(key=lambda lists: sum(len(ordinals) for _, ordinals in lists))
+        ids = self.ids
+        # Scores start from the rarest word; the other words only look up the
+        # candidates it produced, with a binary search per posting list.
+        scores = {}
+        for weight, ordinals in terms[0]:
+            for ordinal in ordinals:
+                if ids[ordinal] is not None and scores.get(ordinal, 0) < weight:
+                    scores[ordinal] = weight
+        for lists in terms[1:]:
+            narrowed = {}
+            for ordinal, score in scores.items():
+                best = 0
+                for weight, ordinals in lists:
+                    if weight > best:
+                        i = bisect.bisect_left(ordinals, ordinal)
+                        if i < len(ordinals) and ordinals[i] == ordinal:
+                            best = weight
+                if best:
+                    narrowed[ordinal] = score + best
+            scores = narrowed
+            if not scores:
+                return []
+        ranked = heapq.nsmallest(limit, scores, key=lambda ordinal: (-scores[ordinal], ordinal))
+        return [ids[ordinal] for ordinal in ranked]
+
+    def name_matches(self, terms, limit):
+        # Products with every word in their name have the top score, so if
+        # there are at least limit of them, the first limit in catalog order
+        # are the answer and nothing else needs scoring.
+        names = [[ordinals for weight, ordinals in lists if weight == NAME_WEIGHT] for lists in terms]
+        if not all(names):
+            return []
+        names.sort(key=lambda lists: sum(len(ordinals) for ordinals in lists))
+        found = []
+        last = -1
+        for ordinal in heapq.merge(*names[0]):
+            if ordinal == last or self.ids[ordinal] is None:
+                continue
+            last = ordinal
+            for lists in names[1:]:
+                for ordinals in lists:
+                    i = bisect.bisect_left(ordinals, ordinal)
+                    if i < len(ordinals) and ordinals[i] == ordinal:
+                        break
+                else:
+                    break
+            else:
+                found.append(self.ids[ordinal])
+                if len(found) == limit:
+                    break
+        return found
+
+    def first(self, lists, limit):
+        # A single word needs no scoring: name matches in catalog order, then
+        # description-only matches, stopping as soon as limit are found.
+        found = []
+        seen = set()
+        for weight in (NAME_WEIGHT, DESCRIPTION_WEIGHT):
+            for ordinal in heapq.merge(*[ordinals for w, ordinals in lists if w == weight]):
+                if ordinal not in seen and self.ids[ordinal] is not None:
+                    seen.add(ordinal)
+                    found.append(self.ids[ordinal])
+                    if len(found) == limit:
+                        return found
+        return found
@@ -0,0 +1,393 @@
+import re
+
+from .catalog import ProductCache
+from .errors import (AuthenticationError, ConflictError, EmptyCartError, InvalidQuantityError, InvalidUserDetailsError,
+                     OrderPendingError, OutOfStockError, UnknownProductError, UserExistsError)
+from .history_index import OrderHistoryIndex
+from .inventory import InventoryService
+from .models import Customer, Order, Product, ShoppingCart
+from .persistence import PersistenceWorker
+from .reservations import ReservationBook
+from .search import ProductSearchIndex
+from .sorted_index import ProductIndexes, product_page
+from .storage import open_storage
+
+# Usernames end up in users.txt lines and in file names (<username>_cart.txt),
+# so they may not hold separators, line breaks, path separators or "..".
+USERNAME = re.compile(r'[A-Za-z0-9_.-]+')
+# The other user fields are stored between ';' separators on one line.
+FIELD_FORBIDDEN = re.compile(r'[;\r\n]')
+
+
+class Shop:
+    """
+    The shop without a user interface: catalog, logged-in customers with
+    their carts and histories, stock and persistence.
+
+    Operations return results and raise shopcore.errors.ShopError subclasses
+    for anything the shopper has to be told about; nothing here prints or
+    shows dialogs, so a Shop can be driven from a GUI, a server or a batch
+    job alike. ShoppingCartApp in main.py is a Tk front end on top of it.
+
+    Saves, and the stock commit of every checkout, go through a
+    PersistenceWorker, so only register, login and logout ever wait for the
+    disk. With a scheduler (anything with Tk's after(ms, fn), e.g. the Tk
+    root) its completion callbacks, including place_order()'s, run on the
+    scheduler's thread; without one they run on the worker thread.
+    """
+
+    # Cart lines hold their stock this long after they were last added to.
+    RESERVATION_TTL = 15 * 60
+    # A checkout that keeps losing its products to other processes' checkouts
+    # gives up with ConflictError after this many tries.
+    CHECKOUT_ATTEMPTS = 5
+
+    def __init__(self, storage=None, mapped_catalog=False, scheduler=None, on_save_error=None):
+        self.storage = storage or open_storage()
+        # With mapped_catalog, products.txt is memory-mapped and a Product is
+        # only built when it is looked up (see catalog.ProductCache). Backends
+        # without a products.txt load their catalog as usual.
+        self.mapped_catalog = mapped_catalog
+        # user_index looks stored user records up on demand; Customer objects
+        # (with their cart and history) only exist in users while logged in.
+        self.user_index = {}
+        self.users = {}
+        # How many of each logged-in user's orders are already in storage.
+        self.saved_history = {}
+        # Each logged-in user's orders by date and by product, and (built on
+        # first use, see store_history()) the same for every stored order.
+        self.history_indexes = {}
+        self.store_orders = None
+        self.products = {}
+        # Stock sitting in logged-in users' carts. Product.quantity is what is
+        # left for everyone else; storage only ever sees committed sales.
+        # All stock changes go through self.inventory's per-product locks, so
+        # sessions on other threads can share the catalog without overselling.
+        self.inventory = InventoryService()
+        self.reservations = ReservationBook(self.RESERVATION_TTL, on_change=self.stock_changed,
+                                            inventory=self.inventory)
+        # Word index over product names and descriptions; see product_search().
+        self.search_index = None
+        # Price and stock orderings for product_page(); see catalog_indexes().
+        self.product_indexes = None
+        self.load_products()
+        self.load_users()
+        # All saves run on this worker; each save_* method snapshots what it
+        # writes on the calling thread before handing it over.
+        self.persistence = PersistenceWorker(scheduler, on_error=on_save_error)
+        # Users whose checkout is still being committed; their carts stay as
+        # they are until it is done.
+        self.pending_orders = set()
+        self.closed = False
+
+    def load_products(self):
+        if self.mapped_catalog:
+            try:
+                mapped, deltas = self.storage.open_catalog()
+            except NotImplementedError:
+                self.mapped_catalog = False
+            else:
+                self.products = ProductCache(mapped, Product, deltas)
+                return
+        versions = self.storage.load_versions()
+        for product_id, name, price, description, quantity in self.storage.load_products():
+            self.products[product_id] = Product(product_id, name, price, description, quantity,
+                                                versions.get(product_id, 0))
+        self.search_index = ProductSearchIndex((product.product_id, product.name, product.description)
+                                               for product in self.products.values())
+        self.product_indexes = ProductIndexes(self.products.values())
+
+    def product(self, product_id):
+        """
+        Returns the Product with product_id. Raises UnknownProductError.
+        """
+        product = self.products.get(product_id)
+        if product is None:
+            raise UnknownProductError(product_id)
+        return product
+
+    def product_search(self):
+        # A mapped catalog is not read in full at startup, so its index is
+        # built on the first search instead.
+        if self.search_index is None:
+            self.search_index = ProductSearchIndex(row[:2] + row[3:4] for row in self.products.mapped.rows())
+        return self.search_index
+
+    def search(self, query, limit=20):
+        """
+        Returns up to limit Products matching query, best match first.
+        """
+        return [self.products[product_id] for product_id in self.product_search().search(query, limit)]
+
+    def catalog_indexes(self):
+        # Built on first use for a mapped catalog, like product_search().
+        if self.product_indexes is None:
+            self.product_indexes = ProductIndexes(self.products.values())
+        return self.product_indexes
+
+    def stock_changed(self, product):
+        if self.product_indexes is not None:
+            self.product_indexes.update(product)
+
+    def product_page(self, min_price=None, max_price=None, in_stock_only=False, order=None, offset=0, limit=None):
+        """
+        Returns one page of products matching the filters, sorted by order
+        (a ProductIndexes order, or None for catalog order).
+        """
+        indexes = self.catalog_indexes() if order is not None else None
+        return product_page(self.products, indexes, min_price, max_price, in_stock_only, order, offset, limit)
+
+    def load_users(self):
+        self.user_index = self.storage.load_users()
+
+    def expire_reservations(self):
+        """
+        Drops the cart lines whose holds ran out (their stock is already back)
+        and returns {username: [product names]} for the carts that changed.
+        """
+        expired = {}
+        for owner, product, quantity in self.reservations.sweep():
+            user = self.users.get(owner)
+            if user is not None and user.cart.drop_line(product):
+                expired.setdefault(owner, []).append(product.name)
+        for owner in expired:
+            self.save_cart(owner)
+        return expired
+
+    def register(self, username, password, first_name, last_name, address):
+        """
+        Stores a new user. Raises InvalidUserDetailsError or UserExistsError.
+        """
+        if not USERNAME.fullmatch(username) or '..' in username:
+            raise InvalidUserDetailsError('username')
+        for field, value in (('password', password), ('first_name', first_name), ('last_name', last_name),
+                             ('address', address)):
+            if FIELD_FORBIDDEN.search(value):
+                raise InvalidUserDetailsError(field)
+        if username in self.user_index:
+            raise UserExistsError(username)
+        # Registration writes straight through so user_index sees the new
+        # account at once; queued saves go first.
+        self.persistence.flush()
+        self.storage.add_user(username, password, first_name, last_name, address)
+
+    def login(self, username, password):
+        """
+        Returns the Customer for username with their cart and history loaded.
+        Raises AuthenticationError.
+        """
+        if username not in self.user_index or self.user_index[username][0] != password:
+            raise AuthenticationError()
+        if username in self.users:
+            return self.users[username]
+        # A save queued by this user's last logout must land before we read.
+        self.persistence.flush()
+        user = Customer(username, *self.user_index[username])
+        user.cart = ShoppingCart(self.reservations, username)
+        self.users[username] = user
+        self.load_cart(username)
+        self.load_history(username)
+        return user
+
+    def check_no_pending_order(self, user):
+        if user.username in self.pending_orders:
+            raise OrderPendingError()
+
+    def add_item(self, user, product_id, quantity=1):
+        """
+        Adds quantity of a product to user's cart and returns the cart line.
+        Raises UnknownProductError, InvalidQuantityError, OutOfStockError or
+        OrderPendingError.
+        """
+        self.check_no_pending_order(user)
+        line = user.add_to_cart(self.product(product_id), quantity)
+        self.save_cart(user.username)
+        return line
+
+    def remove_item(self, user, product_id, quantity=1):
+        """
+        Takes up to quantity of a product out of user's cart and returns how
+        many were removed. Raises UnknownProductError, InvalidQuantityError,
+        EmptyCartError, NotInCartError or OrderPendingError.
+        """
+        self.check_no_pending_order(user)
+        product = self.product(product_id)
+        if quantity <= 0:
+            raise InvalidQuantityError(quantity)
+        removed = user.remove_from_cart(product, quantity)
+        self.save_cart(user.username)
+        return removed
+
+    def place_order(self, user, on_done, on_error):
+        """
+        Checks out user's cart. Its stock is taken off the stored stock on
+        the persistence worker, so this returns at once; on_done(order)
+        follows once the sale is stored, or on_error(error) with
+        OutOfStockError or ConflictError (see commit_order()), or whatever
+        storage raised. Raises EmptyCartError or OrderPendingError.
+        """
+        self.check_no_pending_order(user)
+        self.expire_reservations()
+        if not user.cart.items:
+            raise EmptyCartError()
+        # The holds must outlast the commit, or a sweep could put the stock
+        # back on the shelf while it is being sold.
+        self.reservations.renew(user.username)
+        self.pending_orders.add(user.username)
+        self.commit_order(user, on_done, on_error, self.CHECKOUT_ATTEMPTS)
+
+    def commit_order(self, user, on_done, on_error, attempts):
+        # Takes the cart's lines off the stored stock in one atomic step,
+        # checked against the product versions this shop last saw. If
+        # another process sold any of them since, their stock is read again
+        # and the commit retried; OutOfStockError when the stock is no
+        # longer there, ConflictError when it keeps changing.
+        lines = [(product, line.quantity, product.version) for product, line in user.cart.items.items()]
+
+        def committed(stock):
+            if stock is None:
+                for product, _, version in lines:
+                    product.version = version + 1
+                self.finish_order(user, on_done)
+                return
+            self.adopt_stock(stock)
+            for product, quantity, _ in lines:
+                # Our own hold on the line counts as stock still there.
+                stored = product.quantity + self.reservations.held(product.product_id)
+                if stored < quantity:
+                    failed(OutOfStockError(product, stored))
+                    return
+            if attempts > 1:
+                self.commit_order(user, on_done, on_error, attempts - 1)
+            else:
+                failed(ConflictError([product.product_id for product, _, _ in lines]))
+
+        def failed(error):
+            self.pending_orders.discard(user.username)
+            on_error(error)
+
+        self.persistence.submit(None, self.write_stock,
+                                [(product.product_id, quantity, version) for product, quantity, version in lines],
+                                on_done=committed, on_error=failed)
+
+    def write_stock(self, lines):
+        # Runs on the persistence worker. Returns None once lines are taken
+        # off the stored stock, or the stored stock of the products that
+        # moved on.
+        try:
+            self.storage.commit_stock(lines)
+        except ConflictError as e:
+            return self.storage.load_stock(e.product_ids)
+        return None
+
+    def finish_order(self, user, on_done):
+        # The stock is sold in storage: now the held stock becomes a sale here.
+        self.pending_orders.discard(user.username)
+        order = user.cart.checkout()
+        user.history.append(order)
+        self.index_order(user.username, order)
+        self.save_history(user.username)
+        self.save_cart(user.username)
+        on_done(order)
+
+    def adopt_stock(self, stock):
+        # Adopts the stored {product_id: (quantity, version)}; what this
+        # shop's carts hold stays off the shelf.
+        products = [self.products[product_id] for product_id in stock if product_id in self.products]
+        with self.inventory.locked(products):
+            for product in products:
+                quantity, product.version = stock[product.product_id]
+                product.quantity = quantity - self.reservations.held(product.product_id)
+        for product in products:
+            self.stock_changed(product)
+
+    def orders(self, user, start=None, end=None, product_id=None):
+        """
+        Returns user's orders dated start <= date < end (either may be None),
+        only those containing product_id if given, oldest first.
+        """
+        index = self.history_indexes[user.username]
+        if product_id:
+            return index.containing(product_id, start, end)
+        return index.between(start, end)
+
+    def load_history(self, username):
+        index = self.history_indexes[username] = OrderHistoryIndex()
+        for date, lines, total in self.storage.load_history(username):
+            order = Order(lines, total, date)
+            self.users[username].history.append(order)
+            index.add(date, order.product_ids(), order)
+        self.saved_history[username] = len(self.users[username].history)
+
+    def index_order(self, username, order):
+        product_ids = order.product_ids()
+        self.history_indexes[username].add(order.date, product_ids, order)
+        if self.store_orders is not None:
+            self.store_orders.add(order.date, product_ids, (username, order.date, product_ids, order.total))
+
+    def store_history(self):
+        """
+        Returns an OrderHistoryIndex over every stored order in the shop, as
+        (username, date, product_ids, total) records.
+        """
+        if self.store_orders is None:
+            self.persistence.flush()  # orders still queued must be counted
+            self.store_orders = OrderHistoryIndex()
+            for username, (date, lines, total) in self.storage.load_all_history():
+                product_ids = [line[0] for line in lines]
+                self.store_orders.add(date, product_ids, (username, date, product_ids, total))
+        return self.store_orders
+
+    def save_history(self, username):
+        history = self.users[username].history
+        saved = self.saved_history.get(username, 0)
+        if saved == len(history):
+            return
+        self.persistence.submit(None, self.storage.append_history, username,
+                                [(order.date, order.lines, order.total) for order in history[saved:]])
+        self.saved_history[username] = len(history)
+
+    def load_cart(self, username):
+        cart = self.users[username].cart
+        for product_id, quantity in self.storage.load_cart(username):
+            if product_id in self.products:
+                # Saved lines hold nothing while the user is away, so each one
+                # is reserved again, shrunk to whatever stock is left.
+                product = self.products[product_id]
+                quantity = min(quantity, product.quantity)
+                if quantity > 0 and self.reservations.reserve(username, product, quantity):
+                    cart.restore_line(product, quantity)
+
+    def save_cart(self, username):
+        self.persistence.submit(('cart', username), self.storage.save_cart, username,
+                                [(product.product_id, details['quantity'])
+                                 for product, details in self.users[username].cart.items.items()])
+
+    def logout(self, user):
+        """
+        Saves and drops user's session. Raises OrderPendingError.
+        """
+        self.check_no_pending_order(user)
+        self.save_history(user.username)
+        self.save_cart(user.username)
+        self.persistence.flush()
+        self.reservations.release_all(user.username)
+        self.users.pop(user.username, None)
+        self.saved_history.pop(user.username, None)
+        self.history_indexes.pop(user.username, None)
+
+    def shutdown(self):
+        # Nothing a logged-in user did may be lost.
+        if self.closed:
+            return
+        self.closed = True
+        # Checkouts still on the worker finish first, so their orders are
+        # saved below; a retry queues another round.
+        while self.pending_orders:
+            self.persistence.flush()
+            self.persistence.deliver()
+        for username in list(self.users):
+            self.save_history(username)
+            self.save_cart(username)
+        self.persistence.close()
+        self.storage.close()
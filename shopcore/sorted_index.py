@@ -0,0 +1,173 @@
+import bisect
+import itertools
+from operator import itemgetter
+
+_value = itemgetter(0)
+
+
+def price_of(product):
+    return product.price
+
+
+def quantity_of(product):
+    return product.quantity
+
+
+def in_stock(product):
+    return product.quantity > 0
+
+
+class SortedIndex:
+    """
+    Product ids kept in order of key(product), as one sorted list of
+    (value, product_id) pairs. Range and page lookups bisect to the first
+    entry and slice, so they cost O(log n + k) however large the catalog is.
+
+    With include, only products for which include(product) is true are
+    kept. Call update() whenever a product's value may have changed.
+    """
+
+    def __init__(self, key, products=(), include=None):
+        self.key = key
+        self.include = include
+        self.entries = sorted((key(product), product.product_id) for product in products
+                              if include is None or include(product))
+        self.values = {product_id: value for value, product_id in self.entries}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self, product):
+        product_id = product.product_id
+        value = self.key(product) if self.include is None or self.include(product) else None
+        old = self.values.get(product_id)
+        if old == value:
+            return
+        if old is not None:
+            del self.entries[bisect.bisect_left(self.entries, (old, product_id))]
+            del self.values[product_id]
+        if value is not None:
+            bisect.insort(self.entries, (value, product_id))
+            self.values[product_id] = value
+
+    add = update
+
+    def remove(self, product_id):
+        old = self.values.pop(product_id, None)
+        if old is not None:
+            del self.entries[bisect.bisect_left(self.entries, (old, product_id))]
+
+    def span(self, low=None, high=None):
+        """
+        Returns (start, end) positions of the entries with low <= value <= high.
+        """
+        start = 0 if low is None else bisect.bisect_left(self.entries, low, key=_value)
+        end = len(self.entries) if high is None else bisect.bisect_right(self.entries, high, key=_value)
+        return start, max(start, end)
+
+    def count(self, low=None, high=None):
+        start, end = self.span(low, high)
+        return end - start
+
+    def page(self, low=None, high=None, offset=0, limit=None, descending=False):
+        """
+        Returns the ids of the products with low <= value <= high, skipping
+        offset of them and returning at most limit, in ascending order of value
+        (or descending).
+        """
+        start, end = self.span(low, high)
+        if descending:
+            stop = end - offset
+            first = start if limit is None else max(start, stop - limit)
+            return [product_id for _, product_id in reversed(self.entries[first:max(first, stop)])]
+        first = start + offset
+        stop = end if limit is None else min(end, first + limit)
+        return [product_id for _, product_id in self.entries[first:stop]]
+
+    def iterate(self, low=None, high=None, descending=False):
+        start, end = self.span(low, high)
+        positions = range(end - 1, start - 1, -1) if descending else range(start, end)
+        entries = self.entries
+        return (entries[i] for i in positions)
+
+
+class ProductIndexes:
+    """
+    Price and stock orderings of a catalog for filtered, sorted, paged product
+    lists. Keep them current by calling update(product) after a product's
+    price or quantity changed.
+    """
+
+    # query() orders
+    PRICE = 'price'
+    PRICE_DESC = 'price_desc'
+    QUANTITY_DESC = 'quantity_desc'
+
+    def __init__(self, products):
+        products = list(products)
+        self.by_price = SortedIndex(price_of, products)
+        self.in_stock_by_price = SortedIndex(price_of, products, include=in_stock)
+        self.by_quantity = SortedIndex(quantity_of, products)
+
+    def update(self, product):
+        self.by_price.update(product)
+        self.in_stock_by_price.update(product)
+        self.by_quantity.update(product)
+
+    def remove(self, product_id):
+        self.by_price.remove(product_id)
+        self.in_stock_by_price.remove(product_id)
+        self.by_quantity.remove(product_id)
+
+    def query(self, min_price=None, max_price=None, in_stock_only=False, order=PRICE, offset=0, limit=50):
+        """
+        Returns the ids of one page of products priced between min_price and
+        max_price (either may be None), optionally only those in stock,
+        sorted by price (order PRICE or PRICE_DESC) or by quantity, most first
+        (QUANTITY_DESC).
+        """
+        if order == self.QUANTITY_DESC:
+            low = 1 if in_stock_only else None
+            if min_price is None and max_price is None:
+                return self.by_quantity.page(low, offset=offset, limit=limit, descending=True)
+            # Stock order with a price filter walks the quantity index and
+            # skips the products outside the price range.
+            prices = self.by_price.values
+            ids = []
+            for _, product_id in self.by_quantity.iterate(low, descending=True):
+                price = prices[product_id]
+                if (min_price is None or price >= min_price) and (max_price is None or price <= max_price):
+                    if offset:
+                        offset -= 1
+                    else:
+                        ids.append(product_id)
+                        if len(ids) == limit:
+                            break
+            return ids
+        index = self.in_stock_by_price if in_stock_only else self.by_price
+        return index.page(min_price, max_price, offset, limit, descending=order == self.PRICE_DESC)
+
+    def count(self, min_price=None, max_price=None, in_stock_only=False):
+        index = self.in_stock_by_price if in_stock_only else self.by_price
+        return index.count(min_price, max_price)
+
+
+def product_page(products, indexes, min_price=None, max_price=None, in_stock_only=False, order=None, offset=0,
+                 limit=None):
+    """
+    Returns one page of the Products in products (product_id -> Product)
+    matching the filters, sorted by order: a ProductIndexes order answered
+    from indexes, or None for catalog order, where indexes is not used.
+    """
+    if order is not None:
+        ids = indexes.query(min_price, max_price, in_stock_only, order, offset, limit)
+        return [products[product_id] for product_id in ids]
+    # Catalog order has no index; filters are applied while walking it.
+    if min_price is None and max_price is None and not in_stock_only:
+        matching = iter(products.values())  # unfiltered pages skip ahead at C speed
+    else:
+        matching = (product for product in products.values()
+                    if (min_price is None or product.price >= min_price)
+                    and (max_price is None or product.price <= max_price)
+                    and (not in_stock_only or product.quantity > 0))
+    return list(itertools.islice(matching, offset, None if limit is None else offset + limit))
@@ -0,0 +1,667 @@
+import datetime
+import os
+import sqlite3
+import sys
+import threading
+import zlib
+from collections.abc import Mapping
+
+from . import catalog, durable, history_format
+from .errors import ConflictError, UserExistsError
+from .user_index import UserIndex
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Sales are appended here and folded back into products.txt every
+# JOURNAL_COMPACT_EVERY entries, so a checkout costs one small append.
+JOURNAL_FILE = 'products_journal.txt'
+JOURNAL_COMPACT_EVERY = 500
+# Written to the journal just before a snapshot, with the snapshot's CRC-32;
+# see TextFileStorage.write_snapshot().
+SNAPSHOT_MARKER = '#snapshot'
+
+
+def file_stamp(path):
+    # (inode, size, mtime) of path, or None if it does not exist.
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+# Every backend speaks in plain records so ShoppingCartApp decides how to
+# build Products, Customers and Orders:
+#   product  -> (product_id, name, price, description, quantity)
+#   user     -> username: (password, first_name, last_name, address), served
+#               by load_users() as a mapping that looks users up on demand
+#   cart     -> [(product_id, quantity), ...]
+#   order    -> (date, [(product_id, quantity, unit_cents), ...], total),
+#               unit_cents being the price paid in cents, or None for orders
+#               stored before prices were recorded
+class Storage:
+    def load_products(self):
+        raise NotImplementedError
+
+    def open_catalog(self):
+        """
+        Returns (catalog.MappedCatalog, {product_id: pending stock delta}) for
+        backends that keep the catalog in products.txt; the others raise
+        NotImplementedError.
+        """
+        raise NotImplementedError
+
+    def save_products(self, products):
+        raise NotImplementedError
+
+    def commit_stock(self, lines):
+        """
+        Takes a checkout's [(product_id, quantity, version), ...] off the
+        stored stock in one step, provided every product is still at the
+        given version, and moves each of them to version + 1. Otherwise
+        nothing changes and ConflictError names the products that moved on
+        or no longer have the quantity in stock.
+        """
+        raise NotImplementedError
+
+    def load_stock(self, product_ids):
+        """
+        Returns {product_id: (quantity, version)} as stored now.
+        """
+        raise NotImplementedError
+
+    def load_versions(self):
+        """
+        Returns {product_id: version}; products left out are at version 0.
+        """
+        raise NotImplementedError
+
+    def load_users(self):
+        raise NotImplementedError
+
+    def save_users(self, users):
+        raise NotImplementedError
+
+    def add_user(self, username, password, first_name, last_name, address):
+        """
+        Stores a new user. Raises UserExistsError if the name is taken.
+        """
+        raise NotImplementedError
+
+    def load_cart(self, username):
+        raise NotImplementedError
+
+    def save_cart(self, username, lines):
+        raise NotImplementedError
+
+    def load_history(self, username):
+        raise NotImplementedError
+
+    def save_history(self, username, orders):
+        raise NotImplementedError
+
+    def append_history(self, username, orders):
+        """
+        Persists orders placed since the history was last loaded or saved,
+        leaving the ones already on disk untouched.
+        """
+        raise NotImplementedError
+
+    def load_all_history(self):
+        """
+        Yields (username, order) for every stored order of every user.
+        """
+        for username in self.load_users():
+            for order in self.load_history(username):
+                yield username, order
+
+    def close(self):
+        pass
+
+
+# TEXT FILE STORAGE
+class TextFileStorage(Storage):
+    def __init__(self, directory='.', binary_history=False):
+        self.directory = directory
+        # With binary_history, orders live in {username}_history.bin (see
+        # history_format.py); a user's .txt history is converted on first load.
+        self.binary_history = binary_history
+        self.journal_entries = 0
+        self.user_index = None
+        # Stock versions as last read from the journal; see replay_journal().
+        # Stock is read and committed under durable.file_lock() on
+        # products.txt, the lock the CLI scripts take, so processes sharing
+        # the files cannot sell the same units; stock_lock orders this
+        # process's threads.
+        self.versions = {}
+        self.stock_lock = threading.Lock()
+        # (file_stamp, CatalogTable) of products.txt, and how far the journal
+        # has been read; see snapshot() and replay_journal().
+        self.snapshot_cache = None
+        self.journal_cache = None
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write_file(self, name, data):
+        # Whole-file saves go through a temp file + fsync + rename.
+        durable.atomic_write(self.path(name), data)
+
+    def append_file(self, name, data):
+        durable.durable_append(self.path(name), data)
+
+    def load_products(self):
+        with self.stock_lock, durable.file_lock(self.path('products.txt')):
+            return self.stored_products()
+
+    def stored_products(self):
+        # products.txt with the journal applied; the caller holds the locks.
+        table = self.snapshot()
+        if table is None:
+            print("Products file not found.")
+            return []
+        deltas = self.replay_journal()
+        return [(product_id, name, price, description, quantity + deltas.get(product_id, 0))
+                for product_id, name, price, description, quantity in table.rows()]
+
+    def snapshot(self):
+        # The parsed products.txt, read again only when the file changed; the
+        # caller holds the locks. None if there is no products.txt.
+        stamp = file_stamp(self.path('products.txt'))
+        if self.snapshot_cache is None or self.snapshot_cache[0] != stamp:
+            try:
+                table = catalog.load_catalog(self.path('products.txt'))
+            except FileNotFoundError:
+                table = None
+            self.snapshot_cache = (stamp, table)
+        return self.snapshot_cache[1]
+
+    def open_catalog(self):
+        with self.stock_lock, durable.file_lock(self.path('products.txt')):
+            return catalog.MappedCatalog(self.path('products.txt')), self.replay_journal()
+
+    def replay_journal(self):
+        # Returns the net stock change per product recorded since the last
+        # snapshot, and reads the stored versions into self.versions. Only
+        # what was appended since the last call is read, unless the journal
+        # or products.txt was replaced in between.
+        stamps = (file_stamp(self.path(JOURNAL_FILE)), file_stamp(self.path('products.txt')))
+        journal = self.journal_cache
+        if (journal is None or stamps[0] is None or journal['stamps'][0] is None
+                or journal['stamps'][0][0] != stamps[0][0] or journal['stamps'][1] != stamps[1]
+                or stamps[0][1] < journal['offset']):
+            journal = self.journal_cache = {'offset': 0, 'changes': [], 'markers': [], 'versions': {}}
+        journal['stamps'] = stamps
+        try:
+            with open(self.path(JOURNAL_FILE), 'rb') as f:
+                f.seek(journal['offset'])
+                data = f.read()
+        except FileNotFoundError:
+            data = b''
+        # A line still being written is read again next time.
+        data = data[:data.rfind(b'\n') + 1]
+        journal['offset'] += len(data)
+        changes, markers, versions = journal['changes'], journal['markers'], journal['versions']
+        for line in data.decode().split('\n'):
+            line = line.strip()
+            if line:
+                try:
+                    product_id, value_str, *rest = line.split(';')
+                    if product_id == SNAPSHOT_MARKER:
+                        markers.append((len(changes), int(value_str)))
+                        continue
+                    # Sales carry the version they moved the product to.
+                    _, *version = rest
+                    if version:
+                        versions[product_id] = max(versions.get(product_id, 0), int(version[0]))
+                    if int(value_str):
+                        changes.append((product_id, int(value_str)))
+                except ValueError as e:
+                    print(f"Error parsing journal line: {line}\n{e}")
+        self.versions = dict(versions)
+        self.journal_entries = len(changes)
+        if markers:
+            # A compaction was cut short. If its snapshot made it to disk, the
+            # changes above its marker are already in products.txt.
+            snapshot_crc = self.products_crc()
+            for position, crc in reversed(markers):
+                if crc == snapshot_crc:
+                    changes = changes[position:]
+                    break
+        deltas = {}
+        for product_id, delta in changes:
+            deltas[product_id] = deltas.get(product_id, 0) + delta
+        return deltas
+
+    def products_crc(self):
+        try:
+            with open(self.path('products.txt'), 'r') as f:
+                return zlib.crc32(f.read().encode())
+        except FileNotFoundError:
+            return None
+
+    def save_products(self, products):
+        with self.stock_lock, durable.file_lock(self.path('products.txt')):
+            self.replay_journal()
+            self.write_snapshot(products)
+
+    def write_snapshot(self, products):
+        # The caller holds the locks and has replayed the journal.
+        data = ''.join([f"{product_id};{name};{price};{description};{quantity}\n"
+                        for product_id, name, price, description, quantity in products])
+        # The snapshot and the emptied journal are two writes. The marker
+        # goes first, so a crash between them cannot make replay_journal()
+        # apply the journal on top of a snapshot that already holds it.
+        now = datetime.datetime.now().strftime(DATE_FORMAT)
+        self.append_file(JOURNAL_FILE, f"{SNAPSHOT_MARKER};{zlib.crc32(data.encode())};{now}\n")
+        self.write_file('products.txt', data)
+        # products.txt has no room for versions, so they stay in the journal
+        # as entries that change nothing.
+        self.write_file(JOURNAL_FILE, ''.join([f"{product_id};0;{now};{version}\n"
+                                               for product_id, version in self.versions.items()]))
+        self.journal_entries = 0
+
+    def commit_stock(self, lines):
+        # Every process sharing the text files commits under the products.txt
+        # lock, against the stock and versions it reads back from disk.
+        with self.stock_lock, durable.file_lock(self.path('products.txt')):
+            table = self.snapshot()
+            deltas = self.replay_journal()
+            index = table.index if table is not None else {}
+            stale = [product_id for product_id, quantity, version in lines
+                     if self.versions.get(product_id, 0) != version or product_id not in index
+                     or table.quantities[index[product_id]] + deltas.get(product_id, 0) < quantity]
+            if stale:
+                raise ConflictError(stale)
+            # The whole order is one journal append, so one flush.
+            now = datetime.datetime.now().strftime(DATE_FORMAT)
+            self.append_file(JOURNAL_FILE, ''.join([f"{product_id};{-quantity};{now};{version + 1}\n"
+                                                    for product_id, quantity, version in lines]))
+            self.journal_entries += len(lines)
+            for product_id, _, version in lines:
+                self.versions[product_id] = version + 1
+            if self.journal_entries >= JOURNAL_COMPACT_EVERY:
+                self.write_snapshot(self.stored_products())
+
+    def load_stock(self, product_ids):
+        wanted = set(product_ids)
+        with self.stock_lock, durable.file_lock(self.path('products.txt')):
+            return {row[0]: (row[4], self.versions.get(row[0], 0)) for row in self.stored_products() if row[0] in wanted}
+
+    def load_versions(self):
+        with self.stock_lock, durable.file_lock(self.path('products.txt')):
+            self.replay_journal()
+            return dict(self.versions)
+
+    def load_users(self):
+        if self.user_index is None:
+            if not os.path.exists(self.path('users.txt')):
+                print("Users file not found.")
+            self.user_index = UserIndex(self.path('users.txt'), ';', 5)
+        return self.user_index
+
+    def save_users(self, users):
+        self.write_file('users.txt', ''.join([f"{username};{password};{first_name};{last_name};{address}\n"
+                                              for username, (password, first_name, last_name, address) in users.items()]))
+
+    def add_user(self, username, password, first_name, last_name, address):
+        # Another process may have taken the name since the caller checked.
+        if not self.load_users().add(username, password, first_name, last_name, address):
+            raise UserExistsError(username)
+
+    def load_cart(self, username):
+        lines = []
+        try:
+            with open(self.path(f'{username}_cart.txt'), 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        try:
+                            product_id, quantity_str = line.split(';')
+                            lines.append((product_id, int(quantity_str)))
+                        except ValueError as e:
+                            print(f"Error parsing line: {line}\n{e}")
+        except FileNotFoundError:
+            print(f"Cart file for {username} not found.")
+        return lines
+
+    def save_cart(self, username, lines):
+        self.write_file(f'{username}_cart.txt', ''.join([f"{product_id};{quantity}\n" for product_id, quantity in lines]))
+
+    def load_history(self, username):
+        if self.binary_history:
+            binary_path = self.path(f'{username}_history.bin')
+            if not os.path.exists(binary_path):
+                if not os.path.exists(self.path(f'{username}_history.txt')):
+                    return []
+                self.convert_history(username)
+            return history_format.read_orders(binary_path)
+        return self.load_text_history(username)
+
+    def load_text_history(self, username):
+        orders = []
+        try:
+            with open(self.path(f'{username}_history.txt'), 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:  # Skip empty lines
+                        try:
+                            date_str, items_str, total_str = line.split(';')
+                            items = []
+                            for item_str in items_str.split(','):
+                                # product_id:quantity:unit_cents, or product_id:quantity
+                                # in histories written before prices were recorded
+                                fields = item_str.split(':')
+                                if len(fields) == 2:
+                                    fields.append(None)
+                                product_id, quantity_str, cents_str = fields
+                                items.append((product_id, int(quantity_str), None if cents_str is None else int(cents_str)))
+                            date = datetime.datetime.strptime(date_str, DATE_FORMAT)
+                            orders.append((date, items, float(total_str)))
+                        except ValueError as e:
+                            print(f"Error parsing line: {line}\n{e}")
+        except FileNotFoundError:
+            print(f"History file for {username} not found.")
+        return orders
+
+    def save_history(self, username, orders):
+        if self.binary_history:
+            self.write_file(f'{username}_history.bin', history_format.file_header() + history_format.encode_orders(orders))
+        else:
+            self.write_file(f'{username}_history.txt', self.format_history(orders))
+
+    def append_history(self, username, orders):
+        if self.binary_history:
+            binary_path = self.path(f'{username}_history.bin')
+            version = history_format.file_version(binary_path)
+            if version is None:
+                self.write_file(f'{username}_history.bin', history_format.file_header())
+            elif version != history_format.VERSION:
+                # Older lines are laid out differently, so upgrade the file first.
+                self.write_file(f'{username}_history.bin', history_format.file_header() +
+                                history_format.encode_orders(history_format.read_orders(binary_path)))
+            else:
+                # An append cut short by a crash leaves part of an order behind.
+                history_format.trim_partial_order(binary_path)
+            self.append_file(f'{username}_history.bin', history_format.encode_orders(orders))
+        else:
+            self.append_file(f'{username}_history.txt', self.format_history(orders))
+
+    def load_all_history(self):
+        # Only users who have ordered have a history file, so list those
+        # instead of trying every registered user.
+        suffixes = ('_history.txt', '_history.bin') if self.binary_history else ('_history.txt',)
+        usernames = set()
+        for name in os.listdir(self.directory):
+            for suffix in suffixes:
+                if name.endswith(suffix):
+                    usernames.add(name[:-len(suffix)])
+        for username in sorted(usernames):
+            for order in self.load_history(username):
+                yield username, order
+
+    def convert_history(self, username):
+        self.write_file(f'{username}_history.bin', history_format.file_header() +
+                        history_format.encode_orders(self.load_text_history(username)))
+
+    def format_history(self, orders):
+        lines = []
+        for date, items, total in orders:
+            items_str = ','.join([f"{product_id}:{quantity}" if unit_cents is None else f"{product_id}:{quantity}:{unit_cents}"
+                                  for product_id, quantity, unit_cents in items])
+            lines.append(f"{date.strftime(DATE_FORMAT)};{items_str};{total}\n")
+        return ''.join(lines)
+
+    def close(self):
+        if self.user_index is not None:
+            self.user_index.close()
+
+
+# SQLITE STORAGE
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    product_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    price REAL NOT NULL,
+    description TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    address TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cart_lines (
+    username TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (username, product_id)
+);
+CREATE TABLE IF NOT EXISTS orders (
+    order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    date TEXT NOT NULL,
+    total REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_by_user ON orders (username, order_id);
+CREATE TABLE IF NOT EXISTS order_lines (
+    order_id INTEGER NOT NULL,
+    product_id TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    unit_price_cents INTEGER
+);
+CREATE INDEX IF NOT EXISTS order_lines_by_order ON order_lines (order_id);
+"""
+
+# sqlite3 keeps a per-connection cache of compiled statements keyed by the
+# SQL text, so reusing these constants means each one is prepared once.
+SELECT_PRODUCTS = "SELECT product_id, name, price, description, quantity FROM products ORDER BY rowid"
+UPSERT_PRODUCT = ("INSERT INTO products (product_id, name, price, description, quantity) VALUES (?, ?, ?, ?, ?) "
+                  "ON CONFLICT (product_id) DO UPDATE SET name = excluded.name, price = excluded.price, "
+                  "description = excluded.description, quantity = excluded.quantity, "
+                  "version = products.version + (products.quantity != excluded.quantity)")
+# Matches no row, changing nothing, if the product has moved on or is short.
+COMMIT_STOCK = ("UPDATE products SET quantity = quantity - ?, version = version + 1 "
+                "WHERE product_id = ? AND version = ? AND quantity >= ?")
+SELECT_STOCK = "SELECT quantity, version FROM products WHERE product_id = ?"
+SELECT_VERSIONS = "SELECT product_id, version FROM products WHERE version != 0"
+SELECT_USER = "SELECT password, first_name, last_name, address FROM users WHERE username = ?"
+SELECT_USERNAMES = "SELECT username FROM users"
+COUNT_USERS = "SELECT COUNT(*) FROM users"
+UPSERT_USER = ("INSERT INTO users (username, password, first_name, last_name, address) VALUES (?, ?, ?, ?, ?) "
+               "ON CONFLICT (username) DO UPDATE SET password = excluded.password, first_name = excluded.first_name, "
+               "last_name = excluded.last_name, address = excluded.address")
+INSERT_USER = "INSERT INTO users (username, password, first_name, last_name, address) VALUES (?, ?, ?, ?, ?)"
+SELECT_CART = "SELECT product_id, quantity FROM cart_lines WHERE username = ? ORDER BY rowid"
+DELETE_CART = "DELETE FROM cart_lines WHERE username = ?"
+INSERT_CART_LINE = "INSERT INTO cart_lines (username, product_id, quantity) VALUES (?, ?, ?)"
+SELECT_ORDERS = "SELECT order_id, date, total FROM orders WHERE username = ? ORDER BY order_id"
+SELECT_ORDER_LINES = ("SELECT order_lines.order_id, product_id, quantity, unit_price_cents FROM order_lines "
+                      "JOIN orders ON orders.order_id = order_lines.order_id "
+                      "WHERE orders.username = ? ORDER BY order_lines.rowid")
+DELETE_ORDER_LINES = "DELETE FROM order_lines WHERE order_id IN (SELECT order_id FROM orders WHERE username = ?)"
+DELETE_ORDERS = "DELETE FROM orders WHERE username = ?"
+SELECT_ALL_ORDERS = "SELECT order_id, username, date, total FROM orders ORDER BY order_id"
+SELECT_ALL_ORDER_LINES = "SELECT order_id, product_id, quantity, unit_price_cents FROM order_lines ORDER BY rowid"
+INSERT_ORDER = "INSERT INTO orders (username, date, total) VALUES (?, ?, ?)"
+INSERT_ORDER_LINE = ("INSERT INTO order_lines (order_id, product_id, quantity, unit_price_cents) "
+                     "VALUES (?, ?, ?, ?)")
+SELECT_ORDER_LINE_COLUMNS = "SELECT name FROM pragma_table_info('order_lines')"
+ADD_UNIT_PRICE_COLUMN = "ALTER TABLE order_lines ADD COLUMN unit_price_cents INTEGER"
+SELECT_PRODUCT_COLUMNS = "SELECT name FROM pragma_table_info('products')"
+ADD_VERSION_COLUMN = "ALTER TABLE products ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+
+
+class SQLiteUsers(Mapping):
+    # The users table's primary key is the index; nothing is cached here.
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getitem__(self, username):
+        row = self.conn.execute(SELECT_USER, (username,)).fetchone()
+        if row is None:
+            raise KeyError(username)
+        return tuple(row)
+
+    def __contains__(self, username):
+        return self.conn.execute(SELECT_USER, (username,)).fetchone() is not None
+
+    def __iter__(self):
+        return iter([row[0] for row in self.conn.execute(SELECT_USERNAMES)])
+
+    def __len__(self):
+        return self.conn.execute(COUNT_USERS).fetchone()[0]
+
+
+class SQLiteStorage(Storage):
+    def __init__(self, path='shop.db'):
+        self.path = path
+        # ShoppingCartApp writes from its persistence thread and reads on the
+        # Tk thread, never both at once.
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # WAL lets readers in other processes carry on while one writer commits.
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        # Stores created before order lines recorded their price lack the column.
+        if 'unit_price_cents' not in {row[0] for row in self.conn.execute(SELECT_ORDER_LINE_COLUMNS)}:
+            with self.conn:
+                self.conn.execute(ADD_UNIT_PRICE_COLUMN)
+        # ... and stores created before stock was versioned lack this one.
+        if 'version' not in {row[0] for row in self.conn.execute(SELECT_PRODUCT_COLUMNS)}:
+            with self.conn:
+                self.conn.execute(ADD_VERSION_COLUMN)
+
+    def load_products(self):
+        return [tuple(row) for row in self.conn.execute(SELECT_PRODUCTS)]
+
+    def save_products(self, products):
+        with self.conn:
+            self.conn.executemany(UPSERT_PRODUCT, products)
+
+    def commit_stock(self, lines):
+        # One transaction: other processes' checkouts wait on its write lock
+        # (up to the connection timeout) and a conflict rolls all of it back.
+        stale = []
+        with self.conn:
+            for product_id, quantity, version in lines:
+                if self.conn.execute(COMMIT_STOCK, (quantity, product_id, version, quantity)).rowcount == 0:
+                    stale.append(product_id)
+            if stale:
+                raise ConflictError(stale)
+
+    def load_stock(self, product_ids):
+        stock = {}
+        for product_id in product_ids:
+            row = self.conn.execute(SELECT_STOCK, (product_id,)).fetchone()
+            if row is not None:
+                stock[product_id] = tuple(row)
+        return stock
+
+    def load_versions(self):
+        return dict(self.conn.execute(SELECT_VERSIONS).fetchall())
+
+    def load_users(self):
+        return SQLiteUsers(self.conn)
+
+    def save_users(self, users):
+        with self.conn:
+            self.conn.executemany(UPSERT_USER, [(username, *fields) for username, fields in users.items()])
+
+    def add_user(self, username, password, first_name, last_name, address):
+        try:
+            with self.conn:
+                self.conn.execute(INSERT_USER, (username, password, first_name, last_name, address))
+        except sqlite3.IntegrityError:
+            raise UserExistsError(username)
+
+    def load_cart(self, username):
+        return [tuple(row) for row in self.conn.execute(SELECT_CART, (username,))]
+
+    def save_cart(self, username, lines):
+        with self.conn:
+            self.conn.execute(DELETE_CART, (username,))
+            self.conn.executemany(INSERT_CART_LINE, [(username, product_id, quantity) for product_id, quantity in lines])
+
+    def load_history(self, username):
+        items = {}
+        for order_id, product_id, quantity, unit_cents in self.conn.execute(SELECT_ORDER_LINES, (username,)):
+            items.setdefault(order_id, []).append((product_id, quantity, unit_cents))
+        return [(datetime.datetime.strptime(date_str, DATE_FORMAT), items.get(order_id, []), total)
+                for order_id, date_str, total in self.conn.execute(SELECT_ORDERS, (username,))]
+
+    def load_all_history(self):
+        items = {}
+        for order_id, product_id, quantity, unit_cents in self.conn.execute(SELECT_ALL_ORDER_LINES):
+            items.setdefault(order_id, []).append((product_id, quantity, unit_cents))
+        return [(username, (datetime.datetime.strptime(date_str, DATE_FORMAT), items.get(order_id, []), total))
+                for order_id, username, date_str, total in self.conn.execute(SELECT_ALL_ORDERS)]
+
+    def save_history(self, username, orders):
+        with self.conn:
+            self.conn.execute(DELETE_ORDER_LINES, (username,))
+            self.conn.execute(DELETE_ORDERS, (username,))
+            for date, items, total in orders:
+                self.insert_order(username, date, items, total)
+
+    def append_history(self, username, orders):
+        with self.conn:
+            for date, items, total in orders:
+                self.insert_order(username, date, items, total)
+
+    def insert_order(self, username, date, items, total):
+        order_id = self.conn.execute(INSERT_ORDER, (username, date.strftime(DATE_FORMAT), total)).lastrowid
+        self.conn.executemany(INSERT_ORDER_LINE, [(order_id, product_id, quantity, unit_cents)
+                                                  for product_id, quantity, unit_cents in items])
+
+    def close(self):
+        self.conn.close()
+
+
+def open_storage(spec='text'):
+    """
+    Returns the storage backend named by spec: 'text' for the classic
+    semicolon files in the working directory, 'binary' for the same files
+    with binary order histories, or a path ending in .db for a SQLite store.
+    """
+    if spec.endswith('.db'):
+        return SQLiteStorage(spec)
+    if spec == 'text':
+        return TextFileStorage()
+    if spec == 'binary':
+        return TextFileStorage(binary_history=True)
+    raise ValueError(f"Unknown storage backend: {spec}")
+
+
+def copy_storage(source, target):
+    """
+    Copies the catalog, users, carts and histories from one backend to
+    another, e.g. to migrate the text files into a SQLite store.
+    """
+    target.save_products(source.load_products())
+    users = source.load_users()
+    target.save_users(users)
+    for username in users:
+        target.save_cart(username, source.load_cart(username))
+        target.save_history(username, source.load_history(username))
+
+
+if __name__ == "__main__":
+    # python -m shopcore.storage migrate TARGET [SOURCE] copies everything in
+    # the SOURCE store ('text' by default) into TARGET, e.g. shop.db.
+    # python -m shopcore.storage USERNAME... converts those histories to the binary format.
+    if sys.argv[1:2] == ['migrate'] and len(sys.argv) in (3, 4):
+        source = open_storage(sys.argv[3] if len(sys.argv) == 4 else 'text')
+        target = open_storage(sys.argv[2])
+        copy_storage(source, target)
+        target.close()
+        source.close()
+        print(f"Migrated the store into {sys.argv[2]}.")
+    else:
+        storage = TextFileStorage(binary_history=True)
+        for username in sys.argv[1:]:
+            storage.convert_history(username)
+            print(f"Converted history for {username}.")
@@ -0,0 +1,155 @@
+import os
+import sqlite3
+import zlib
+from collections.abc import Mapping
+
+from . import durable
+
+# Each script keeps users.txt in its own layout, so each layout gets its own
+# index file next to it (users.txt.semicolon.idx, users.txt.colon.idx, ...).
+SEPARATOR_NAMES = {';': 'semicolon', ':': 'colon', ',': 'comma'}
+
+# The first and last this many bytes of the indexed part of the file are
+# checksummed, to tell an append from an in-place rewrite that grew the file.
+FINGERPRINT_BLOCK = 4096
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, fields TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS source (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+class UserIndex(Mapping):
+    """
+    Read-only mapping of username -> fields over a users file, answered from
+    a SQLite index on disk instead of a dict built from the whole file.
+
+    Lines look like username<sep>field<sep>...; `width` is the number of
+    fields including the username. Values are the fields after the username
+    as a tuple, or the single field itself when width is 2 (username:password).
+
+    The index remembers the inode, size and mtime of the users file it was
+    built from, and a checksum of the start and end of what it indexed.
+    Lines appended since (by add() or by any other program) are indexed
+    from the old end of the file; a file that was rewritten, even in place
+    with open('w') as the older scripts do, is indexed again from scratch.
+    """
+
+    def __init__(self, path, separator, width):
+        self.path = path
+        self.separator = separator
+        self.width = width
+        index_path = f"{path}.{SEPARATOR_NAMES.get(separator, 'users')}.idx"
+        self.conn = sqlite3.connect(index_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.sync()
+
+    def stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return {'inode': 0, 'size': 0, 'mtime': 0}
+        return {'inode': st.st_ino, 'size': st.st_size, 'mtime': st.st_mtime_ns}
+
+    def sync(self):
+        """
+        Brings the index up to date with the users file: one stat() when
+        nothing changed, a read of just the new tail after appends.
+        """
+        current = self.stamp()
+        indexed = dict(self.conn.execute("SELECT key, value FROM source"))
+        offset = indexed.pop('offset', 0)
+        fingerprint = indexed.pop('fingerprint', None)
+        if indexed == current:
+            return
+        rewritten = (indexed.get('inode') != current['inode'] or current['size'] < indexed.get('size', 0)
+                     or (current['size'] == indexed.get('size') and current['mtime'] != indexed.get('mtime'))
+                     or self.fingerprint(offset) != fingerprint)
+        with self.conn:
+            if rewritten:
+                self.conn.execute("DELETE FROM users")
+                offset = 0
+            offset = self.index_from(offset)
+            current['offset'] = offset
+            current['fingerprint'] = self.fingerprint(offset)
+            self.conn.executemany("INSERT OR REPLACE INTO source (key, value) VALUES (?, ?)", current.items())
+
+    def fingerprint(self, length):
+        # CRC-32 of the first and last FINGERPRINT_BLOCK bytes of the file's
+        # first length bytes: a rewrite that changes any line before the end
+        # moves the bytes after it, so it shows up in the last block.
+        try:
+            with open(self.path, 'rb') as f:
+                if length <= 2 * FINGERPRINT_BLOCK:
+                    data = f.read(length)
+                else:
+                    data = f.read(FINGERPRINT_BLOCK)
+                    f.seek(length - FINGERPRINT_BLOCK)
+                    data += f.read(FINGERPRINT_BLOCK)
+        except FileNotFoundError:
+            data = b''
+        return zlib.crc32(data)
+
+    def index_from(self, offset):
+        # Returns the offset just past the last complete line. A final line
+        # without a newline is indexed too but read again on the next sync,
+        # in case it was still being written.
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        end = data.rfind(b'\n') + 1
+        rows = []
+        for line in data.decode().split('\n'):
+            parts = line.strip().split(self.separator, 1)
+            if len(parts) == 2 and parts[1].count(self.separator) >= self.width - 2:
+                rows.append((parts[0], parts[1]))
+        self.conn.executemany("INSERT OR REPLACE INTO users (username, fields) VALUES (?, ?)", rows)
+        return offset + end
+
+    def unpack(self, fields):
+        if self.width == 2:
+            return fields
+        return tuple(fields.split(self.separator, self.width - 2))
+
+    def __getitem__(self, username):
+        self.sync()
+        row = self.conn.execute("SELECT fields FROM users WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            raise KeyError(username)
+        return self.unpack(row[0])
+
+    def __contains__(self, username):
+        self.sync()
+        return self.conn.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone() is not None
+
+    def __iter__(self):
+        self.sync()
+        return iter([row[0] for row in self.conn.execute("SELECT username FROM users")])
+
+    def __len__(self):
+        self.sync()
+        return self.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def add(self, username, *fields):
+        """
+        Appends a new user to the users file and the index.
+        Returns False, writing nothing, if the username is already taken.
+        """
+        # The lock keeps another process from appending the same name
+        # between the check and the append.
+        with durable.file_lock(self.path):
+            if username in self:
+                return False
+            line = self.separator.join((username, *fields)) + '\n'
+            if self.stamp()['size'] > dict(self.conn.execute("SELECT key, value FROM source"))['offset']:
+                line = '\n' + line  # the file does not end with a newline
+            durable.durable_append(self.path, line)
+            self.sync()
+        return True
+
+    def close(self):
+        self.conn.close()
@@ -3,6 +3,8 @@ import datetime
 import tkinter as tk
 from tkinter import messagebox, ttk
 
+from shopcore.catalog import load_catalog
+
 # PRODUCT CLASS
 class Product:
     def __init__(self, product_id, name, price, description, quantity):
@@ -129,14 +131,12 @@ class ShoppingCartApp:
     # ---------- DATA HANDLING ----------
     def load_products(self):
         try:
-            with open('products.txt', 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        pid, name, price, desc, qty = line.split(';')
-                        self.products[pid] = Product(pid, name, float(price), desc, int(qty))
+            table = load_catalog('products.txt')
         except FileNotFoundError:
             print("Products file not found.")
+            return
+        for pid, name, price, desc, qty in table.rows():
+            self.products[pid] = Product(pid, name, price, desc, qty)
 
     def save_products(self):
         with open('products.txt', 'w') as f:
@@ -184,7 +184,7 @@ class ShoppingCartApp:
                     date_str, items_str, total_str = line.strip().split(';')
                     items = {}
                     for s in items_str.split(','):
-                        pid, qty = s.split(':')
+                        pid, qty = s.split(':')[:2]
                         if pid in self.products:
                             items[self.products[pid]] = {'product': self.products[pid], 'quantity': int(qty)}
                     order = Order(items, float(total_str))
@@ -1,164 +1,27 @@
-from abc import ABC, abstractmethod
-import datetime
 import tkinter as tk
-from tkinter import messagebox, ttk
-
-# PRODUCT CLASS
-# PRODUCT CLASS
-class Product:
-    def __init__(self, product_id, name, price, description, quantity):
-        self.product_id = product_id
-        self.name = name
-        self.price = price
-        self.description = description
-        self.quantity = quantity
-
-    def __str__(self):
-        return f"{self.name} (${self.price}): {self.description} - Quantity: {self.quantity}"
-
-    def __eq__(self, other):
-        if isinstance(other, Product):
-            return self.product_id == other.product_id
-        return False
-
-    def __hash__(self):
-        return hash(self.product_id)
-
-    def __add__(self, other):
-        if isinstance(other, Product):
-            return self.price + other.price
-        return NotImplemented
-
-    def __sub__(self, other):
-        if isinstance(other, Product):
-            return self.price - other.price
-        return NotImplemented
-
-
-# USER CLASS
-class User:
-    def __init__(self, username, password, first_name, last_name, address):
-        self.username = username
-        self.password = password
-        self.first_name = first_name
-        self.last_name = last_name
-        self.address = address
-        self.cart = ShoppingCart()
-        self.history = []
-
-    def __str__(self):
-        return f"{self.first_name} {self.last_name}, {self.address}"
-
-    def add_to_cart(self, product, quantity=1):
-        self.cart.add_product(product, quantity)
-
-    def remove_from_cart(self, product, quantity=1):
-        self.cart.remove_product(product, quantity)
-
-
-
-
-# SHOPPINGCART CLASS
-class ShoppingCart:
-    def __init__(self):
-        self.items = {}
-
-    def add_product(self, product, quantity=1):
-        if product.quantity >= quantity:
-            if product in self.items:
-                self.items[product]['quantity'] += quantity
-            else:
-                self.items[product] = {'product': product, 'quantity': quantity}
-            product.quantity -= quantity
-        else:
-            # Call the out_of_stock method of the app to handle it in the GUI thread
-            app.out_of_stock(product.name, product.quantity)
-
-    def remove_product(self, product, quantity=1):
-        if not self.items:
-            messagebox.showinfo("Empty Cart", "Your cart is empty.")
-            return
-        if product in self.items:
-            if self.items[product]['quantity'] <= quantity:
-                product.quantity += self.items[product]['quantity']
-                del self.items[product]
-            else:
-                self.items[product]['quantity'] -= quantity
-                product.quantity += quantity
-        else:
-            messagebox.showerror("Not in Cart", f"{product.name} is not in the cart.")
-
-    def view_cart(self):
-        if not self.items:
-            print("Your cart is empty.")
-        else:
-            for item in self.items.values():
-                product = item['product']
-                quantity = item['quantity']
-                print(f"{product.name} (x{quantity}): ${product.price * quantity}")
-
-    def checkout(self):
-        total = sum(item['product'].price * item['quantity'] for item in self.items.values())
-        if total == 0:
-            print("Your cart is empty. Add items to cart before checking out.")
-            return False
-        confirm = input(f"Your total is ${total}. Do you want to proceed with the checkout? (yes/y or no/n): ").strip().lower()
-        if confirm in ['yes', 'y']:
-            order = Order(self.items, total)
-            self.items = {}
-            return order
-        elif confirm in ['no', 'n']:
-            print("Checkout cancelled.")
-            return False
-        else:
-            print("Invalid input. Please enter 'yes/y' or 'no/n'.")
-            return False
-
-
-# ABSTRACT CLASS
-class Account(ABC):
-    @abstractmethod
-    def view_products(self):
-        pass
-
-    @abstractmethod
-    def view_history(self):
-        pass
-
-
-# CUSTOMER CLASS
-class Customer(User, Account):
-    def view_products(self, products):
-        for product in products:
-            print(product)
-
-    def view_history(self):
-        if not self.history:
-            print("No purchase history.")
-        else:
-            for order in self.history:
-                print(order)
-
-
-# ORDER CLASS
-class Order:
-    def __init__(self, items, total):
-        self.date = datetime.datetime.now()
-        self.items = {product: {'product': product, 'quantity': details['quantity']} for product, details in items.items()}
-        self.total = total
-
-    def __str__(self):
-        items_str = '\n'.join([f"{details['product'].name} (x{details['quantity']}): ${details['product'].price * details['quantity']}" for details in self.items.values()])
-        return f"Date: {self.date}\nItems:\n{items_str}\nTotal: ${self.total}"
+from tkinter import messagebox
 
+from shopcore.catalog import load_catalog
+from shopcore.errors import OutOfStockError, ShopError
+from shopcore.models import Customer, Order, Product
+from shopcore.storage import TextFileStorage
+from shopcore.sorted_index import ProductIndexes, product_page
+import product_filters
 
 # SHOPPINGCART APP CLASS
 class ShoppingCartApp:
+    # view_products shows this many product cards per page.
+    PRODUCT_PAGE_SIZE = 20
+
     def __init__(self):
+        # Reads and formats the *_history.txt files.
+        self.history_file = TextFileStorage()
         self.users = {}
         self.products = {}
         self.load_products()
         self.load_users()
+        # Built after load_users(), which takes saved carts' stock off the shelf.
+        self.product_indexes = ProductIndexes(self.products.values())
 
         self.root = tk.Tk()
         self.root.title("Dia's Ice Cream Shop")
@@ -167,17 +30,15 @@ class ShoppingCartApp:
 
     def load_products(self):
         try:
-            with open('products.txt', 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        try:
-                            product_id, name, price, description, quantity = line.split(';')
-                            self.products[product_id] = Product(product_id, name, float(price), description, int(quantity))
-                        except ValueError as e:
-                            print(f"Error parsing line: {line}\n{e}")
+            table = load_catalog('products.txt')
         except FileNotFoundError:
             print("Products file not found.")
+            return
+        for product_id, name, price, description, quantity in table.rows():
+            self.products[product_id] = Product(product_id, name, price, description, quantity)
+
+    def product_page(self, min_price=None, max_price=None, in_stock_only=False, order=None, offset=0, limit=None):
+        return product_page(self.products, self.product_indexes, min_price, max_price, in_stock_only, order, offset, limit)
 
     def load_users(self):
         try:
@@ -337,7 +198,10 @@ class ShoppingCartApp:
 
 #products
 
-    def view_products(self, user):
+    def view_products(self, user, filters=None):
+        # filters holds the filter fields and page offset between redraws.
+        filters = filters or product_filters.default_filters()
+
         self.clear_window()
 
         frame = tk.Frame(self.root)
@@ -345,7 +209,14 @@ class ShoppingCartApp:
 
         tk.Label(frame, text="Products", font=("Helvetica", 14)).pack(pady=10)
 
-        # Use a Canvas with a Scrollbar for scrollable content
+        show_page = product_filters.filter_bar(frame, filters, lambda filters: self.view_products(user, filters))
+
+        # One extra product tells whether there is a next page.
+        products = self.product_page(*product_filters.page_query(filters), filters['offset'], self.PRODUCT_PAGE_SIZE + 1)
+
+        product_filters.page_buttons(frame, show_page, filters['offset'], self.PRODUCT_PAGE_SIZE,
+                                     len(products) > self.PRODUCT_PAGE_SIZE)
+
         canvas = tk.Canvas(frame)
         scrollbar = tk.Scrollbar(frame, orient="vertical", command=canvas.yview)
         canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -356,7 +227,7 @@ class ShoppingCartApp:
         product_frame = tk.Frame(canvas)
         canvas.create_window((0, 0), window=product_frame, anchor="nw")
 
-        for product in self.products.values():
+        for product in products[:self.PRODUCT_PAGE_SIZE]:
             # Create a card frame for each product
             card_frame = tk.Frame(product_frame, relief=tk.GROOVE, borderwidth=2, padx=10, pady=10)
             card_frame.pack(pady=5, fill=tk.X, padx=10)
@@ -448,13 +319,17 @@ class ShoppingCartApp:
 
             if product_id in self.products:
                 product = self.products[product_id]
-                if product.quantity >= quantity:
+                try:
                     user.add_to_cart(product, quantity)
+                except OutOfStockError as e:
+                    self.out_of_stock(product.name, e.available)  # Show out-of-stock message
+                except ShopError as e:
+                    messagebox.showerror("Error", str(e))
+                else:
+                    self.product_indexes.update(product)
                     self.save_products()
                     self.save_cart(user.username)  # Save cart for the specific user
                     messagebox.showinfo("Success", "Product added to cart.")
-                else:
-                    self.out_of_stock(product.name, product.quantity)  # Show out-of-stock message
             else:
                 messagebox.showerror("Error", "Invalid product ID.")
             self.user_menu(user)
@@ -499,11 +374,16 @@ class ShoppingCartApp:
             # Check if product ID exists and quantity is valid
             if product_id in self.products:
                 product = self.products[product_id]
-                if quantity > 0 and quantity <= product.quantity:
-                    user.remove_from_cart(product, quantity)
-                    self.save_products()
-                    self.save_cart(user.username)  # Save cart for the specific user
-                    messagebox.showinfo("Success", "Product removed from cart.")
+                if quantity > 0:
+                    try:
+                        user.remove_from_cart(product, quantity)
+                    except ShopError as e:
+                        messagebox.showerror("Error", str(e))
+                    else:
+                        self.product_indexes.update(product)
+                        self.save_products()
+                        self.save_cart(user.username)  # Save cart for the specific user
+                        messagebox.showinfo("Success", "Product removed from cart.")
                 else:
                     messagebox.showerror("Error", "Invalid quantity. Please enter a valid quantity.")
             else:
@@ -523,14 +403,13 @@ class ShoppingCartApp:
 
         tk.Label(frame, text="Checkout", font=("Helvetica", 14)).pack(pady=10)
 
-        total = sum(item['product'].price * item['quantity'] for item in user.cart.items.values())
+        total = user.cart.total
         if total == 0:
             tk.Label(frame, text="Your cart is empty. Add items to cart before checking out.").pack()
         else:
             confirm = messagebox.askyesno("Checkout", f"Your total is ${total}. Do you want to proceed with the checkout?")
             if confirm:
-                order = Order(user.cart.items, total)
-                user.cart.items = {}
+                order = user.cart.checkout()
                 user.history.append(order)
                 self.save_products()
                 self.save_history(user.username)
@@ -562,7 +441,7 @@ class ShoppingCartApp:
 
             history_listbox = tk.Listbox(history_list_frame, yscrollcommand=scrollbar.set, width=50)
             for order in user.history:
-                history_listbox.insert(tk.END, str(order))
+                history_listbox.insert(tk.END, order.describe(self.products))
             history_listbox.pack(side=tk.LEFT, fill=tk.BOTH)
 
             scrollbar.config(command=history_listbox.yview)
@@ -574,33 +453,12 @@ class ShoppingCartApp:
             widget.destroy()
 
     def load_history(self, username):
-        try:
-            with open(f'{username}_history.txt', 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line:  # Skip empty lines
-                        try:
-                            date_str, items_str, total_str = line.split(';')
-                            items = {}
-                            for item_str in items_str.split(','):
-                                product_id, quantity_str = item_str.split(':')
-                                quantity = int(quantity_str)
-                                if product_id in self.products:
-                                    items[self.products[product_id]] = {'product': self.products[product_id], 'quantity': quantity}
-                            total = float(total_str)
-                            order = Order(items, total)
-                            order.date = datetime.datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S.%f")
-                            self.users[username].history.append(order)
-                        except ValueError as e:
-                            print(f"Error parsing line: {line}\n{e}")
-        except FileNotFoundError:
-            print(f"History file for {username} not found.")
+        for date, lines, total in self.history_file.load_text_history(username):
+            self.users[username].history.append(Order(lines, total, date))
 
     def save_history(self, username):
-        with open(f'{username}_history.txt', 'w') as f:
-            for order in self.users[username].history:
-                items_str = ','.join([f"{item['product'].product_id}:{item['quantity']}" for item in order.items.values()])
-                f.write(f"{order.date.strftime('%Y-%m-%d %H:%M:%S.%f')};{items_str};{order.total}\n")
+        self.history_file.save_history(username, [(order.date, order.lines, order.total)
+                                                  for order in self.users[username].history])
 
     def load_cart(self, username):
         try:
@@ -615,6 +473,8 @@ class ShoppingCartApp:
                                 self.users[username].cart.add_product(self.products[product_id], quantity)
                         except ValueError as e:
                             print(f"Error parsing line: {line}\n{e}")
+                        except ShopError as e:
+                            print(f"Cart line not restored: {line}\n{e}")
         except FileNotFoundError:
             print(f"Cart file for {username} not found.")
 